@@ -1,6 +1,6 @@
 // src/components/Enigmes/Enigme1Puzzle.jsx
 import React, { useEffect, useState } from "react";
-import { getEnigmeDoc, getDownloadUrls, buildProxiedUrl } from "../../services/api";
+import { getEnigmeDoc, getDownloadUrls, buildProxiedUrl, buildTileUrl } from "../../services/api";
 import { useSocket } from "../../services/useSocket";
 import { validatePuzzle } from "../../services/api";
 
@@ -14,6 +14,8 @@ export default function Enigme1Puzzle({ onComplete }) {
     const [selectedGhost, setSelectedGhost] = useState(null);
     const [gridSize] = useState(3); // 3x3
     const [tileSize, setTileSize] = useState(120);
+    // Tuiles servies pré-découpées par /image-proxy ; sinon découpage CSS de l'image complète
+    const [serverTiles, setServerTiles] = useState(false);
 
     const applyPositions = (positions) => {
         if (!Array.isArray(positions)) return;
@@ -63,9 +65,9 @@ export default function Enigme1Puzzle({ onComplete }) {
         return () => window.removeEventListener("resize", handleResize);
     }, []);
 
-    const fetchRandomPuzzle = async () => {
+    const fetchRandomPuzzle = async (reroll = false) => {
         setLoading(true);
-        const doc = await getEnigmeDoc("enigme1");
+        const doc = await getEnigmeDoc("enigme1", { reroll });
         const paths = (doc && doc.images) || [];
         let urls = [];
         if (paths.length > 0) {
@@ -121,6 +123,16 @@ export default function Enigme1Puzzle({ onComplete }) {
             [arr[i].pos, arr[j].pos] = [arr[j].pos, arr[i].pos];
         }
         setTiles(arr);
+
+        // Vérifier qu'une tuile serveur est disponible avant de l'utiliser
+        setServerTiles(false);
+        const probeUrl = buildTileUrl(imgUrl, gridSize, 0, tileSize);
+        if (probeUrl !== imgUrl) {
+            const probe = new Image();
+            probe.onload = () => setServerTiles(true);
+            probe.onerror = () => setServerTiles(false);
+            probe.src = probeUrl;
+        }
     };
 
     const handleClick = (idx) => {
@@ -172,7 +184,7 @@ export default function Enigme1Puzzle({ onComplete }) {
             <p className="text-gray-300 mb-4">Reconstituez l'image native</p>
 
             <div className="mb-4">
-                <button onClick={fetchRandomPuzzle} className="bg-gray-700 px-4 py-2 rounded-lg hover:ring-2 hover:ring-amber-400">
+                <button onClick={() => fetchRandomPuzzle(true)} className="bg-gray-700 px-4 py-2 rounded-lg hover:ring-2 hover:ring-amber-400">
                     🔄 Changer d'image
                 </button>
             </div>
@@ -194,6 +206,7 @@ export default function Enigme1Puzzle({ onComplete }) {
                     const col = index % gridSize;
                     const bgPosX = -(col * tileSize);
                     const bgPosY = -(row * tileSize);
+                    const tileUrl = serverTiles && imgUrl ? buildTileUrl(imgUrl, gridSize, index, tileSize) : null;
 
                     const currentIdx = tiles.findIndex((t) => t.pos === pos);
                     const isSelected = selected === currentIdx;
@@ -206,9 +219,9 @@ export default function Enigme1Puzzle({ onComplete }) {
                             style={{
                                 width: tileSize, 
                                 height: tileSize,
-                                backgroundImage: `url(${imgUrl})`,
-                                backgroundSize: `${tileSize * gridSize}px ${tileSize * gridSize}px`,
-                                backgroundPosition: `${bgPosX}px ${bgPosY}px`,
+                                backgroundImage: `url(${tileUrl || imgUrl})`,
+                                backgroundSize: tileUrl ? `${tileSize}px ${tileSize}px` : `${tileSize * gridSize}px ${tileSize * gridSize}px`,
+                                backgroundPosition: tileUrl ? "0px 0px" : `${bgPosX}px ${bgPosY}px`,
                                 backgroundRepeat: "no-repeat",
                                 cursor: "pointer",
                                 border: isSelected ? "3px solid #f59e0b" : (isGhost ? "3px solid #60a5fa" : "2px solid transparent"),
@@ -1,6 +1,6 @@
 // src/components/Enigmes/Enigme3Son.jsx
 import React, { useEffect, useState } from "react";
-import { getEnigme3, buildAudioProxiedUrl, validatePuzzle } from "../../services/api";
+import { getEnigme3, setGameContent, buildAudioProxiedUrl, validatePuzzle } from "../../services/api";
 import { useSocket } from "../../services/useSocket";
 
 export default function Enigme3Son({ onComplete }) {
@@ -19,6 +19,9 @@ export default function Enigme3Son({ onComplete }) {
             if (!data || !data.type) return;
             if (data.type === 'enigme3:sound') {
                 stateAppliedRef.current = true;
+                if (data.reroll) {
+                    setGameContent('enigme3', { sounds: [data.url], options: Array.isArray(data.options) ? data.options : [] });
+                }
                 const proxied = buildAudioProxiedUrl(data.url);
                 setSoundUrl(proxied || data.url);
                 setOptions(Array.isArray(data.options) ? data.options : []);
@@ -36,9 +39,9 @@ export default function Enigme3Son({ onComplete }) {
         }
     });
 
-    const fetchRandomSound = async () => {
+    const fetchRandomSound = async (reroll = false) => {
         setLoading(true);
-        const data = await getEnigme3();
+        const data = await getEnigme3({ reroll });
         const raw = (data.sounds && data.sounds[0]) || null;
         const proxied = buildAudioProxiedUrl(raw);
         setSoundUrl(proxied || raw);
@@ -48,7 +51,7 @@ export default function Enigme3Son({ onComplete }) {
         // broadcast
         if (raw) {
             const seed = Date.now() & 0xffffffff;
-            sendPuzzleState({ type: 'enigme3:sound', url: raw, options: data.options || [], correct: data.correct || null, seed });
+            sendPuzzleState({ type: 'enigme3:sound', url: raw, options: data.options || [], correct: data.correct || null, seed, reroll });
         }
     };
 
@@ -125,7 +128,7 @@ export default function Enigme3Son({ onComplete }) {
             </button>
 
             <div className="mb-6">
-                <button onClick={fetchRandomSound} className="bg-gray-700 px-4 py-2 rounded-lg hover:ring-2 hover:ring-amber-400">
+                <button onClick={() => fetchRandomSound(true)} className="bg-gray-700 px-4 py-2 rounded-lg hover:ring-2 hover:ring-amber-400">
                     🔄 Changer de son
                 </button>
             </div>
@@ -57,6 +57,7 @@ const apiRequest = async (endpoint, options = {}) => {
 // ---------- Game API functions ----------
 
 export const createGame = async (nickname = "Agent", role = "curator") => {
+    localStorage.removeItem('gameManifest');
     console.log('Creating game with:', { nickname, role });
     try {
         const res = await apiRequest('/api/games', {
@@ -77,6 +78,7 @@ export const createGame = async (nickname = "Agent", role = "curator") => {
 };
 
 export const joinGame = async (code, nickname = "Agent", role = "analyst") => {
+    localStorage.removeItem('gameManifest');
     // Si code = "RANDOM", rejoindre une partie aléatoire
     if (code === "RANDOM") {
         const res = await apiRequest('/api/games/join-random', {
@@ -114,10 +116,63 @@ export const validatePuzzle = async (slug, attempt) => {
     });
 };
 
+// Plusieurs lectures / validations en un aller-retour : [{ id, method, path, body }]
+// Résultats dans le même ordre, chacun avec son propre status (body ou error)
+export const batchRequest = async (requests) => {
+    const res = await apiRequest('/api/batch', {
+        method: 'POST',
+        body: JSON.stringify({ requests }),
+    });
+    return res.results;
+};
+
+export const getGameScoreboard = async (gameId) => {
+    return await apiRequest(`/api/games/${gameId}/scoreboard`);
+};
+
+export const getLeaderboard = async (window = 'all', limit = 10) => {
+    return await apiRequest(`/api/leaderboard?window=${encodeURIComponent(window)}&limit=${limit}`);
+};
+
+// ---------- Contenu de la partie ----------
+// Manifeste reçu avec game:started (ou via GET /api/games/<id>) : contenu des énigmes tiré au démarrage
+
+export const storeGameManifest = (manifest) => {
+    try {
+        localStorage.setItem('gameManifest', JSON.stringify(manifest));
+    } catch (_) {
+        // stockage indisponible : les énigmes repassent par l'API
+    }
+};
+
+const getGameContent = (key) => {
+    try {
+        const manifest = JSON.parse(localStorage.getItem('gameManifest') || 'null');
+        return (manifest && manifest.content && manifest.content[key]) || null;
+    } catch (_) {
+        return null;
+    }
+};
+
+// Remplace le contenu d'une énigme dans le manifeste stocké (après un nouveau tirage)
+export const setGameContent = (key, value) => {
+    try {
+        const manifest = JSON.parse(localStorage.getItem('gameManifest') || 'null');
+        if (manifest && manifest.content) {
+            manifest.content[key] = value;
+            localStorage.setItem('gameManifest', JSON.stringify(manifest));
+        }
+    } catch (_) {
+        // stockage indisponible : rien à mettre à jour
+    }
+};
+
 // ---------- Enigme 5 Poétique ----------
 
 // Fonction spécifique pour l'énigme 5
 export const getEnigme5Poetique = async () => {
+    const stored = getGameContent('enigme5');
+    if (stored) return stored;
     try {
         const data = await apiRequest("/api/games/poetique-nantes-5");
         return data;
@@ -164,13 +219,18 @@ const mockEnigmes = {
 };
 
 // Fallback safe pour les énigmes 1 à 4
-export const getEnigmeDoc = async (id) => {
+// reroll : nouvelle image tirée au hasard au lieu de celle de la partie
+export const getEnigmeDoc = async (id, { reroll = false } = {}) => {
     if (id === "enigme5") {
         return await getEnigme5Poetique();
     }
     if (id === 'enigme1') {
+        const stored = reroll ? null : getGameContent('enigme1');
+        if (stored && Array.isArray(stored.images) && stored.images.length) {
+            return { images: stored.images, mode: 'choose-three' };
+        }
         try {
-            const data = await apiRequest(`/api/enigmes/1?r=${Date.now()}`);
+            const data = await apiRequest(`/api/enigmes/1?r=${Date.now()}${reroll ? '&reroll=1' : ''}`);
             if (data && Array.isArray(data.images) && data.images.length) {
                 return { images: data.images, mode: 'choose-three' };
             }
@@ -200,13 +260,43 @@ export const buildProxiedUrl = (rawUrl) => {
     return `${API_BASE_URL}/image-proxy?url=${encodeURIComponent(rawUrl)}&cb=${bust}`;
 };
 
+// Ajoute des paramètres de dérivé (w, fmt, grid, tile) à une URL /image-proxy
+export const withImageParams = (proxiedUrl, params = {}) => {
+    if (!proxiedUrl || !proxiedUrl.includes('/image-proxy?')) return proxiedUrl;
+    const qs = Object.entries(params)
+        .filter(([, v]) => v !== undefined && v !== null)
+        .map(([k, v]) => `${k}=${encodeURIComponent(v)}`)
+        .join('&');
+    return qs ? `${proxiedUrl}&${qs}` : proxiedUrl;
+};
+
+// Tuile de puzzle pré-découpée côté serveur (WebP si le navigateur l'accepte)
+export const buildTileUrl = (proxiedUrl, gridSize, index, tilePx) => {
+    const dpr = (typeof window !== 'undefined' && window.devicePixelRatio) || 1;
+    return withImageParams(proxiedUrl, { grid: gridSize, tile: index, w: Math.ceil(tilePx * dpr), fmt: 'auto' });
+};
+
 export const buildAudioProxiedUrl = (rawUrl) => {
     if (!rawUrl) return null;
     const bust = Date.now();
     return `${API_BASE_URL}/audio-proxy?url=${encodeURIComponent(rawUrl)}&cb=${bust}`;
 };
 
-export const getEnigme3 = async () => {
+// reroll : nouveau son tiré pour la partie (le serveur valide ensuite contre ce son)
+export const getEnigme3 = async ({ reroll = false } = {}) => {
+    if (reroll) {
+        try {
+            const data = await apiRequest('/api/games/son-elephant-3/reroll', { method: 'POST' });
+            if (data && Array.isArray(data.sounds)) {
+                setGameContent('enigme3', data);
+                return { sounds: data.sounds, options: Array.isArray(data.options) ? data.options : [], correct: null };
+            }
+        } catch (e) {
+            // partie non démarrée : tirage libre ci-dessous
+        }
+    }
+    const stored = reroll ? null : getGameContent('enigme3');
+    if (stored) return stored;
     try {
         const data = await apiRequest(`/api/enigmes/3?r=${Date.now()}`);
         if (data) return {
@@ -0,0 +1,148 @@
+// src/services/msgpack.js
+// Encodeur / décodeur MessagePack minimal pour les trames socket fréquentes
+// (nil, bool, entiers, float64, str, bin, array, map)
+
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+export const encode = (value) => {
+    const bytes = [];
+
+    const pushUint = (n, size) => {
+        for (let i = size - 1; i >= 0; i--) bytes.push((n / 2 ** (8 * i)) & 0xff);
+    };
+
+    const write = (v) => {
+        if (v === null || v === undefined) {
+            bytes.push(0xc0);
+        } else if (v === false) {
+            bytes.push(0xc2);
+        } else if (v === true) {
+            bytes.push(0xc3);
+        } else if (typeof v === 'number') {
+            if (Number.isInteger(v) && v >= 0 && v < 2 ** 32) {
+                if (v < 0x80) bytes.push(v);
+                else if (v < 0x100) { bytes.push(0xcc); pushUint(v, 1); }
+                else if (v < 0x10000) { bytes.push(0xcd); pushUint(v, 2); }
+                else { bytes.push(0xce); pushUint(v, 4); }
+            } else if (Number.isInteger(v) && v < 0 && v >= -(2 ** 31)) {
+                if (v >= -32) bytes.push(v & 0xff);
+                else if (v >= -128) { bytes.push(0xd0, v & 0xff); }
+                else if (v >= -32768) { bytes.push(0xd1); pushUint(v & 0xffff, 2); }
+                else { bytes.push(0xd2); pushUint(v >>> 0, 4); }
+            } else {
+                const buf = new DataView(new ArrayBuffer(8));
+                buf.setFloat64(0, v);
+                bytes.push(0xcb);
+                for (let i = 0; i < 8; i++) bytes.push(buf.getUint8(i));
+            }
+        } else if (typeof v === 'string') {
+            const utf8 = textEncoder.encode(v);
+            const n = utf8.length;
+            if (n < 32) bytes.push(0xa0 | n);
+            else if (n < 0x100) { bytes.push(0xd9); pushUint(n, 1); }
+            else if (n < 0x10000) { bytes.push(0xda); pushUint(n, 2); }
+            else { bytes.push(0xdb); pushUint(n, 4); }
+            for (let i = 0; i < n; i++) bytes.push(utf8[i]);
+        } else if (v instanceof Uint8Array) {
+            const n = v.length;
+            if (n < 0x100) { bytes.push(0xc4); pushUint(n, 1); }
+            else if (n < 0x10000) { bytes.push(0xc5); pushUint(n, 2); }
+            else { bytes.push(0xc6); pushUint(n, 4); }
+            for (let i = 0; i < n; i++) bytes.push(v[i]);
+        } else if (Array.isArray(v)) {
+            const n = v.length;
+            if (n < 16) bytes.push(0x90 | n);
+            else if (n < 0x10000) { bytes.push(0xdc); pushUint(n, 2); }
+            else { bytes.push(0xdd); pushUint(n, 4); }
+            v.forEach(write);
+        } else if (typeof v === 'object') {
+            const entries = Object.entries(v).filter(([, x]) => x !== undefined);
+            const n = entries.length;
+            if (n < 16) bytes.push(0x80 | n);
+            else if (n < 0x10000) { bytes.push(0xde); pushUint(n, 2); }
+            else { bytes.push(0xdf); pushUint(n, 4); }
+            entries.forEach(([k, x]) => {
+                // Les clés numériques ("0", "1"...) restent des entiers sur le fil
+                write(/^\d+$/.test(k) ? Number(k) : k);
+                write(x);
+            });
+        } else {
+            bytes.push(0xc0);
+        }
+    };
+
+    write(value);
+    return new Uint8Array(bytes);
+};
+
+export const decode = (input) => {
+    const data = input instanceof Uint8Array ? input : new Uint8Array(input);
+    const view = new DataView(data.buffer, data.byteOffset, data.byteLength);
+    let pos = 0;
+
+    const uint = (size) => {
+        let n = 0;
+        for (let i = 0; i < size; i++) n = n * 256 + data[pos++];
+        return n;
+    };
+    const str = (n) => {
+        const s = textDecoder.decode(data.subarray(pos, pos + n));
+        pos += n;
+        return s;
+    };
+    const arr = (n) => {
+        const out = new Array(n);
+        for (let i = 0; i < n; i++) out[i] = read();
+        return out;
+    };
+    const map = (n) => {
+        const out = {};
+        for (let i = 0; i < n; i++) {
+            const k = read();
+            out[k] = read();
+        }
+        return out;
+    };
+
+    const read = () => {
+        const b = data[pos++];
+        if (b < 0x80) return b;
+        if (b >= 0xe0) return b - 0x100;
+        if ((b & 0xf0) === 0x80) return map(b & 0x0f);
+        if ((b & 0xf0) === 0x90) return arr(b & 0x0f);
+        if ((b & 0xe0) === 0xa0) return str(b & 0x1f);
+        switch (b) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: case 0xc5: case 0xc6: {
+                const n = uint(b === 0xc4 ? 1 : b === 0xc5 ? 2 : 4);
+                const out = data.slice(pos, pos + n);
+                pos += n;
+                return out;
+            }
+            case 0xca: { const v = view.getFloat32(pos); pos += 4; return v; }
+            case 0xcb: { const v = view.getFloat64(pos); pos += 8; return v; }
+            case 0xcc: return uint(1);
+            case 0xcd: return uint(2);
+            case 0xce: return uint(4);
+            case 0xcf: return uint(8);
+            case 0xd0: { const v = view.getInt8(pos); pos += 1; return v; }
+            case 0xd1: { const v = view.getInt16(pos); pos += 2; return v; }
+            case 0xd2: { const v = view.getInt32(pos); pos += 4; return v; }
+            case 0xd3: { const v = Number(view.getBigInt64(pos)); pos += 8; return v; }
+            case 0xd9: return str(uint(1));
+            case 0xda: return str(uint(2));
+            case 0xdb: return str(uint(4));
+            case 0xdc: return arr(uint(2));
+            case 0xdd: return arr(uint(4));
+            case 0xde: return map(uint(2));
+            case 0xdf: return map(uint(4));
+            default:
+                throw new Error(`MessagePack: type 0x${b.toString(16)} non supporté`);
+        }
+    };
+
+    return read();
+};
@@ -1,9 +1,39 @@
 // src/services/useSocket.js
 import { io } from 'socket.io-client';
 import { useState, useEffect, useRef } from 'react';
+import { encode as packMsg, decode as unpackMsg } from './msgpack';
+import { storeGameManifest } from './api';
 
 const SOCKET_URL = import.meta.env.VITE_SOCKET_URL || 'http://localhost:5000';
 
+// Format de transport demandé pour les événements fréquents ('json' ou 'msgpack', opt-in)
+const SOCKET_WIRE = import.meta.env.VITE_SOCKET_WIRE || 'json';
+const POSITION_FIELDS = ['x', 'y', 'playerName'];
+
+const isBinary = (data) => data instanceof ArrayBuffer || ArrayBuffer.isView(data);
+
+// Décode une trame binaire MessagePack (les champs de position arrivent en codes numériques)
+const unpackFrame = (event, data) => {
+    if (!isBinary(data)) return data;
+    const obj = unpackMsg(data) || {};
+    if (event !== 'player:position:update') return obj;
+    const out = {};
+    Object.entries(obj).forEach(([k, v]) => {
+        out[POSITION_FIELDS[k] ?? k] = v;
+    });
+    return out;
+};
+
+const packFrame = (event, data) => {
+    if (event !== 'player:position:update') return packMsg(data);
+    const coded = {};
+    Object.entries(data).forEach(([k, v]) => {
+        const idx = POSITION_FIELDS.indexOf(k);
+        coded[idx >= 0 ? idx : k] = v;
+    });
+    return packMsg(coded);
+};
+
 export const useSocket = (gameId, opts = {}) => {
     const [messages, setMessages] = useState([]);
     const [players, setPlayers] = useState([]);
@@ -16,6 +46,9 @@ export const useSocket = (gameId, opts = {}) => {
         gamePhase: 'waiting' // waiting, playing, completed
     });
     const socketRef = useRef(null);
+    const wireRef = useRef('json');
+    // Position dans le tampon de reprise de la room : (epoch, dernier seq reçu)
+    const resumeRef = useRef({ epoch: null, seq: 0 });
     const isInitializedRef = useRef(false);
     const cleanupRef = useRef(null);
 
@@ -60,15 +93,16 @@ export const useSocket = (gameId, opts = {}) => {
 
         const socket = socketRef.current;
 
-        // Connection events
-        socket.on('connect', () => {
-            console.log('✅ [Socket] Connected to server');
-            setIsConnected(true);
-            setError(null);
+        // Rejoint la room ; après une coupure, reprend depuis le dernier seq reçu (pas de requête base côté serveur)
+        const joinRoom = () => {
+            const token = localStorage.getItem('playerToken');
+            const { epoch, seq } = resumeRef.current;
+            if (epoch) {
+                socket.emit('room:resume', { token, wire: SOCKET_WIRE, epoch, seq });
+                return;
+            }
+            socket.emit('room:join', { token, wire: SOCKET_WIRE });
 
-            // Join the game room
-            socket.emit('room:join', { token });
-            
             // Request current game state to sync completion status
             setTimeout(() => {
                 if (socket.connected) {
@@ -76,6 +110,27 @@ export const useSocket = (gameId, opts = {}) => {
                     socket.emit('game:state:request', { token });
                 }
             }, 500);
+        };
+
+        // Chaque diffusion de room porte une enveloppe _resume { epoch, seq } : on garde le plus grand seq reçu
+        // (un nouvel epoch signifie que le tampon serveur a été recréé : on repart de son seq)
+        socket.onAny((event, raw) => {
+            const data = isBinary(raw) ? unpackMsg(raw) : raw;
+            const stamp = data && data._resume;
+            if (!stamp || typeof stamp.seq !== 'number') return;
+            if (stamp.epoch !== resumeRef.current.epoch) {
+                resumeRef.current = { epoch: stamp.epoch, seq: stamp.seq };
+            } else if (stamp.seq > resumeRef.current.seq) {
+                resumeRef.current.seq = stamp.seq;
+            }
+        });
+
+        // Connection events
+        socket.on('connect', () => {
+            console.log('✅ [Socket] Connected to server');
+            setIsConnected(true);
+            setError(null);
+            joinRoom();
         });
 
         socket.on('disconnect', (reason) => {
@@ -96,10 +151,8 @@ export const useSocket = (gameId, opts = {}) => {
         // Add connection recovery handler
         socket.on('reconnect', (attemptNumber) => {
             console.log(`🔄 [Socket] Reconnected after ${attemptNumber} attempts`);
-            // Re-join room and request state after reconnection
-            const token = localStorage.getItem('playerToken');
-            socket.emit('room:join', { token });
-            requestGameState();
+            // Reprise de la room (événements manqués ou instantané)
+            joinRoom();
         });
 
         socket.on('connect_error', (err) => {
@@ -119,6 +172,25 @@ export const useSocket = (gameId, opts = {}) => {
         // Room events
         socket.on('room:joined', (data) => {
             console.log('🎮 [Socket] Joined room:', data.gid);
+            wireRef.current = data.wire || 'json';
+            resumeRef.current = { epoch: data.epoch || null, seq: data.seq || 0 };
+            if (data.players) {
+                setPlayers(data.players);
+            }
+            if (data.gameState) {
+                setGameState(prev => ({
+                    ...prev,
+                    ...data.gameState,
+                    completedEnigmes: new Set(data.gameState.completedEnigmes || [])
+                }));
+            }
+        });
+
+        // Reprise : les événements manqués suivent ce message (ou le dernier état de chaque joueur)
+        socket.on('room:resumed', (data) => {
+            console.log(`🔁 [Socket] Resumed room ${data.gid} (${data.replayed} events)`);
+            wireRef.current = data.wire || 'json';
+            resumeRef.current = { epoch: data.epoch, seq: Math.max(resumeRef.current.seq, data.seq || 0) };
             if (data.players) {
                 setPlayers(data.players);
             }
@@ -141,6 +213,17 @@ export const useSocket = (gameId, opts = {}) => {
             console.log('🟢 [Socket] Player connected:', data.player);
         });
 
+        socket.on('player:disconnected', (data) => {
+            console.log('🔴 [Socket] Player disconnected:', data.player);
+            try {
+                if (opts && typeof opts.onPlayerDisconnected === 'function') {
+                    opts.onPlayerDisconnected(data);
+                }
+            } catch (e) {
+                // ignore
+            }
+        });
+
         socket.on('players:update', (data) => {
             console.log('🔄 [Socket] Players update:', data.players);
             setPlayers(data.players);
@@ -161,6 +244,10 @@ export const useSocket = (gameId, opts = {}) => {
         // Game events
         socket.on('game:started', (data) => {
             console.log('🚀 [Socket] Game started:', data);
+            // Contenu des énigmes tiré pour la partie (même image / son / poème pour tous)
+            if (data && data.manifest) {
+                storeGameManifest(data.manifest);
+            }
         });
 
         socket.on('puzzle:solved', (data) => {
@@ -198,8 +285,17 @@ export const useSocket = (gameId, opts = {}) => {
             } catch (_) {}
         });
 
+        socket.on('leaderboard:update', (data) => {
+            console.log('🏆 [Socket] Leaderboard update:', data);
+            setGameState(prev => ({
+                ...prev,
+                scoreboard: data.scoreboard || []
+            }));
+        });
+
         // Puzzle state sync
-        socket.on('puzzle:state', (data) => {
+        socket.on('puzzle:state', (raw) => {
+            const data = unpackFrame('puzzle:state', raw);
             console.log('🔄 [Socket] Puzzle state update:', data);
             try {
                 if (opts && typeof opts.onPuzzleState === 'function') {
@@ -211,7 +307,8 @@ export const useSocket = (gameId, opts = {}) => {
         });
 
         // Game state synchronization
-        socket.on('game:state:update', (data) => {
+        socket.on('game:state:update', (raw) => {
+            const data = unpackFrame('game:state:update', raw);
             console.log('🔄 [Socket] Game state update:', data);
             setGameState(prev => ({
                 ...prev,
@@ -246,7 +343,8 @@ export const useSocket = (gameId, opts = {}) => {
         });
 
         // Player position in selection room
-        socket.on('player:position:update', (data) => {
+        socket.on('player:position:update', (raw) => {
+            const data = unpackFrame('player:position:update', raw);
             console.log('📍 [Socket] Player position update:', data);
             try {
                 if (opts && typeof opts.onPlayerPositionUpdate === 'function') {
@@ -314,23 +412,25 @@ export const useSocket = (gameId, opts = {}) => {
         }
     };
 
+    // Émet un événement fréquent : binaire sans token si le serveur a accepté msgpack
+    const emitCompact = (event, payload) => {
+        if (wireRef.current === 'msgpack') {
+            socketRef.current.emit(event, packFrame(event, payload));
+            return;
+        }
+        const token = localStorage.getItem('playerToken');
+        socketRef.current.emit(event, { ...payload, token });
+    };
+
     const sendPuzzleState = (state) => {
         if (socketRef.current && isConnected) {
-            const token = localStorage.getItem('playerToken');
-            socketRef.current.emit('puzzle:state', {
-                ...state,
-                token
-            });
+            emitCompact('puzzle:state', state);
         }
     };
 
     const sendGameStateUpdate = (state) => {
         if (socketRef.current && isConnected) {
-            const token = localStorage.getItem('playerToken');
-            socketRef.current.emit('game:state:update', {
-                ...state,
-                token
-            });
+            emitCompact('game:state:update', state);
         }
     };
 
@@ -346,12 +446,7 @@ export const useSocket = (gameId, opts = {}) => {
 
     const sendPlayerPosition = (x, y) => {
         if (socketRef.current && isConnected) {
-            const token = localStorage.getItem('playerToken');
-            socketRef.current.emit('player:position:update', {
-                x,
-                y,
-                token
-            });
+            emitCompact('player:position:update', { x, y });
         }
     };
 
@@ -1,20 +1,42 @@
 # app.py - Système multijoueur complet
-import os, random, string, time
+import hmac, os, random, time
 from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request, Response
-import requests
+from flask import Flask, Blueprint, current_app, jsonify, request, Response, stream_with_context, send_file
 from flask_cors import CORS
 from flask_socketio import SocketIO, join_room, emit, leave_room
 
-from services.db import query_one, query_all, execute, get_conn
-from services.auth import issue_token, read_token_from_header
-
+# Une seule lecture du .env, avant les services qui lisent l'environnement à l'import
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": os.getenv("CORS_ORIGINS", "*").split(",")}})
-socketio = SocketIO(app, cors_allowed_origins=os.getenv("CORS_ORIGINS", "*").split(","), async_mode="threading")
+from models import Game, Player, ENIGME_IDS
+from services.db import query_one, query_all, execute, execute_many, get_conn, bid, router as db_router, warm_up as warm_up_pool
+from services.auth import issue_token, read_token_from_header, decode_token
+from services.repository import games, load_runtime_state
+from services.serialization import FastJSONProvider, socketio_json, encode_once, dumps
+from services import wire
+from services.presence import PresenceIndex
+from services.answers import AnswerRegistry
+from services.leaderboard import Leaderboard, WINDOWS
+from services.journal import EventJournal
+from services.spectators import SpectatorHub, room_for as spectator_room
+from services.resume import ResumeBuffer, RESUME_FIELD
+from services import media
+from services.codes import CodeAllocator
+from services.content import ContentCatalog, manifest as content_manifest, public_content
+from services.profiling import Timings, SamplingProfiler, collapsed
+from services import compression
+from services import analytics
+from services.batch import BatchRunner, batchable
+from services.shared_cache import SharedCache
+from services import resilience
+from services.resilience import CircuitOpen, DeadlineExceeded, breakers, http_timeout
+from services.backpressure import RoomOutbox, STATE_EVENTS, limiter, throttle, stats as backpressure_stats
+
+# Routes et handlers sont déclarés sur le blueprint / l'objet SocketIO, puis attachés par create_app()
+bp = Blueprint("manoir", __name__)
+socketio = SocketIO()
 
 # ---------- Initialisation de la base de données ----------
 def init_database():
@@ -26,9 +48,9 @@ def init_database():
                 cur.execute("""
                     CREATE TABLE IF NOT EXISTS game_enigmes_completed (
                         id INT AUTO_INCREMENT PRIMARY KEY,
-                        game_id VARCHAR(255) NOT NULL,
+                        game_id BINARY(16) NOT NULL,
                         enigme_id INT NOT NULL,
-                        completed_by VARCHAR(255) NOT NULL,
+                        completed_by BINARY(16) NOT NULL,
                         completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                         UNIQUE KEY unique_game_enigme (game_id, enigme_id),
                         INDEX idx_game_id (game_id),
@@ -41,35 +63,60 @@ def init_database():
     except Exception as e:
         print(f"❌ Erreur lors de l'initialisation de la base de données: {e}")
 
-# Initialiser la base de données au démarrage
-init_database()
+# ---------- Mesures ----------
+timings = Timings(enabled=os.getenv("ROUTE_TIMINGS", "1") == "1")
+profiler = SamplingProfiler(max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", 60)))
 
 # ---------- Helpers ----------
-def gen_code(n=6):
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=n))
-
 def now_utc():
     return datetime.now(timezone.utc)
 
 def get_game_players(game_id):
     """Récupère la liste des joueurs d'une partie"""
-    players = query_all(
-        "SELECT id, nickname, role, is_connected, score_total FROM players WHERE game_id=%s",
-        (game_id,)
-    )
-    return [{
-        'id': p['id'],
-        'name': p['nickname'],
-        'role': p['role'],
-        'ready': bool(p['is_connected']),
-        'score': p['score_total']
-    } for p in (players or [])]
+    return [p.to_api() for p in games.players(game_id)]
+
+def get_player_name(game_id, player_id, default="Un joueur"):
+    """Pseudo d'un joueur depuis le registre en mémoire"""
+    p = games.find_player(game_id, player_id)
+    return p.nickname if p else default
+
+spectators = SpectatorHub(
+    socketio,
+    buffer_size=int(os.getenv("SPECTATOR_BUFFER_SIZE", 50)),
+    max_backlog=int(os.getenv("SPECTATOR_MAX_BACKLOG", 100)),
+)
+
+def room_emit(event, payload, gid, include_self=True, public=None):
+    """Diffuse à la room des joueurs et au canal spectateurs (payload numéroté pour la reprise, encodé une fois)
+
+    `public` : variante du payload pour les spectateurs quand il contient des données réservées aux joueurs.
+    """
+    exclude = None
+    if not include_self:
+        sess = presence.session(request.sid)
+        exclude = sess.pid if sess else None
+    with resume.emitting(gid) as log:
+        _, payload = resume.record(log, event, payload, exclude)
+        socketio.emit(event, payload, room=gid, include_self=include_self)
+        spectators.publish(gid, event, payload if public is None else public)
+
+# Tampon d'événements numérotés par room pour la reprise de session (room:resume)
+resume = ResumeBuffer(
+    size=int(os.getenv("RESUME_BUFFER_SIZE", 200)),
+    max_rooms=int(os.getenv("RESUME_MAX_ROOMS", 10000)),
+)
+
+journal = EventJournal(batch_size=int(os.getenv("EVENTS_BATCH_SIZE", 200)))
+
+def record_event(game_id, type, payload=None, player_id=None):
+    """Ajoute un événement au journal de la partie (écriture différée par lots)"""
+    journal.append(game_id, type, payload, player_id)
 
 # ---------- Schema bootstrap (idempotent) ----------
 INIT_SQL = [
     """
     CREATE TABLE IF NOT EXISTS games (
-                                         id VARCHAR(36) PRIMARY KEY,
+                                         id BINARY(16) PRIMARY KEY,
         code VARCHAR(16) UNIQUE,
         status VARCHAR(16) NOT NULL,
         created_at DATETIME NOT NULL,
@@ -77,24 +124,29 @@ INIT_SQL = [
         ends_at DATETIME NULL,
         current_room_index INT NOT NULL DEFAULT 0,
         hints_left INT NOT NULL DEFAULT 3,
-        seed INT NOT NULL
+        seed INT NOT NULL,
+        content JSON NULL,
+        INDEX idx_games_ends_at (ends_at, id)
         ) ENGINE=InnoDB;
     """,
     """
     CREATE TABLE IF NOT EXISTS players (
-                                           id VARCHAR(36) PRIMARY KEY,
-        game_id VARCHAR(36) NOT NULL,
+                                           id BINARY(16) PRIMARY KEY,
+        game_id BINARY(16) NOT NULL,
         nickname VARCHAR(100) NOT NULL,
         role VARCHAR(32) NOT NULL,
         joined_at DATETIME NOT NULL,
         is_connected TINYINT(1) NOT NULL DEFAULT 1,
+        is_online TINYINT(1) NOT NULL DEFAULT 0,
+        last_seen DATETIME NULL,
         score_total INT NOT NULL DEFAULT 0,
+        INDEX idx_players_score (score_total),
         FOREIGN KEY (game_id) REFERENCES games(id) ON DELETE CASCADE
         ) ENGINE=InnoDB;
     """,
     """
     CREATE TABLE IF NOT EXISTS runtime_state (
-                                                 game_id VARCHAR(36) PRIMARY KEY,
+                                                 game_id BINARY(16) PRIMARY KEY,
         room_slug VARCHAR(64) NOT NULL,
         attempts INT NOT NULL DEFAULT 0,
         solved TINYINT(1) NOT NULL DEFAULT 0,
@@ -104,8 +156,8 @@ INIT_SQL = [
     """,
     """
     CREATE TABLE IF NOT EXISTS player_enigme (
-                                                 player_id VARCHAR(36) NOT NULL,
-        game_id VARCHAR(36) NOT NULL,
+                                                 player_id BINARY(16) NOT NULL,
+        game_id BINARY(16) NOT NULL,
         slug VARCHAR(64) NOT NULL,
         attempts INT NOT NULL DEFAULT 0,
         solved TINYINT(1) NOT NULL DEFAULT 0,
@@ -116,41 +168,146 @@ INIT_SQL = [
         FOREIGN KEY (game_id) REFERENCES games(id) ON DELETE CASCADE
         ) ENGINE=InnoDB;
     """,
+    """
+    CREATE TABLE IF NOT EXISTS game_events (
+        game_id BINARY(16) NOT NULL,
+        seq INT NOT NULL,
+        type VARCHAR(32) NOT NULL,
+        player_id BINARY(16) NULL,
+        payload JSON NULL,
+        created_at DATETIME(3) NOT NULL,
+        PRIMARY KEY (game_id, seq)
+        ) ENGINE=InnoDB;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS game_event_seq (
+        game_id BINARY(16) PRIMARY KEY,
+        seq INT NOT NULL
+        ) ENGINE=InnoDB;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS export_watermarks (
+        name VARCHAR(64) PRIMARY KEY,
+        ends_at DATETIME NOT NULL,
+        game_id BINARY(16) NOT NULL,
+        updated_at DATETIME NOT NULL
+        ) ENGINE=InnoDB;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        window_name VARCHAR(16) NOT NULL,
+        taken_at DATETIME NOT NULL,
+        entries JSON NOT NULL,
+        INDEX idx_window_taken (window_name, taken_at)
+        ) ENGINE=InnoDB;
+    """,
 ]
 
 def ensure_schema():
     for sql in INIT_SQL:
         execute(sql)
 
-ensure_schema()
+# ---------- Cache partagé entre workers ----------
+# Instantanés de contenu / réponses mappés par tous les processus, invalidation des parties en cache
+shared_cache = SharedCache(os.getenv("SHARED_CACHE_DIR"), enabled=os.getenv("SHARED_CACHE", "1") == "1")
+# Une entrée par partie modifiée et par passage de lecture : à dimensionner sur le nombre de parties actives
+game_invalidations = shared_cache.channel("games", size=int(os.getenv("SHARED_CACHE_RING_SIZE", 4096)))
+
+def on_game_invalidated(gid):
+    """Partie modifiée par un autre worker (None : trop de changements manqués, tout oublier).
+    Le rechargement passe par le primaire : un réplica en retard remettrait l'ancienne ligne en cache."""
+    if gid is None:
+        db_router.touch(*games.clear())
+    else:
+        games.invalidate(gid)
+        db_router.touch(gid)
+
+if game_invalidations is not None:
+    games.on_change = game_invalidations.publish
+
+def on_code_recycled(gid, code):
+    games.invalidate(gid)
+    leaderboard.forget_game(gid)
+    if game_invalidations is not None:
+        game_invalidations.publish(gid)
+
+# ---------- Codes de partie ----------
+codes = CodeAllocator(
+    low_water=int(os.getenv("ROOM_CODES_LOW_WATER", 200)),
+    batch=int(os.getenv("ROOM_CODES_BATCH", 500)),
+    expire_after=timedelta(hours=float(os.getenv("ROOM_CODES_EXPIRE_HOURS", 6))),
+)
+codes.on_recycle = on_code_recycled
+
+GAME_INSERT_SQL = "INSERT INTO games (id, code, status, created_at, started_at, ends_at, current_room_index, hints_left, seed) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)"
+
+def insert_games(count, created, seeds):
+    """Insère `count` parties en attente (un seul INSERT multi-lignes) et retourne [(gid, code, seed)].
+    Un code déjà pris par un autre worker fait échouer l'INSERT : nouveaux codes, au plus 3 essais.
+    """
+    for attempt in range(3):
+        rows = [(os.urandom(16).hex(), codes.take(), seed) for seed in seeds[:count]]
+        params = [(bid(gid), code, "waiting", created, None, None, 0, 3, seed) for gid, code, seed in rows]
+        try:
+            if len(params) == 1:
+                execute(GAME_INSERT_SQL, params[0])
+            else:
+                execute_many(GAME_INSERT_SQL, params)
+            db_router.touch(*(gid for gid, _, _ in rows))
+            return rows
+        except Exception as e:
+            if getattr(e, "errno", None) != 1062 or attempt == 2:
+                raise
 
 # ---------- REST ENDPOINTS ----------
 
-@app.post("/api/games")
+@bp.post("/api/games")
 def create_game():
     """Créer une nouvelle partie"""
     data = request.get_json(force=True) or {}
     nickname = data.get("nickname", "Agent")
     role = data.get("role", "curator")
 
-    gid = os.urandom(16).hex()
-    code = gen_code()
-    seed = int(time.time()) % 100000
-    execute(
-        "INSERT INTO games (id, code, status, created_at, started_at, ends_at, current_room_index, hints_left, seed) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)",
-        (gid, code, "waiting", now_utc(), None, None, 0, 3, seed),
-    )
+    created = now_utc()
+    [(gid, code, seed)] = insert_games(1, created, [int(time.time()) % 100000])
 
     pid = os.urandom(16).hex()
     execute(
         "INSERT INTO players (id, game_id, nickname, role, joined_at, is_connected) VALUES (%s,%s,%s,%s,%s,%s)",
-        (pid, gid, nickname, role, now_utc(), 1),
+        (bid(pid), bid(gid), nickname, role, created, 1),
+        game=gid,
     )
+    games.put(Game(gid, code, "waiting", created, None, None, 0, 3, seed,
+                   [Player(pid, gid, nickname, role, created, True, 0)]))
+    record_event(gid, "create", {"code": code, "name": nickname, "role": role}, pid)
 
     token = issue_token(gid, pid, role)
     return jsonify({"gameId": gid, "code": code, "playerToken": token})
 
-@app.post("/api/games/join")
+@bp.post("/api/games/batch")
+def create_games_batch():
+    """Créer plusieurs parties en attente d'un coup (lobbies d'une classe), sans joueur"""
+    expected = os.getenv("PROVISION_TOKEN")
+    if not expected:
+        return ("", 404)
+    if not hmac.compare_digest(request.headers.get("X-Provision-Token", "").encode(), expected.encode()):
+        return ("", 401)
+    data = request.get_json(force=True) or {}
+    count = data.get("count")
+    max_batch = int(os.getenv("GAMES_BATCH_MAX", 100))
+    if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= max_batch:
+        return jsonify({"error": "bad_count", "message": f"count doit être entre 1 et {max_batch}"}), 400
+
+    created = now_utc()
+    # Graines distinctes : chaque lobby tire son propre contenu
+    rows = insert_games(count, created, [random.randrange(100000) for _ in range(count)])
+    for gid, code, seed in rows:
+        games.put(Game(gid, code, "waiting", created, None, None, 0, 3, seed, []))
+        record_event(gid, "create", {"code": code, "batch": True})
+    return jsonify({"games": [{"gameId": gid, "code": code} for gid, code, _ in rows]})
+
+@bp.post("/api/games/join")
 def join_game():
     """Rejoindre une partie avec un code"""
     data = request.get_json(force=True) or {}
@@ -159,32 +316,37 @@ def join_game():
     role = data.get("role", "analyst")
 
     g = query_one("SELECT id, status FROM games WHERE code=%s LIMIT 1", (code,))
+    if not g and code:
+        # Partie peut-être créée à l'instant : le réplica ne l'a pas encore reçue
+        g = query_one("SELECT id, status FROM games WHERE code=%s LIMIT 1", (code,), primary=True)
     if not g:
         return jsonify({"error": "not_found", "message": "Code de partie invalide"}), 404
     if g["status"] not in ("waiting", "running"):
         return jsonify({"error": "closed", "message": "Cette partie est terminée"}), 403
 
     # Vérifier le nombre de joueurs
-    player_count = query_one("SELECT COUNT(*) as count FROM players WHERE game_id=%s", (g["id"],))
+    player_count = query_one("SELECT COUNT(*) as count FROM players WHERE game_id=%s", (bid(g["id"]),), primary=True)
     if player_count and player_count["count"] >= 4:
         return jsonify({"error": "full", "message": "Cette partie est complète (4 joueurs max)"}), 403
 
     pid = os.urandom(16).hex()
+    player = Player(pid, g["id"], nickname, role, now_utc(), True, 0)
     execute(
         "INSERT INTO players (id, game_id, nickname, role, joined_at, is_connected) VALUES (%s,%s,%s,%s,%s,%s)",
-        (pid, g["id"], nickname, role, now_utc(), 1),
+        (bid(pid), bid(g["id"]), nickname, role, player.joined_at, 1),
+        game=g["id"],
     )
+    games.add_player(g["id"], player)
+    record_event(g["id"], "join", {"name": nickname, "role": role}, pid)
 
     token = issue_token(g["id"], pid, role)
 
     # Notifier les autres joueurs via Socket.IO
-    socketio.emit("player:joined", {
-        "player": {"id": pid, "name": nickname, "role": role, "ready": True, "score": 0}
-    }, room=g["id"])
+    room_emit("player:joined", {"player": player.to_api()}, g["id"])
 
     return jsonify({"gameId": g["id"], "code": code, "playerToken": token})
 
-@app.post("/api/games/join-random")
+@bp.post("/api/games/join-random")
 def join_random_game():
     """Rejoindre une partie aléatoire en attente"""
     data = request.get_json(force=True) or {}
@@ -201,7 +363,8 @@ def join_random_game():
            HAVING player_count < 4
            ORDER BY g.created_at DESC
                LIMIT 1""",
-        ()
+        (),
+        primary=True,
     )
 
     if not g:
@@ -209,21 +372,23 @@ def join_random_game():
         return create_game()
 
     pid = os.urandom(16).hex()
+    player = Player(pid, g["id"], nickname, role, now_utc(), True, 0)
     execute(
         "INSERT INTO players (id, game_id, nickname, role, joined_at, is_connected) VALUES (%s,%s,%s,%s,%s,%s)",
-        (pid, g["id"], nickname, role, now_utc(), 1),
+        (bid(pid), bid(g["id"]), nickname, role, player.joined_at, 1),
+        game=g["id"],
     )
+    games.add_player(g["id"], player)
+    record_event(g["id"], "join", {"name": nickname, "role": role}, pid)
 
     token = issue_token(g["id"], pid, role)
 
     # Notifier les autres joueurs
-    socketio.emit("player:joined", {
-        "player": {"id": pid, "name": nickname, "role": role, "ready": True, "score": 0}
-    }, room=g["id"])
+    room_emit("player:joined", {"player": player.to_api()}, g["id"])
 
     return jsonify({"gameId": g["id"], "code": g["code"], "playerToken": token})
 
-@app.post("/api/games/ready")
+@bp.post("/api/games/ready")
 def toggle_ready():
     """Toggle player ready status"""
     claims = read_token_from_header()
@@ -238,22 +403,25 @@ def toggle_ready():
 
     execute(
         "UPDATE players SET is_connected=%s WHERE id=%s",
-        (1 if ready else 0, pid)
+        (1 if ready else 0, bid(pid)),
+        game=gid,
     )
+    games.set_ready(gid, pid, ready)
 
     # Notifier tous les joueurs du changement
     players = get_game_players(gid)
-    socketio.emit("players:update", {"players": players}, room=gid)
+    room_emit("players:update", {"players": players}, gid)
 
     return jsonify({"ok": True})
 
-@app.get("/api/games/<gid>/players")
+@bp.get("/api/games/<gid>/players")
+@batchable()
 def get_players(gid):
     """Récupère la liste des joueurs"""
     players = get_game_players(gid)
     return jsonify({"players": players})
 
-@app.post("/api/games/start")
+@bp.post("/api/games/start")
 def start_game():
     """Démarrer la partie"""
     claims = read_token_from_header()
@@ -261,38 +429,91 @@ def start_game():
         return ("", 401)
 
     gid = claims["gid"]
-    ends = now_utc() + timedelta(minutes=45)
+    started = now_utc()
+    ends = started + timedelta(minutes=45)
     execute(
         "UPDATE games SET status=%s, started_at=%s, ends_at=%s WHERE id=%s",
-        ("running", now_utc(), ends, gid),
+        ("running", started, ends, bid(gid)),
+        game=gid,
     )
+    games.set_status(gid, "running", started, ends)
+    record_event(gid, "start", {"endsAt": ends}, claims["pid"])
+    content = pick_game_content(gid)
     execute(
         "INSERT INTO runtime_state (game_id, room_slug, attempts, solved, puzzle_state) VALUES (%s,%s,%s,%s,%s) ON DUPLICATE KEY UPDATE room_slug=VALUES(room_slug), attempts=0, solved=0, puzzle_state=NULL",
-        (gid, "puzzle-nantes-1", 0, 0, None),
+        (bid(gid), "puzzle-nantes-1", 0, 0, None),
+        game=gid,
     )
 
-    # Notifier tous les joueurs que la partie démarre
-    socketio.emit("game:started", {"endsAt": ends.isoformat()}, room=gid)
+    # Notifier tous les joueurs que la partie démarre, avec le contenu et les médias à charger
+    payload = {"endsAt": ends.isoformat()}
+    if content is not None:
+        payload["manifest"] = content_manifest(content)
+        socketio.start_background_task(warm_media, payload["manifest"])
+    room_emit("game:started", payload, gid, public={"endsAt": payload["endsAt"]})
 
-    return jsonify({"ok": True, "endsAt": ends.isoformat()})
+    return jsonify({"ok": True, **payload})
 
-@app.get("/api/games/<gid>")
+@bp.get("/api/games/<gid>")
+@compression.policy(min_size=512)
+@batchable()
 def get_game(gid):
     """Récupérer les informations d'une partie"""
-    g = query_one("SELECT id, code, status, created_at, started_at, ends_at, current_room_index, hints_left, seed FROM games WHERE id=%s", (gid,))
+    g = games.get(gid)
     if not g:
         return ("", 404)
-    s = query_one("SELECT game_id, room_slug, attempts, solved, puzzle_state FROM runtime_state WHERE game_id=%s", (gid,))
-    players = get_game_players(gid)
-    return jsonify({"game": g, "state": s, "players": players})
+    s = load_runtime_state(gid)
+    return jsonify({
+        "game": g.to_api(),
+        "state": s.to_api() if s else None,
+        "players": [p.to_api() for p in g.players],
+        "manifest": content_manifest(g.content) if g.content else None,
+    })
+
+# ---------- Contenu des énigmes par partie ----------
+catalog = ContentCatalog(ttl=float(os.getenv("CONTENT_CATALOG_TTL", 300)), shared=shared_cache.snapshot("content"))
+
+def store_content(gid, content):
+    try:
+        execute("UPDATE games SET content=%s WHERE id=%s", (dumps(content), bid(gid)), game=gid)
+    except Exception as e:
+        print(f"❌ Error storing game content: {e}")
+    games.set_content(gid, content)
+
+def pick_game_content(gid):
+    """Contenu de la partie, tiré une fois avec games.seed au démarrage (start_game) puis stocké sur la partie"""
+    g = games.get(gid)
+    if g is None:
+        return None
+    if g.content is None:
+        store_content(gid, catalog.pick(g.seed))
+    return g.content
+
+def game_content(gid):
+    """Contenu stocké de la partie ; None tant qu'elle n'a pas démarré"""
+    g = games.get(gid)
+    return g.content if g is not None else None
+
+def claimed_content(key):
+    """Contenu d'une énigme pour la partie du token (si fourni et partie démarrée), sinon None"""
+    claims = read_token_from_header()
+    if not claims:
+        return None
+    content = game_content(claims["gid"])
+    return content.get(key) if content else None
 
 # ---------- Énigme 5 Poétique ----------
-@app.get("/api/games/poetique-nantes-5")
+@bp.get("/api/games/poetique-nantes-5")
+@batchable()
 def get_poem():
     claims = read_token_from_header()
     if not claims:
         return jsonify({"error": "Unauthorized", "message": "Token manquant ou invalide"}), 401
 
+    stored = claimed_content("enigme5")
+    if stored:
+        return jsonify(stored)
+
     try:
         enigme = query_one(
             "SELECT e.titre, p.texte_poeme, p.solution "
@@ -321,9 +542,15 @@ def get_poem():
             "message": "Impossible de récupérer le poème"
         }), 500
 
-@app.get("/api/enigmes/3")
+@bp.get("/api/enigmes/3")
+@batchable()
 def get_enigme3():
-    """Retourne aléatoirement un enregistrement pour l'énigme 3 (son, options, réponse)."""
+    """Retourne aléatoirement un enregistrement pour l'énigme 3 (son, options, réponse).
+    Avec un token de joueur, retourne le son tiré pour sa partie.
+    """
+    stored = claimed_content("enigme3")
+    if stored:
+        return jsonify(stored)
     sound_attempts = [
         ("SELECT url_audio, options_json, correct FROM Enigme3_Son ORDER BY RAND() LIMIT 1", ["url_audio", "options_json", "correct"]),
         ("SELECT sound_url, options_json, correct FROM Enigme3_Son ORDER BY RAND() LIMIT 1", ["sound_url", "options_json", "correct"]),
@@ -405,13 +632,37 @@ def get_enigme3():
 
     return jsonify({"sounds": [], "options": [], "correct": None})
 
-@app.get("/api/enigmes/1")
+@bp.post("/api/games/son-elephant-3/reroll")
+@batchable("write")
+def reroll_enigme3():
+    """« Changer de son » : nouveau son tiré pour la partie (et validé contre lui), sans la réponse"""
+    claims = read_token_from_header()
+    if not claims:
+        return ("", 401)
+    gid = claims["gid"]
+    content = game_content(gid)
+    if content is None:
+        return jsonify({"error": "not_started"}), 409
+    current = (content.get("enigme3") or {}).get("sounds")
+    for _ in range(5):
+        sound = catalog.pick(random.randrange(100000))["enigme3"]
+        if sound.get("sounds") != current:
+            break
+    store_content(gid, {**content, "enigme3": sound})
+    return jsonify(public_content({"enigme3": sound})["enigme3"])
+
+@bp.get("/api/enigmes/1")
+@batchable()
 def get_enigme1():
     """Retourne une image aléatoire parmi toutes les images de la table Enigme1_Puzzle.
     Chaque enregistrement peut contenir jusqu'à trois colonnes d'URL (url_photo_1..3).
+    Avec un token de joueur, retourne l'image tirée pour sa partie, sauf ?reroll=1 (bouton « Changer d'image »).
     """
+    stored = None if request.args.get("reroll") == "1" else claimed_content("enigme1")
+    if stored:
+        return jsonify(stored)
     try:
-        rows = query_all("SELECT url_photo_1, url_photo_2, url_photo_3 FROM Enigme1_Puzzle")
+        rows = query_all("SELECT url_photo_1, url_photo_2, url_photo_3 FROM Enigme1_Puzzle", stale_ok=True)
         if not rows:
             return jsonify({"images": []})
 
@@ -444,7 +695,38 @@ EXPECTED = {
 }
 PUZZLE_POINTS = 400
 
-@app.post("/api/validate/<slug>")
+answers = AnswerRegistry(EXPECTED, max_edits=int(os.getenv("ANSWER_MAX_EDITS", 1)), shared=shared_cache.snapshot("answers"))
+leaderboard = Leaderboard(
+    top_n=int(os.getenv("LEADERBOARD_TOP_N", 100)),
+    max_ranked=int(os.getenv("LEADERBOARD_MAX_RANKED", 10000)),
+    solve_points=PUZZLE_POINTS,
+)
+games.on_evict = leaderboard.forget_game
+
+def get_scoreboard(gid, ids=True):
+    """Classement d'une partie (initialisé depuis le registre au premier accès), None si elle n'existe pas"""
+    if not leaderboard.has_game(gid):
+        g = games.get(gid)
+        if g is None:
+            return None
+        leaderboard.seed_game(gid, g.players)
+    return leaderboard.game_board(gid, ids)
+
+# Énigmes dont la réponse dépend du contenu tiré pour la partie : (clé du contenu, champ)
+CONTENT_ANSWERS = {
+    "son-elephant-3": ("enigme3", "correct"),
+    "poetique-nantes-5": ("enigme5", "answer"),
+}
+
+def game_answers(gid, slug):
+    """Réponse attendue pour cette partie (son / poème tirés au démarrage), en plus de EXPECTED"""
+    source = CONTENT_ANSWERS.get(slug)
+    content = game_content(gid) if source else None
+    value = (content or {}).get(source[0], {}).get(source[1]) if source else None
+    return [value] if value else []
+
+@bp.post("/api/validate/<slug>")
+@batchable("write")
 def validate_slug(slug):
     claims = read_token_from_header()
     if not claims:
@@ -453,27 +735,20 @@ def validate_slug(slug):
     gid = claims["gid"]
     pid = claims["pid"]
     data = request.get_json(force=True) or {}
-    attempt = (data.get("attempt") or "").strip().lower()
-
-    allowed = set(EXPECTED.get(slug, []))
-    if slug == "puzzle-nantes-1":
-        row = query_one("SELECT solution FROM Enigme1_Puzzle ORDER BY id_puzzle DESC LIMIT 1")
-        if row:
-            sol = (row.get("solution") if isinstance(row, dict) else row["solution"]) or ""
-            if sol:
-                allowed.add(str(sol).strip().lower())
 
-    ok = attempt in allowed
+    ok = answers.match(slug, data.get("attempt"), game_answers(gid, slug))
+    record_event(gid, "attempt", {"slug": slug, "ok": ok}, pid)
 
-    st = query_one("SELECT attempts, solved FROM runtime_state WHERE game_id=%s", (gid,)) or {"attempts": 0, "solved": 0}
+    st = query_one("SELECT attempts, solved FROM runtime_state WHERE game_id=%s", (bid(gid),), primary=True) or {"attempts": 0, "solved": 0}
     attempts = int(st.get("attempts", 0)) + 1
     solved = 1 if ok else int(st.get("solved", 0))
     execute(
         "INSERT INTO runtime_state (game_id, room_slug, attempts, solved, puzzle_state) VALUES (%s,%s,%s,%s,%s) ON DUPLICATE KEY UPDATE attempts=%s, solved=%s",
-        (gid, slug, attempts, solved, None, attempts, solved),
+        (bid(gid), slug, attempts, solved, None, attempts, solved),
+        game=gid,
     )
 
-    prev = query_one("SELECT attempts, solved, score_obtenu FROM player_enigme WHERE player_id=%s AND slug=%s", (pid, slug))
+    prev = query_one("SELECT attempts, solved, score_obtenu FROM player_enigme WHERE player_id=%s AND slug=%s", (bid(pid), slug), primary=True)
     p_attempts = (prev["attempts"] if prev else 0) + 1
     p_solved = 1 if ok else (prev["solved"] if prev else 0)
     p_score = (prev["score_obtenu"] if prev else 0)
@@ -481,59 +756,60 @@ def validate_slug(slug):
         p_score = PUZZLE_POINTS
     execute(
         "INSERT INTO player_enigme (player_id, game_id, slug, attempts, solved, score_obtenu, updated_at) VALUES (%s,%s,%s,%s,%s,%s,%s) ON DUPLICATE KEY UPDATE attempts=%s, solved=%s, score_obtenu=%s, updated_at=%s",
-        (pid, gid, slug, p_attempts, p_solved, p_score, now_utc(), p_attempts, p_solved, p_score, now_utc()),
+        (bid(pid), bid(gid), slug, p_attempts, p_solved, p_score, now_utc(), p_attempts, p_solved, p_score, now_utc()),
+        game=gid,
     )
 
     if ok:
         # Mapper le slug vers l'ID de l'énigme
-        enigme_mapping = {
-            "puzzle-nantes-1": 1,
-            "lumiere-nantes-2": 2,
-            "son-elephant-3": 3,
-            "timeline-nantes-4": 4,
-            "poetique-nantes-5": 5
-        }
-        enigme_id = enigme_mapping.get(slug, 0)
+        enigme_id = ENIGME_IDS.get(slug, 0)
         
         # Vérifier si cette énigme n'a pas déjà été complétée globalement
-        global_completed = query_one("SELECT id FROM game_enigmes_completed WHERE game_id=%s AND enigme_id=%s", (gid, enigme_id))
+        global_completed = query_one("SELECT id FROM game_enigmes_completed WHERE game_id=%s AND enigme_id=%s", (bid(gid), enigme_id), primary=True)
         
         if not global_completed:
             # Marquer l'énigme comme complétée globalement
             execute("INSERT INTO game_enigmes_completed (game_id, enigme_id, completed_by, completed_at) VALUES (%s,%s,%s,%s)", 
-                   (gid, enigme_id, pid, now_utc()))
+                   (bid(gid), enigme_id, bid(pid), now_utc()), game=gid)
             
             # Mettre à jour le score du joueur
-            execute("UPDATE players SET score_total = score_total + %s WHERE id=%s", (PUZZLE_POINTS, pid))
-            
-            # Notifier tous les joueurs de la réussite
-            player = query_one("SELECT nickname FROM players WHERE id=%s", (pid,))
+            if not leaderboard.has_game(gid):
+                leaderboard.seed_game(gid, games.players(gid))
+            execute("UPDATE players SET score_total = score_total + %s WHERE id=%s", (PUZZLE_POINTS, bid(pid)), game=gid)
+            games.add_score(gid, pid, PUZZLE_POINTS)
+            leaderboard.record(gid, pid, get_player_name(gid, pid), PUZZLE_POINTS)
+            record_event(gid, "solve", {"slug": slug, "enigmeId": enigme_id, "points": PUZZLE_POINTS}, pid)
             
             # Récupérer toutes les énigmes complétées pour cette partie
-            completed_enigmes = query_all("SELECT enigme_id FROM game_enigmes_completed WHERE game_id=%s", (gid,))
+            completed_enigmes = query_all("SELECT enigme_id FROM game_enigmes_completed WHERE game_id=%s", (bid(gid),), game=gid)
             completed_ids = [row["enigme_id"] for row in completed_enigmes]
             
-            socketio.emit("puzzle:solved", {
-                "player": player["nickname"] if player else "Un joueur",
+            room_emit("puzzle:solved", {
+                "player": get_player_name(gid, pid),
                 "slug": slug,
                 "enigmeId": enigme_id,
                 "points": PUZZLE_POINTS,
                 "globalCompletedEnigmes": completed_ids
-            }, room=gid)
+            }, gid)
+            room_emit("leaderboard:update", {"scoreboard": leaderboard.game_board(gid)}, gid,
+                      public={"scoreboard": leaderboard.game_board(gid, ids=False)})
             
             # Vérifier si toutes les énigmes sont complétées
             if len(completed_ids) >= 5:
-                socketio.emit("game:completed", {
+                room_emit("game:completed", {
                     "message": "Toutes les énigmes ont été résolues !",
                     "completedEnigmes": completed_ids
-                }, room=gid)
+                }, gid)
+                leaderboard.forget_game(gid)
         else:
             # L'énigme a déjà été complétée par quelqu'un d'autre
             return jsonify({"ok": False, "message": "Cette énigme a déjà été résolue par un autre joueur"})
 
     return jsonify({"ok": ok})
 
-@app.get("/api/game/<game_id>/enigmes-completed")
+@bp.get("/api/game/<game_id>/enigmes-completed")
+@compression.policy(min_size=512)
+@batchable()
 def get_completed_enigmes(game_id):
     """Récupérer les énigmes complétées pour une partie"""
     claims = read_token_from_header()
@@ -545,7 +821,7 @@ def get_completed_enigmes(game_id):
         return ("", 403)
     
     try:
-        completed_enigmes = query_all("SELECT enigme_id, completed_by, completed_at FROM game_enigmes_completed WHERE game_id=%s ORDER BY completed_at", (gid,))
+        completed_enigmes = query_all("SELECT enigme_id, completed_by, completed_at FROM game_enigmes_completed WHERE game_id=%s ORDER BY completed_at", (bid(gid),), game=gid, stale_ok=True)
         completed_ids = [row["enigme_id"] for row in completed_enigmes]
         
         return jsonify({
@@ -555,74 +831,346 @@ def get_completed_enigmes(game_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@bp.get("/api/leaderboard")
+@batchable()
+def get_leaderboard():
+    """Classement global (fenêtre 1h, 24h ou all)"""
+    window = request.args.get("window", "all")
+    if window not in WINDOWS:
+        return jsonify({"error": "bad_window", "windows": list(WINDOWS)}), 400
+    limit = max(1, min(request.args.get("limit", 10, type=int), leaderboard.top_n))
+    return jsonify({"window": window, "entries": leaderboard.global_top(window, limit)})
+
+@bp.get("/api/games/<gid>/scoreboard")
+@batchable()
+def get_game_scoreboard(gid):
+    """Classement des joueurs d'une partie (identifiants des joueurs pour ses membres seulement)"""
+    claims = read_token_from_header()
+    entries = get_scoreboard(gid, ids=bool(claims) and claims.get("gid") == gid)
+    if entries is None:
+        return ("", 404)
+    return jsonify({"gameId": gid, "entries": entries})
+
+@bp.get("/api/games/<gid>/events")
+def get_game_events(gid):
+    """Rejoue le journal d'une partie (NDJSON, un événement par ligne) à partir de ?since=seq"""
+    claims = read_token_from_header()
+    if not claims:
+        return ("", 401)
+    if claims["gid"] != gid:
+        return ("", 403)
+
+    since = request.args.get("since", 0, type=int)
+
+    def generate():
+        for event in journal.replay(gid, since):
+            yield dumps(event) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+# ---------- Requêtes groupées ----------
+batch_runner = BatchRunner(
+    max_items=int(os.getenv("BATCH_MAX_REQUESTS", 20)),
+    workers=int(os.getenv("BATCH_WORKERS", 4)),
+)
+
+@bp.post("/api/batch")
+@compression.policy(min_size=512)
+def run_batch():
+    """Plusieurs lectures / validations en une requête : {"requests": [{id, method, path, body}]}
+
+    Le token est vérifié une fois pour tout le lot ; chaque sous-requête
+    garde son statut et son erreur dans `results` (même ordre).
+    """
+    claims = read_token_from_header()
+    if not claims:
+        return ("", 401)
+    items = (request.get_json(silent=True) or {}).get("requests")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "requests_required"}), 400
+    if len(items) > batch_runner.max_items:
+        return jsonify({"error": "too_many_requests", "max": batch_runner.max_items}), 400
+
+    token = request.headers["Authorization"].split(" ", 1)[1]
+    headers = {"Authorization": request.headers["Authorization"]}
+    results = batch_runner.run(current_app._get_current_object(), items, headers, token, claims)
+    return jsonify({"results": results})
+
+# ---------- Export analytique (protégé par EXPORT_TOKEN, désactivé sinon) ----------
+def parse_utc(value, default):
+    if not value:
+        return default
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+@bp.get("/api/admin/export")
+def export_sessions():
+    """Parties closes entre ?from= et ?to= en CSV (flux), ou agrégats par énigme avec ?format=summary.
+    ?incremental=<nom> reprend après le dernier export de ce nom et avance le filigrane une fois l'export complet.
+    """
+    expected = os.getenv("EXPORT_TOKEN")
+    if not expected:
+        return ("", 404)
+    if not hmac.compare_digest(request.headers.get("X-Export-Token", ""), expected):
+        return ("", 401)
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "summary"):
+        return jsonify({"error": "bad_format", "formats": ["csv", "summary"]}), 400
+    try:
+        since = parse_utc(request.args.get("from"), datetime(1970, 1, 1, tzinfo=timezone.utc))
+        until = min(parse_utc(request.args.get("to"), analytics.closed_until()), analytics.closed_until())
+    except ValueError:
+        return jsonify({"error": "bad_date", "message": "from / to au format ISO 8601"}), 400
+
+    name = request.args.get("incremental")
+    after = analytics.load_watermark(name) if name else None
+    aggregates = analytics.EnigmeAggregates()
+    watermark = {}
+    chunks = analytics.aggregate(analytics.iter_chunks(since, until, after), aggregates, watermark)
+
+    if fmt == "summary":
+        for _ in chunks:
+            pass
+        if name:
+            analytics.save_watermark(name, watermark)
+        return jsonify({"from": since, "to": until, **aggregates.to_api()})
+
+    def generate():
+        yield from analytics.csv_lines(chunks)
+        # Filigrane avancé seulement si le client a tout reçu
+        if name:
+            analytics.save_watermark(name, watermark)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=sessions-{until:%Y%m%d-%H%M}.csv"},
+    )
+
 # ---------- SOCKET.IO ----------
+presence = PresenceIndex(
+    grace=float(os.getenv("PRESENCE_GRACE_SECONDS", 5)),
+    flush_interval=float(os.getenv("PRESENCE_FLUSH_SECONDS", 5)),
+)
+
+def on_player_offline(sess):
+    """Appelé par l'index de présence une fois le délai de grâce écoulé"""
+    room_emit("player:disconnected", {
+        "player": sess.name,
+        "playerId": sess.pid,
+        "onlineCount": presence.online_count(sess.gid),
+    }, sess.gid)
+    print(f"❌ Player {sess.name} left room {sess.gid}")
+
+def read_socket_claims(event, data):
+    """Claims et payload d'un événement : JSON avec token, ou trame binaire d'une session déjà authentifiée"""
+    if isinstance(data, (bytes, bytearray)):
+        sess = presence.session(request.sid)
+        if not sess or not wire.msgpack:
+            return None, None
+        return {"gid": sess.gid, "pid": sess.pid}, wire.decode(event, data)
+
+    token = (data or {}).get("token")
+    if not token:
+        return None, None
+    return decode_token(token), data
+
+def send_compact(event, gid, payload, skip_sid=None):
+    """Envoie un événement fréquent à la room, dans le format négocié par chaque client"""
+    sender = presence.session(skip_sid) if skip_sid else None
+    with resume.emitting(gid) as log:
+        stamp, pre = resume.record(log, event, payload, sender.pid if sender else None)
+        socketio.emit(event, pre, room=wire.room_for(gid, wire.JSON), skip_sid=skip_sid)
+        spectators.publish(gid, event, pre)
+        if wire.msgpack:
+            packed = payload if stamp is None else {**payload, RESUME_FIELD: stamp}
+            socketio.emit(event, wire.encode(event, packed), room=wire.room_for(gid, wire.MSGPACK), skip_sid=skip_sid)
+
+outbox = RoomOutbox(
+    send_compact,
+    interval=float(os.getenv("SOCKET_FLUSH_INTERVAL", 0.05)),
+)
+
+def broadcast_compact(event, gid, payload):
+    """Diffuse aux autres membres de la room ; les événements d'état passent par la file bornée"""
+    payload = wire.strip_private(payload)
+    if event in STATE_EVENTS:
+        outbox.push(gid, event, payload, sender=request.sid)
+        return
+    send_compact(event, gid, payload, skip_sid=request.sid)
+
 @socketio.on("connect")
-def on_connect():
+@timings.timed("connect")
+def on_connect(auth=None):
     print("✅ Client connected")
     emit("system:hello", {"msg": "connected"})
 
 @socketio.on("disconnect")
+@timings.timed("disconnect")
 def on_disconnect():
+    presence.leave(request.sid)
+    spectators.leave(request.sid)
+    limiter.forget(request.sid)
     print("❌ Client disconnected")
 
+def enter_room(gid, pid, fmt):
+    """Rejoint les rooms Socket.IO de la partie et enregistre la présence ; retourne (pseudo, vient d'arriver)"""
+    join_room(gid)
+    join_room(wire.room_for(gid, fmt))
+    player_name = get_player_name(gid, pid)
+    return player_name, presence.join(request.sid, gid, pid, player_name, fmt)
+
+def announce_online(gid, pid, player_name):
+    room_emit("player:connected", {
+        "player": player_name,
+        "playerId": pid,
+        "onlineCount": presence.online_count(gid),
+    }, gid, include_self=False)
+
+def send_room_joined(gid, fmt):
+    """État complet de la room (joueurs, énigmes résolues) ; amorce le tampon de reprise"""
+    # Récupérer et envoyer la liste des joueurs
+    players = get_game_players(gid)
+
+    # Récupérer les énigmes complétées globalement
+    completed_enigmes = query_all("SELECT enigme_id FROM game_enigmes_completed WHERE game_id=%s", (bid(gid),), game=gid, stale_ok=True)
+    completed_ids = [row["enigme_id"] for row in completed_enigmes]
+    epoch, seq = resume.prime(gid, completed_ids)
+
+    emit("room:joined", {
+        "gid": gid,
+        "wire": fmt,
+        "epoch": epoch,
+        "seq": seq,
+        "players": players,
+        "online": presence.online_players(gid),
+        "gameState": {
+            "completedEnigmes": completed_ids,
+            "gamePhase": "completed" if len(completed_ids) >= 5 else "playing"
+        }
+    })
+
 @socketio.on("room:join")
+@throttle("room:join")
+@timings.timed("room:join")
 def on_room_join(data):
     """Rejoindre une room Socket.IO"""
     try:
-        import jwt
-        from services.auth import JWT_SECRET
-
         token = (data or {}).get("token")
         if not token:
             emit("system:error", {"msg": "No token provided"})
             return
 
-        claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        claims = decode_token(token)
         gid = claims["gid"]
         pid = claims["pid"]
 
-        join_room(gid)
-
-        # Récupérer et envoyer la liste des joueurs
-        players = get_game_players(gid)
-        
-        # Récupérer les énigmes complétées globalement
-        completed_enigmes = query_all("SELECT enigme_id FROM game_enigmes_completed WHERE game_id=%s", (gid,))
-        completed_ids = [row["enigme_id"] for row in completed_enigmes]
-        
-        emit("room:joined", {
-            "gid": gid, 
-            "players": players,
-            "gameState": {
-                "completedEnigmes": completed_ids,
-                "gamePhase": "completed" if len(completed_ids) >= 5 else "playing"
-            }
-        })
+        fmt = wire.negotiate((data or {}).get("wire"))
+        player_name, came_online = enter_room(gid, pid, fmt)
+        send_room_joined(gid, fmt)
 
-        # Notifier les autres joueurs
-        player = query_one("SELECT nickname FROM players WHERE id=%s", (pid,))
-        emit("player:connected", {
-            "player": player["nickname"] if player else "Un joueur"
-        }, room=gid, include_self=False)
+        # Notifier les autres joueurs (pas pour une simple reconnexion)
+        if came_online:
+            announce_online(gid, pid, player_name)
 
-        print(f"✅ Player {player['nickname'] if player else pid} joined room {gid}")
+        print(f"✅ Player {player_name} joined room {gid}")
 
     except Exception as e:
         print(f"❌ Error in room:join: {e}")
         emit("system:error", {"msg": "unauthorized"})
 
+@socketio.on("room:resume")
+@throttle("room:resume")
+@timings.timed("room:resume")
+def on_room_resume(data):
+    """Reprendre une session après une coupure : événements manqués depuis ?seq, ou instantané, sans requête base"""
+    try:
+        data = data or {}
+        token = data.get("token")
+        if not token:
+            emit("system:error", {"msg": "No token provided"})
+            return
+
+        claims = decode_token(token)
+        gid = claims["gid"]
+        pid = claims["pid"]
+
+        fmt = wire.negotiate(data.get("wire"))
+        player_name, came_online = enter_room(gid, pid, fmt)
+        plan = resume.resume(gid, data.get("epoch"), int(data.get("seq") or 0), pid)
+        if plan is None:
+            # Room plus en mémoire (redémarrage, éviction) : état complet depuis la base
+            send_room_joined(gid, fmt)
+        else:
+            game = games.cached(gid)
+            emit("room:resumed", {
+                "gid": gid,
+                "wire": fmt,
+                "epoch": plan["epoch"],
+                "seq": plan["seq"],
+                "replayed": len(plan["frames"]),
+                "online": presence.online_players(gid),
+                "gameState": plan["snapshot"],
+                "players": [p.to_api() for p in game.players] if plan["snapshot"] and game else None,
+            })
+            # Trames déjà encodées : manquées (dans l'ordre) ou dernier état de chaque joueur
+            for event, payload in plan["frames"]:
+                emit(event, payload)
+
+        if came_online:
+            announce_online(gid, pid, player_name)
+
+    except Exception as e:
+        print(f"❌ Error in room:resume: {e}")
+        emit("system:error", {"msg": "unauthorized"})
+
+@socketio.on("spectate:join")
+@throttle("spectate:join")
+@timings.timed("spectate:join")
+def on_spectate_join(data):
+    """Suivre une partie en spectateur (grand écran) : lecture seule, sans place joueur"""
+    try:
+        data = data or {}
+        code = (data.get("code") or "").upper().strip()
+        game = games.get(data["gameId"]) if data.get("gameId") else (games.by_code(code) if code else None)
+        if not game:
+            emit("system:error", {"msg": "not_found"})
+            return
+
+        join_room(spectator_room(game.id))
+        frames = spectators.join(request.sid, game.id)
+        emit("spectate:joined", {
+            "gid": game.id,
+            "code": game.code,
+            "status": game.status,
+            "players": [{k: v for k, v in p.to_api().items() if k != "id"} for p in game.players],
+            "spectators": spectators.count(game.id),
+        })
+        # Mise à niveau depuis le tampon partagé (déjà encodé)
+        for event, payload in frames:
+            emit(event, payload)
+
+    except Exception as e:
+        print(f"❌ Error in spectate:join: {e}")
+        emit("system:error", {"msg": "spectate_failed"})
+
+@socketio.on("spectate:ack")
+@throttle("spectate:ack")
+def on_spectate_ack(data):
+    """Accusé de réception du grand écran : nombre total de trames reçues depuis spectate:join"""
+    spectators.ack(request.sid, (data or {}).get("received"))
+
 @socketio.on("chat:msg")
+@throttle("chat:msg")
+@timings.timed("chat:msg")
 def on_chat_msg(data):
     """Gérer les messages de chat"""
     try:
-        import jwt
-        from services.auth import JWT_SECRET
-
         token = (data or {}).get("token")
         if not token:
             return
 
-        claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        claims = decode_token(token)
         gid = claims["gid"]
         pid = claims["pid"]
 
@@ -630,128 +1178,119 @@ def on_chat_msg(data):
         if not txt:
             return
 
-        player = query_one("SELECT nickname FROM players WHERE id=%s", (pid,))
-        sender_name = player["nickname"] if player else "Anonyme"
+        sender_name = get_player_name(gid, pid, "Anonyme")
 
         print(f"💬 Chat from {sender_name} in {gid}: {txt}")
+        record_event(gid, "chat", {"text": txt}, pid)
 
-        socketio.emit("chat:msg", {
+        room_emit("chat:msg", {
             "from": pid,
             "sender": sender_name,
             "text": txt,
             "timestamp": datetime.now().isoformat()
-        }, room=gid)
+        }, gid)
 
     except Exception as e:
         print(f"❌ Error in chat:msg: {e}")
 
 @socketio.on("puzzle:state")
+@throttle("puzzle:state")
+@timings.timed("puzzle:state")
 def on_puzzle_state(data):
     """Synchroniser l'état des puzzles entre joueurs"""
     try:
-        import jwt
-        from services.auth import JWT_SECRET
-
-        token = (data or {}).get("token")
-        if not token:
+        claims, data = read_socket_claims("puzzle:state", data)
+        if not claims:
             return
-
-        claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
         gid = claims["gid"]
 
-        socketio.emit("puzzle:state", data, room=gid, include_self=False)
+        data = wire.strip_private(data)
+        record_event(gid, "state", {"event": "puzzle:state", "patch": data}, claims["pid"])
+        broadcast_compact("puzzle:state", gid, data)
 
     except Exception as e:
         print(f"❌ Error in puzzle:state: {e}")
 
 @socketio.on("game:state:update")
+@throttle("game:state:update")
+@timings.timed("game:state:update")
 def on_game_state_update(data):
     """Synchroniser l'état global du jeu entre joueurs"""
     try:
-        import jwt
-        from services.auth import JWT_SECRET
-
-        token = (data or {}).get("token")
-        if not token:
+        claims, data = read_socket_claims("game:state:update", data)
+        if not claims:
             return
-
-        claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
         gid = claims["gid"]
 
-        socketio.emit("game:state:update", data, room=gid, include_self=False)
+        data = wire.strip_private(data)
+        record_event(gid, "state", {"event": "game:state:update", "patch": data}, claims["pid"])
+        broadcast_compact("game:state:update", gid, data)
 
     except Exception as e:
         print(f"❌ Error in game:state:update: {e}")
 
 @socketio.on("player:enigme:select")
+@throttle("player:enigme:select")
+@timings.timed("player:enigme:select")
 def on_player_enigme_select(data):
     """Notifier la sélection d'énigme d'un joueur"""
     try:
-        import jwt
-        from services.auth import JWT_SECRET
-
         token = (data or {}).get("token")
         if not token:
             return
 
-        claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        claims = decode_token(token)
         gid = claims["gid"]
         pid = claims["pid"]
 
-        player = query_one("SELECT nickname FROM players WHERE id=%s", (pid,))
-        player_name = player["nickname"] if player else "Un joueur"
+        player_name = get_player_name(gid, pid)
 
-        socketio.emit("player:enigme:select", {
+        room_emit("player:enigme:select", {
             "enigmeId": data.get("enigmeId"),
             "playerName": player_name
-        }, room=gid, include_self=False)
+        }, gid, include_self=False)
 
     except Exception as e:
         print(f"❌ Error in player:enigme:select: {e}")
 
 @socketio.on("player:position:update")
+@throttle("player:position:update")
+@timings.timed("player:position:update")
 def on_player_position_update(data):
     """Synchroniser la position des joueurs dans la salle de sélection"""
     try:
-        import jwt
-        from services.auth import JWT_SECRET
-
-        token = (data or {}).get("token")
-        if not token:
+        claims, data = read_socket_claims("player:position:update", data)
+        if not claims:
             return
-
-        claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
         gid = claims["gid"]
         pid = claims["pid"]
 
-        player = query_one("SELECT nickname FROM players WHERE id=%s", (pid,))
-        player_name = player["nickname"] if player else "Un joueur"
+        player_name = get_player_name(gid, pid)
 
-        socketio.emit("player:position:update", {
+        broadcast_compact("player:position:update", gid, {
             "x": data.get("x"),
             "y": data.get("y"),
             "playerName": player_name
-        }, room=gid, include_self=False)
+        })
 
     except Exception as e:
         print(f"❌ Error in player:position:update: {e}")
 
 @socketio.on("game:state:request")
+@throttle("game:state:request")
+@timings.timed("game:state:request")
 def on_game_state_request(data):
     """Demander l'état actuel du jeu"""
     try:
-        import jwt
-        from services.auth import JWT_SECRET
-
         token = (data or {}).get("token")
         if not token:
             return
 
-        claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        claims = decode_token(token)
         gid = claims["gid"]
         
         # Récupérer les énigmes complétées globalement
-        completed_enigmes = query_all("SELECT enigme_id FROM game_enigmes_completed WHERE game_id=%s", (gid,))
+        completed_enigmes = query_all("SELECT enigme_id FROM game_enigmes_completed WHERE game_id=%s", (bid(gid),), game=gid, stale_ok=True)
         completed_ids = [row["enigme_id"] for row in completed_enigmes]
         
         emit("game:state:response", {
@@ -763,31 +1302,98 @@ def on_game_state_request(data):
         print(f"❌ Error in game:state:request: {e}")
 
 # ---------- Proxy pour médias ----------
-@app.get("/audio-proxy")
+def audio_type(url, ct):
+    if ct and ct != "application/octet-stream":
+        return ct
+    lower = url.lower()
+    if lower.endswith('.mp3'):
+        return 'audio/mpeg'
+    if lower.endswith('.wav'):
+        return 'audio/wav'
+    if lower.endswith('.ogg') or lower.endswith('.oga'):
+        return 'audio/ogg'
+    return 'audio/mpeg'
+
+MEDIA_CONNECT_TIMEOUT = float(os.getenv("MEDIA_CONNECT_TIMEOUT", 3))
+
+def upstream_failure(exc):
+    """Erreurs qui comptent pour le disjoncteur de l'hôte amont (pas les 4xx)"""
+    import requests
+
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout, media.MediaError))
+
+def upstream_get(url, read_timeout, **kwargs):
+    """GET amont borné par le budget de la requête, derrière le disjoncteur de l'hôte ; 5xx -> MediaError"""
+    import requests
+
+    with breakers.get(f"media:{urlparse(url).hostname}").guard(upstream_failure):
+        try:
+            r = requests.get(url, timeout=http_timeout(MEDIA_CONNECT_TIMEOUT, read_timeout), **kwargs)
+        except requests.Timeout:
+            raise media.MediaError("upstream_timeout")
+        if r.status_code >= 500:
+            r.close()
+            raise media.MediaError(f"fetch_failed {r.status_code}")
+    return r
+
+def fetch_source(url):
+    """Original amont lu en flux : la lecture s'arrête dès que MAX_SOURCE_BYTES est dépassé"""
+    import requests
+
+    r = upstream_get(url, 15, stream=True)
+    try:
+        if r.status_code != 200:
+            raise media.MediaError(f"fetch_failed {r.status_code}")
+        if int(r.headers.get("Content-Length") or 0) > media.MAX_SOURCE_BYTES:
+            raise media.MediaError("média source trop volumineux")
+        try:
+            data = media.read_capped(r.iter_content(chunk_size=65536))
+        except requests.RequestException:
+            raise media.MediaError("upstream_timeout")
+        return data, r.headers.get("Content-Type")
+    finally:
+        r.close()
+
+# Originaux amont en cache disque, remplis par le préchargement de début de partie
+sources = media.SourceCache(fetch_source)
+
+# Largeurs de tuiles préchargées pour le puzzle 3x3 (tuiles de 80 à 140 px, écrans 1x et 2x)
+WARM_TILE_WIDTHS = [int(w) for w in os.getenv("MEDIA_WARM_WIDTHS", "160,240").split(",") if w]
+
+def warm_media(manifest):
+    """Tâche de fond : télécharge les médias de la partie et prépare les tuiles du puzzle"""
+    for item in manifest["media"]:
+        try:
+            sources.load(item["url"])
+            if item["kind"] == "image" and media_pipeline.available:
+                for w in WARM_TILE_WIDTHS:
+                    params = {"w": media.snap_width(w, media.TILE_WIDTHS), "fmt": "webp", "grid": 3, "tile": 0, "q": 80}
+                    media_pipeline.derivative(item["url"], params, fetch_image_bytes)
+        except Exception as e:
+            print(f"❌ Error warming {item['url']}: {e}")
+
+@bp.get("/audio-proxy")
 def audio_proxy():
     """Proxy audio pour contourner les problèmes CORS"""
     url = request.args.get("url")
     if not url:
         return jsonify({"error": "missing_url"}), 400
 
+    hit = sources.lookup(url)
+    if hit:
+        # send_file gère Range / 206 à partir du fichier en cache
+        resp = send_file(hit[0], mimetype=audio_type(url, hit[1]), conditional=True, max_age=86400)
+        resp.headers["Access-Control-Allow-Origin"] = "*"
+        return resp
+
     try:
         range_header = request.headers.get('Range')
         req_headers = {"Range": range_header} if range_header else {}
-        r = requests.get(url, headers=req_headers, stream=True, timeout=15)
+        r = upstream_get(url, 15, headers=req_headers, stream=True)
         if r.status_code not in (200, 206):
             return jsonify({"error": "fetch_failed", "status": r.status_code}), 400
 
-        ct = r.headers.get("Content-Type") or ""
-        if not ct or ct == "application/octet-stream":
-            lower = url.lower()
-            if lower.endswith('.mp3'):
-                ct = 'audio/mpeg'
-            elif lower.endswith('.wav'):
-                ct = 'audio/wav'
-            elif lower.endswith('.ogg') or lower.endswith('.oga'):
-                ct = 'audio/ogg'
-            else:
-                ct = 'audio/mpeg'
+        ct = audio_type(url, r.headers.get("Content-Type"))
 
         headers = {
             "Content-Type": ct,
@@ -799,18 +1405,60 @@ def audio_proxy():
 
         status = r.status_code
         return Response(r.iter_content(chunk_size=65536), headers=headers, status=status)
+    except (CircuitOpen, DeadlineExceeded):
+        raise
+    except media.MediaError as e:
+        return jsonify({"error": "fetch_failed", "message": str(e)}), 502
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.get("/image-proxy")
+media_pipeline = media.DerivativePipeline(
+    workers=int(os.getenv("MEDIA_WORKERS", 2)),
+    max_pending=int(os.getenv("MEDIA_MAX_PENDING", 16)),
+    max_cache_bytes=int(os.getenv("MEDIA_CACHE_MAX_MB", 1024)) * 1024 * 1024,
+    max_cache_age=float(os.getenv("MEDIA_CACHE_MAX_AGE_HOURS", 168)) * 3600,
+)
+
+def fetch_image_bytes(url):
+    return sources.read(url)
+
+@bp.get("/image-proxy")
 def image_proxy():
-    """Proxy image pour contourner les problèmes CORS/mixed content"""
+    """Proxy image pour contourner les problèmes CORS/mixed content.
+    Avec ?w=&fmt=&grid=&tile=, sert un dérivé redimensionné (WebP/JPEG) ou une tuile de puzzle depuis le cache disque.
+    """
     url = request.args.get("url")
     if not url:
         return jsonify({"error": "missing_url"}), 400
 
     try:
-        r = requests.get(url, stream=True, timeout=10)
+        params = media.parse_params(request.args, request.headers.get("Accept", ""))
+    except media.MediaError as e:
+        return jsonify({"error": "bad_params", "message": str(e)}), 400
+
+    if params and media_pipeline.available:
+        try:
+            path = media_pipeline.derivative(url, params, fetch_image_bytes)
+        except Exception as e:
+            print(f"❌ Error rendering image derivative: {e}")
+            path = None
+        if path:
+            resp = send_file(path, mimetype=media.FORMATS[params["fmt"]], max_age=86400)
+            resp.headers["Access-Control-Allow-Origin"] = "*"
+            resp.headers["Vary"] = "Accept"
+            return resp
+    if params and params["grid"]:
+        # Une tuile ne peut pas être remplacée par l'original : le client repasse au découpage CSS
+        return jsonify({"error": "derivative_unavailable"}), 503
+
+    hit = sources.lookup(url)
+    if hit:
+        resp = send_file(hit[0], mimetype=hit[1] or "image/jpeg", max_age=86400)
+        resp.headers["Access-Control-Allow-Origin"] = "*"
+        return resp
+
+    try:
+        r = upstream_get(url, 10, stream=True)
         if r.status_code != 200:
             return jsonify({"error": "fetch_failed", "status": r.status_code}), 400
 
@@ -820,13 +1468,157 @@ def image_proxy():
             "Access-Control-Allow-Origin": "*"
         }
         return Response(r.iter_content(chunk_size=4096), headers=headers)
+    except (CircuitOpen, DeadlineExceeded):
+        raise
+    except media.MediaError as e:
+        return jsonify({"error": "fetch_failed", "message": str(e)}), 502
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.get("/health")
+# ---------- Dépendance indisponible / budget épuisé ----------
+@bp.app_errorhandler(CircuitOpen)
+def circuit_open(e):
+    resp = jsonify({"error": "dependency_unavailable", "dependency": e.name})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(max(1, round(e.retry_after)))
+    return resp
+
+@bp.app_errorhandler(DeadlineExceeded)
+def deadline_exceeded(e):
+    return jsonify({"error": "deadline_exceeded"}), 503
+
+@bp.get("/health")
 def health():
-    return {"ok": True, "timestamp": now_utc().isoformat()}
+    return {
+        "ok": True,
+        "timestamp": now_utc().isoformat(),
+        "sockets": backpressure_stats(outbox),
+        "spectators": spectators.stats(),
+        "resume": resume.stats(),
+        "roomCodes": codes.stats(),
+        "media": {"sources": sources.stats(), "derivatives": media_pipeline.stats()},
+        "db": db_router.stats(),
+        "compression": compressor.stats.snapshot(),
+        "batch": batch_runner.stats(),
+        "sharedCache": shared_cache.stats(),
+        "breakers": breakers.stats(),
+        "deadlines": dict(resilience.stats),
+    }
+
+# ---------- Debug (protégé par DEBUG_TOKEN, désactivé sinon) ----------
+def debug_allowed():
+    expected = os.getenv("DEBUG_TOKEN")
+    # En-tête seulement : un jeton en query string finit dans les logs et l'historique
+    given = request.headers.get("X-Debug-Token", "")
+    return bool(expected) and hmac.compare_digest(given.encode(), expected.encode())
+
+@bp.get("/debug/timings")
+def debug_timings():
+    """Durées par route et par événement socket (?reset=1 remet à zéro)"""
+    if not debug_allowed():
+        return ("", 404)
+    return jsonify({"enabled": timings.enabled, "timings": timings.snapshot(reset=request.args.get("reset") == "1")})
+
+@bp.get("/debug/profile")
+def debug_profile():
+    """Profil par échantillonnage pendant ?seconds=N, au format collapsed stacks (flamegraph)"""
+    if not debug_allowed():
+        return ("", 404)
+    result = profiler.profile(
+        request.args.get("seconds", 10, type=float),
+        hz=request.args.get("hz", 100, type=int),
+        include_idle=request.args.get("idle") == "1",
+    )
+    if result is None:
+        return jsonify({"error": "profile_running"}), 409
+    stacks, samples = result
+    return Response(collapsed(stacks), mimetype="text/plain", headers={"X-Profile-Samples": str(samples)})
+
+# ---------- Application ----------
+DEFAULT_CONFIG = {
+    "CORS_ORIGINS": os.getenv("CORS_ORIGINS", "*").split(","),
+    "SOCKET_ASYNC_MODE": os.getenv("SOCKET_ASYNC_MODE", "threading"),
+    "AUTO_SCHEMA": os.getenv("AUTO_SCHEMA", "1") == "1",
+    "COMPRESS_MIN_SIZE": int(os.getenv("COMPRESS_MIN_SIZE", 1024)),
+    "WS_DEFLATE": os.getenv("WS_DEFLATE", "1") == "1",
+    "WS_DEFLATE_MIN_SIZE": int(os.getenv("WS_DEFLATE_MIN_SIZE", 256)),
+    "WS_DEFLATE_WINDOW_BITS": int(os.getenv("WS_DEFLATE_WINDOW_BITS", 15)),
+    "WS_DEFLATE_NO_CONTEXT_TAKEOVER": os.getenv("WS_DEFLATE_NO_CONTEXT_TAKEOVER", "0") == "1",
+    "REQUEST_DEADLINE": float(os.getenv("REQUEST_DEADLINE", 8)),
+    "REQUEST_DEADLINE_MAX": float(os.getenv("REQUEST_DEADLINE_MAX", 30)),
+}
+
+# Compression des réponses JSON (après coup, selon taille et type) ; réglages par route via @compression.policy
+compressor = compression.ResponseCompressor(
+    gzip_level=int(os.getenv("COMPRESS_GZIP_LEVEL", 6)),
+    brotli_quality=int(os.getenv("COMPRESS_BROTLI_QUALITY", 5)),
+    enabled=os.getenv("COMPRESS", "1") == "1",
+)
+
+def create_app(config=None):
+    """Construit l'application sans aucun accès réseau ni base (voir startup())"""
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+    app.json = FastJSONProvider(app)
+    CORS(app, resources={r"/*": {"origins": app.config["CORS_ORIGINS"]}})
+    app.register_blueprint(bp)
+    timings.install(app)
+    resilience.install(app, app.config["REQUEST_DEADLINE"], app.config["REQUEST_DEADLINE_MAX"])
+    compressor.min_size = app.config["COMPRESS_MIN_SIZE"]
+    compressor.install(app)
+    socketio.init_app(
+        app,
+        cors_allowed_origins=app.config["CORS_ORIGINS"],
+        async_mode=app.config["SOCKET_ASYNC_MODE"],
+        json=socketio_json,
+        # Transport polling : même seuil que les réponses REST
+        http_compression=compressor.enabled,
+        compression_threshold=app.config["COMPRESS_MIN_SIZE"],
+    )
+    compression.install_websocket_deflate(
+        socketio,
+        compressor.stats,
+        min_size=app.config["WS_DEFLATE_MIN_SIZE"],
+        window_bits=app.config["WS_DEFLATE_WINDOW_BITS"],
+        no_context_takeover=app.config["WS_DEFLATE_NO_CONTEXT_TAKEOVER"],
+        enabled=app.config["WS_DEFLATE"],
+    )
+    return app
+
+def startup(app):
+    """Phase de démarrage explicite : schéma, préchauffage du pool, caches et tâches de fond"""
+    t0 = time.perf_counter()
+    if app.config["AUTO_SCHEMA"]:
+        init_database()
+        ensure_schema()
+    try:
+        size = warm_up_pool()
+        answers.ensure_loaded()
+        catalog.refresh()
+        codes.refill()
+        print(f"✅ Pool MySQL prêt ({size} connexions)")
+    except Exception as e:
+        print(f"❌ Préchauffage du pool impossible: {e}")
+
+    answers.start(socketio, interval=float(os.getenv("ANSWERS_REFRESH_SECONDS", 300)))
+    leaderboard.start(
+        socketio,
+        interval=float(os.getenv("LEADERBOARD_SNAPSHOT_SECONDS", 60)),
+        refresh=float(os.getenv("LEADERBOARD_REFRESH_SECONDS", 30)),
+    )
+    journal.start(socketio, interval=float(os.getenv("EVENTS_FLUSH_SECONDS", 1)))
+    presence.start(socketio, on_player_offline)
+    outbox.start(socketio)
+    codes.start(socketio, recycle_interval=float(os.getenv("ROOM_CODES_RECYCLE_SECONDS", 300)))
+    db_router.start(socketio, interval=float(os.getenv("DB_REPLICA_CHECK_SECONDS", 2)))
+    media_pipeline.start(socketio, interval=float(os.getenv("MEDIA_CACHE_PRUNE_SECONDS", 600)))
+    if game_invalidations is not None:
+        game_invalidations.start(socketio, on_game_invalidated, interval=float(os.getenv("SHARED_CACHE_POLL_SECONDS", 0.5)))
+    print(f"✅ Démarrage terminé en {(time.perf_counter() - t0) * 1000:.0f} ms")
 
 if __name__ == "__main__":
     print("🚀 Server starting...")
+    app = create_app()
+    startup(app)
     socketio.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 5000)))
\ No newline at end of file
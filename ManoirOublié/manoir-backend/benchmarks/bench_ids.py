@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Identifiants VARCHAR(36) hex vs BINARY(16) : taille des index et vitesse des recherches
+Usage: python benchmarks/bench_ids.py [--games 20000] [--players 4] [--lookups 5000] [--keep]
+
+Crée deux paires de tables jetables (bench_games_* / bench_players_*) dans la base
+configurée (DB_HOST... ou DATABASE_URL), mesure DATA_LENGTH / INDEX_LENGTH après
+ANALYZE TABLE, puis le temps moyen d'une recherche par clé primaire, par clé
+étrangère et d'une jointure. Les tables sont supprimées à la fin sauf --keep.
+"""
+
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.db import get_conn
+
+SCHEMAS = {
+    "hex": ("VARCHAR(36)", lambda h: h),
+    "bin": ("BINARY(16)", bytes.fromhex),
+}
+
+
+def create(cur, kind):
+    col, _ = SCHEMAS[kind]
+    cur.execute(f"DROP TABLE IF EXISTS bench_players_{kind}")
+    cur.execute(f"DROP TABLE IF EXISTS bench_games_{kind}")
+    cur.execute(f"CREATE TABLE bench_games_{kind} (id {col} PRIMARY KEY, code VARCHAR(16), status VARCHAR(16) NOT NULL) ENGINE=InnoDB")
+    cur.execute(
+        f"CREATE TABLE bench_players_{kind} (id {col} PRIMARY KEY, game_id {col} NOT NULL, nickname VARCHAR(100) NOT NULL, "
+        f"score_total INT NOT NULL DEFAULT 0, INDEX idx_game (game_id), "
+        f"FOREIGN KEY (game_id) REFERENCES bench_games_{kind}(id) ON DELETE CASCADE) ENGINE=InnoDB"
+    )
+
+
+def fill(conn, cur, kind, game_ids, players_per_game):
+    _, conv = SCHEMAS[kind]
+    for i in range(0, len(game_ids), 1000):
+        chunk = game_ids[i:i + 1000]
+        cur.executemany(f"INSERT INTO bench_games_{kind} (id, code, status) VALUES (%s,%s,%s)",
+                        [(conv(g), g[:6].upper(), "waiting") for g in chunk])
+        cur.executemany(f"INSERT INTO bench_players_{kind} (id, game_id, nickname) VALUES (%s,%s,%s)",
+                        [(conv(os.urandom(16).hex()), conv(g), "Agent") for g in chunk for _ in range(players_per_game)])
+        conn.commit()
+
+
+def sizes(cur, kind):
+    out = {}
+    for table in (f"bench_games_{kind}", f"bench_players_{kind}"):
+        cur.execute(f"ANALYZE TABLE {table}")
+        cur.fetchall()
+        cur.execute(
+            "SELECT data_length, index_length FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+            (table,),
+        )
+        data, index = cur.fetchone()
+        out[table] = (int(data), int(index))
+    return out
+
+
+def timed(cur, sql, params_list):
+    t0 = time.perf_counter()
+    for params in params_list:
+        cur.execute(sql, params)
+        cur.fetchall()
+    return (time.perf_counter() - t0) / len(params_list) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=20000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    game_ids = [os.urandom(16).hex() for _ in range(args.games)]
+    sample = random.sample(game_ids, min(args.lookups, len(game_ids)))
+
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            results = {}
+            for kind, (_, conv) in SCHEMAS.items():
+                create(cur, kind)
+                t0 = time.perf_counter()
+                fill(conn, cur, kind, game_ids, args.players)
+                load_s = time.perf_counter() - t0
+                keys = [(conv(g),) for g in sample]
+                results[kind] = {
+                    "sizes": sizes(cur, kind),
+                    "load_s": load_s,
+                    "pk_us": timed(cur, f"SELECT id, status FROM bench_games_{kind} WHERE id=%s", keys),
+                    "fk_us": timed(cur, f"SELECT id, nickname FROM bench_players_{kind} WHERE game_id=%s", keys),
+                    "join_us": timed(
+                        cur,
+                        f"SELECT g.id, COUNT(p.id) FROM bench_games_{kind} g LEFT JOIN bench_players_{kind} p "
+                        f"ON g.id = p.game_id WHERE g.id=%s GROUP BY g.id",
+                        keys,
+                    ),
+                }
+
+            print(f"{args.games} parties, {args.games * args.players} joueurs, {len(sample)} recherches\n")
+            print(f"{'table':<22}{'données Ko':>12}{'index Ko':>12}")
+            for kind in SCHEMAS:
+                for table, (data, index) in results[kind]["sizes"].items():
+                    print(f"{table:<22}{data / 1024:>12.0f}{index / 1024:>12.0f}")
+            print(f"\n{'':<10}{'chargement s':>14}{'PK µs':>10}{'FK µs':>10}{'jointure µs':>14}")
+            for kind in SCHEMAS:
+                r = results[kind]
+                print(f"{kind:<10}{r['load_s']:>14.2f}{r['pk_us']:>10.1f}{r['fk_us']:>10.1f}{r['join_us']:>14.1f}")
+
+            if not args.keep:
+                for kind in SCHEMAS:
+                    cur.execute(f"DROP TABLE IF EXISTS bench_players_{kind}")
+                    cur.execute(f"DROP TABLE IF EXISTS bench_games_{kind}")
+
+
+if __name__ == "__main__":
+    main()
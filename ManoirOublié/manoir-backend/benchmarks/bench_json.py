@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark de sérialisation JSON des trames REST / Socket.IO
+Usage: python benchmarks/bench_json.py [--frames 20000] [--room-size 4]
+"""
+
+import argparse, json, os, sys, time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services import serialization
+from services.serialization import dumps, encode_once
+
+
+def sample_frames():
+    now = datetime.now(timezone.utc)
+    players = [{"id": os.urandom(16).hex(), "name": f"Agent{i}", "role": "analyst", "ready": True, "score": 400 * i} for i in range(4)]
+    return {
+        "puzzle:state": {"pieces": list(range(16)), "moved": 7, "solved": False},
+        "players:update": {"players": players},
+        "player:position:update": {"x": 412.5, "y": 233.0, "playerName": "Agent1"},
+        "get_game": {
+            "game": {"id": os.urandom(16).hex(), "code": "AB12CD", "status": "running",
+                     "created_at": now, "started_at": now, "ends_at": now,
+                     "current_room_index": 0, "hints_left": 3, "seed": 4242},
+            "state": {"room_slug": "puzzle-nantes-1", "attempts": 3, "solved": 0},
+            "players": players,
+        },
+    }
+
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, default=str)
+
+
+def bench(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--room-size", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"Backend rapide: {serialization.BACKEND}")
+    print(f"{'trame':<26}{'stdlib µs':>12}{'rapide µs':>12}{'diffusion µs':>14}")
+    for name, payload in sample_frames().items():
+        packet = [name, payload]
+        t_std = bench(lambda: [stdlib_dumps(packet) for _ in range(args.room_size)], args.frames)
+        t_fast = bench(lambda: [dumps(packet) for _ in range(args.room_size)], args.frames)
+
+        def broadcast():
+            pre = encode_once(payload)
+            for _ in range(args.room_size):
+                dumps([name, pre])
+        t_pre = bench(broadcast, args.frames)
+        print(f"{name:<26}{t_std:>12.2f}{t_fast:>12.2f}{t_pre:>14.2f}")
+    print(f"(temps par trame diffusée à {args.room_size} clients)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Temps de démarrage à froid : import de app.py, create_app() et (optionnel) startup()
+Usage: python benchmarks/bench_startup.py [--runs 5] [--top 10] [--startup]
+
+L'import et create_app() sont mesurés avec une base injoignable : ils doivent
+réussir sans aucune connexion. --startup mesure aussi la phase de démarrage
+(schéma, pool, caches) avec la base configurée dans l'environnement.
+"""
+
+import argparse, os, statistics, subprocess, sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PROBE = """
+import time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+application = app.create_app()
+t2 = time.perf_counter()
+t3 = t2
+if {startup}:
+    app.startup(application)
+    t3 = time.perf_counter()
+print(f"{{(t1 - t0) * 1000:.1f}} {{(t2 - t1) * 1000:.1f}} {{(t3 - t2) * 1000:.1f}}")
+"""
+
+OFFLINE_DB = {"DB_HOST": "127.0.0.1", "DB_PORT": "1", "DATABASE_URL": "", "CC_MYSQL_ADDON_URI": "", "MYSQL_ADDON_URI": ""}
+
+
+def run(startup: bool, importtime: bool = False):
+    env = dict(os.environ)
+    if not startup:
+        env.update(OFFLINE_DB)
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE.format(startup=startup)]
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"échec du démarrage:\n{proc.stderr[-2000:]}")
+    timings = [float(x) for x in proc.stdout.strip().splitlines()[-1].split()]
+    return timings, proc.stderr
+
+
+def top_imports(stderr: str, n: int):
+    """Imports directs de app.py (niveau 1 de l'arbre), triés par temps cumulé."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--startup", action="store_true", help="mesure aussi startup() (base requise)")
+    args = parser.parse_args()
+
+    samples = [run(args.startup)[0] for _ in range(args.runs)]
+    print(f"{'phase':<16}{'médiane ms':>12}{'min ms':>10}{'max ms':>10}")
+    phases = ["import app", "create_app()"] + (["startup()"] if args.startup else [])
+    for i, phase in enumerate(phases):
+        values = [s[i] for s in samples]
+        print(f"{phase:<16}{statistics.median(values):>12.1f}{min(values):>10.1f}{max(values):>10.1f}")
+
+    _, stderr = run(False, importtime=True)
+    print(f"\nimports les plus coûteux (cumul, ms)")
+    for us, name in top_imports(stderr, args.top):
+        print(f"  {name:<28}{us / 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
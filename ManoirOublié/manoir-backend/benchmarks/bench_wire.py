@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Comparaison JSON / MessagePack pour les événements socket fréquents
+Usage: python benchmarks/bench_wire.py [--frames 20000]
+"""
+
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services import wire
+from services.serialization import dumps
+
+TOKEN = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9." + "x" * 150
+
+FRAMES = {
+    "puzzle:state": {"type": "enigme1:swap", "a": 3, "b": 11, "token": TOKEN},
+    "game:state:update": {"currentEnigme": 2, "gamePhase": "playing", "token": TOKEN},
+    "player:position:update": {"x": 412.5, "y": 233.0, "playerName": "Agent1"},
+}
+
+
+def bench(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=20000)
+    args = parser.parse_args()
+    if not wire.msgpack:
+        print("msgpack n'est pas installé (pip install msgpack)")
+        return
+
+    print(f"{'événement':<26}{'json o':>8}{'mp o':>8}{'json µs':>10}{'mp µs':>10}")
+    for event, payload in FRAMES.items():
+        # Ancien comportement : la trame reçue (token compris) était renvoyée telle quelle
+        as_json = lambda: dumps([event, payload]).encode()
+        as_mp = lambda: wire.encode(event, wire.strip_private(payload))
+        print(f"{event:<26}{len(as_json()):>8}{len(as_mp()):>8}"
+              f"{bench(as_json, args.frames):>10.2f}{bench(as_mp, args.frames):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
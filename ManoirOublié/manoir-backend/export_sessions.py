@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Export des sessions terminées pour les rapports d'atelier (CSV ou Parquet) et agrégats par énigme
+Usage: python export_sessions.py [--from 2026-10-01] [--to 2026-10-19] [--format csv|parquet] [--out sessions.csv]
+                                 [--incremental NOM] [--summary resume.json] [--chunk 2000]
+
+Les lignes sont lues en flux (curseur non bufferisé, connexion dédiée sur un
+réplica si DB_REPLICAS est configuré) et écrites bloc par bloc : la mémoire
+reste bornée quel que soit l'intervalle. --incremental reprend après le
+dernier export du même nom et n'avance le filigrane qu'une fois le fichier
+complet. Sans --out, le CSV est écrit sur la sortie standard.
+"""
+
+import argparse, json, os, sys
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services import analytics
+
+
+def parse_utc(value):
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--from", dest="since", type=parse_utc, default=datetime(1970, 1, 1, tzinfo=timezone.utc))
+    parser.add_argument("--to", dest="until", type=parse_utc, default=None)
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--out", default="-")
+    parser.add_argument("--incremental", metavar="NOM")
+    parser.add_argument("--summary", metavar="FICHIER", help="agrégats par énigme en JSON (stderr par défaut)")
+    parser.add_argument("--chunk", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.format == "parquet":
+        if not analytics.HAS_ARROW:
+            raise SystemExit("pyarrow n'est pas installé : utiliser --format csv")
+        if args.out == "-":
+            raise SystemExit("--out est requis pour le format parquet")
+
+    until = min(args.until or analytics.closed_until(), analytics.closed_until())
+    after = analytics.load_watermark(args.incremental) if args.incremental else None
+    aggregates = analytics.EnigmeAggregates()
+    watermark = {}
+    chunks = analytics.aggregate(analytics.iter_chunks(args.since, until, after, args.chunk), aggregates, watermark)
+
+    if args.format == "parquet":
+        tmp = args.out + ".part"
+        analytics.write_parquet(chunks, tmp)
+        os.replace(tmp, args.out)
+    elif args.out == "-":
+        for text in analytics.csv_lines(chunks):
+            sys.stdout.write(text)
+    else:
+        tmp = args.out + ".part"
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            for text in analytics.csv_lines(chunks):
+                f.write(text)
+        os.replace(tmp, args.out)
+
+    if args.incremental:
+        analytics.save_watermark(args.incremental, watermark)
+
+    summary = json.dumps({"from": args.since.isoformat(), "to": until.isoformat(), **aggregates.to_api()}, indent=2, default=str)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(summary)
+    else:
+        print(summary, file=sys.stderr)
+    print(f"✅ {aggregates.rows} lignes, {aggregates.games} parties exportées", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+-- Migration pour suivre la présence réelle des joueurs
+-- is_connected reste utilisé comme statut "prêt" par /api/games/ready
+
+ALTER TABLE players
+    ADD COLUMN is_online TINYINT(1) NOT NULL DEFAULT 0,
+    ADD COLUMN last_seen DATETIME NULL;
@@ -0,0 +1,10 @@
+-- Migration pour les instantanés du classement global
+-- Écrits périodiquement par le serveur, relus au démarrage
+
+CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    window_name VARCHAR(16) NOT NULL,
+    taken_at DATETIME NOT NULL,
+    entries JSON NOT NULL,
+    INDEX idx_window_taken (window_name, taken_at)
+);
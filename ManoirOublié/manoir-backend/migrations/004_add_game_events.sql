@@ -0,0 +1,12 @@
+-- Migration pour le journal d'événements des parties
+-- Append-only, un numéro de séquence par partie ; la clé primaire sert d'index de relecture
+
+CREATE TABLE IF NOT EXISTS game_events (
+    game_id VARCHAR(36) NOT NULL,
+    seq INT NOT NULL,
+    type VARCHAR(32) NOT NULL,
+    player_id VARCHAR(36) NULL,
+    payload JSON NULL,
+    created_at DATETIME(3) NOT NULL,
+    PRIMARY KEY (game_id, seq)
+);
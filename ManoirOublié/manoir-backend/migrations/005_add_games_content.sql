@@ -0,0 +1,5 @@
+-- Migration pour figer le contenu des énigmes au démarrage d'une partie
+-- Tiré une fois à partir de games.seed ; tous les joueurs voient la même image, le même son et le même poème
+
+ALTER TABLE games
+    ADD COLUMN content JSON NULL;
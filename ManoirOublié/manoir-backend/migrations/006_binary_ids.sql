@@ -0,0 +1,46 @@
+-- Migration : identifiants de parties / joueurs en BINARY(16) au lieu de VARCHAR hex
+-- 16 octets au lieu de 32 caractères (jusqu'à 144 octets en utf8mb4 pour VARCHAR(36)) dans chaque
+-- clé primaire, clé étrangère et index secondaire. L'API continue de recevoir / renvoyer de l'hex :
+-- la conversion se fait dans services/db.py (bid() pour les paramètres, colonnes *_id relues en hex).
+--
+-- Les noms de contraintes sont ceux générés par InnoDB pour le schéma de app.py (<table>_ibfk_N) ;
+-- vérifier avec SHOW CREATE TABLE avant de lancer sur une base créée autrement.
+-- Passage en trois temps (VARBINARY -> UNHEX -> BINARY(16)) : les index existants sont conservés.
+
+SET FOREIGN_KEY_CHECKS = 0;
+
+ALTER TABLE players DROP FOREIGN KEY players_ibfk_1;
+ALTER TABLE runtime_state DROP FOREIGN KEY runtime_state_ibfk_1;
+ALTER TABLE player_enigme DROP FOREIGN KEY player_enigme_ibfk_1, DROP FOREIGN KEY player_enigme_ibfk_2;
+
+-- 1) Mêmes octets, sans jeu de caractères
+ALTER TABLE games MODIFY id VARBINARY(36) NOT NULL;
+ALTER TABLE players MODIFY id VARBINARY(36) NOT NULL, MODIFY game_id VARBINARY(36) NOT NULL;
+ALTER TABLE runtime_state MODIFY game_id VARBINARY(36) NOT NULL;
+ALTER TABLE player_enigme MODIFY player_id VARBINARY(36) NOT NULL, MODIFY game_id VARBINARY(36) NOT NULL;
+ALTER TABLE game_enigmes_completed MODIFY game_id VARBINARY(255) NOT NULL, MODIFY completed_by VARBINARY(255) NOT NULL;
+ALTER TABLE game_events MODIFY game_id VARBINARY(36) NOT NULL, MODIFY player_id VARBINARY(36) NULL;
+
+-- 2) Hex -> 16 octets
+UPDATE games SET id = UNHEX(id);
+UPDATE players SET id = UNHEX(id), game_id = UNHEX(game_id);
+UPDATE runtime_state SET game_id = UNHEX(game_id);
+UPDATE player_enigme SET player_id = UNHEX(player_id), game_id = UNHEX(game_id);
+UPDATE game_enigmes_completed SET game_id = UNHEX(game_id), completed_by = UNHEX(completed_by);
+UPDATE game_events SET game_id = UNHEX(game_id), player_id = UNHEX(player_id);
+
+-- 3) Largeur fixe
+ALTER TABLE games MODIFY id BINARY(16) NOT NULL;
+ALTER TABLE players MODIFY id BINARY(16) NOT NULL, MODIFY game_id BINARY(16) NOT NULL;
+ALTER TABLE runtime_state MODIFY game_id BINARY(16) NOT NULL;
+ALTER TABLE player_enigme MODIFY player_id BINARY(16) NOT NULL, MODIFY game_id BINARY(16) NOT NULL;
+ALTER TABLE game_enigmes_completed MODIFY game_id BINARY(16) NOT NULL, MODIFY completed_by BINARY(16) NOT NULL;
+ALTER TABLE game_events MODIFY game_id BINARY(16) NOT NULL, MODIFY player_id BINARY(16) NULL;
+
+ALTER TABLE players ADD CONSTRAINT players_ibfk_1 FOREIGN KEY (game_id) REFERENCES games(id) ON DELETE CASCADE;
+ALTER TABLE runtime_state ADD CONSTRAINT runtime_state_ibfk_1 FOREIGN KEY (game_id) REFERENCES games(id) ON DELETE CASCADE;
+ALTER TABLE player_enigme
+    ADD CONSTRAINT player_enigme_ibfk_1 FOREIGN KEY (player_id) REFERENCES players(id) ON DELETE CASCADE,
+    ADD CONSTRAINT player_enigme_ibfk_2 FOREIGN KEY (game_id) REFERENCES games(id) ON DELETE CASCADE;
+
+SET FOREIGN_KEY_CHECKS = 1;
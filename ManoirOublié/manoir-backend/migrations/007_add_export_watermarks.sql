@@ -0,0 +1,12 @@
+-- Migration pour l'export analytique des sessions
+-- Index de parcours des parties closes par fin prévue, et filigrane de l'export incrémental
+-- (dernier (ends_at, id) exporté, un par nom d'export)
+
+ALTER TABLE games ADD INDEX idx_games_ends_at (ends_at, id);
+
+CREATE TABLE IF NOT EXISTS export_watermarks (
+    name VARCHAR(64) PRIMARY KEY,
+    ends_at DATETIME NOT NULL,
+    game_id BINARY(16) NOT NULL,
+    updated_at DATETIME NOT NULL
+);
@@ -0,0 +1,7 @@
+-- Migration pour la numérotation du journal d'événements
+-- Compteur par partie, réservé atomiquement au vidage du tampon (seq uniques entre workers)
+
+CREATE TABLE IF NOT EXISTS game_event_seq (
+    game_id BINARY(16) PRIMARY KEY,
+    seq INT NOT NULL
+);
@@ -0,0 +1,4 @@
+-- Migration pour le classement global
+-- Top « all » relu périodiquement depuis players.score_total (parcours d'index, pas de la table)
+
+ALTER TABLE players ADD INDEX idx_players_score (score_total);
@@ -1,28 +1,178 @@
 # models.py
+import json
 from dataclasses import dataclass, field, asdict
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
-@dataclass
-class Joueur:
+
+# Slug d'énigme -> identifiant numérique (game_enigmes_completed.enigme_id)
+ENIGME_IDS = {
+    "puzzle-nantes-1": 1,
+    "lumiere-nantes-2": 2,
+    "son-elephant-3": 3,
+    "timeline-nantes-4": 4,
+    "poetique-nantes-5": 5,
+}
+
+
+def _iso(dt: Optional[datetime]) -> Optional[str]:
+    return dt.isoformat() if dt is not None else None
+
+
+def _json(value):
+    """Colonne JSON : mysql-connector peut la renvoyer en str/bytes."""
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode()
+    return json.loads(value) if isinstance(value, str) else value
+
+
+@dataclass(slots=True)
+class Player:
     id: str
+    game_id: str
     nickname: str
     role: str
-    joinedAt: datetime
-    isConnected: bool = True
+    joined_at: Optional[datetime] = None
+    is_connected: bool = True
+    score_total: int = 0
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "Player":
+        """Construit un joueur depuis une ligne `players` (cursor dictionary=True)."""
+        return cls(
+            row["id"],
+            row.get("game_id", ""),
+            row["nickname"],
+            row["role"],
+            row.get("joined_at"),
+            bool(row.get("is_connected", 1)),
+            int(row.get("score_total") or 0),
+        )
+
+    def to_api(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.nickname,
+            "role": self.role,
+            "ready": self.is_connected,
+            "score": self.score_total,
+        }
+
+
+# Ancien nom conservé pour compatibilité
+Joueur = Player
+
 
-@dataclass
+@dataclass(slots=True)
+class RuntimeState:
+    game_id: str
+    room_slug: str
+    attempts: int = 0
+    solved: bool = False
+    puzzle_state: Optional[Any] = None
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "RuntimeState":
+        return cls(
+            row["game_id"],
+            row["room_slug"],
+            int(row.get("attempts") or 0),
+            bool(row.get("solved")),
+            row.get("puzzle_state"),
+        )
+
+    def to_api(self) -> Dict[str, Any]:
+        return {
+            "gameId": self.game_id,
+            "roomSlug": self.room_slug,
+            "attempts": self.attempts,
+            "solved": self.solved,
+            "puzzleState": self.puzzle_state,
+        }
+
+
+@dataclass(slots=True)
+class EnigmeProgress:
+    player_id: str
+    game_id: str
+    slug: str
+    attempts: int = 0
+    solved: bool = False
+    score_obtenu: int = 0
+    updated_at: Optional[datetime] = None
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "EnigmeProgress":
+        return cls(
+            row["player_id"],
+            row["game_id"],
+            row["slug"],
+            int(row.get("attempts") or 0),
+            bool(row.get("solved")),
+            int(row.get("score_obtenu") or 0),
+            row.get("updated_at"),
+        )
+
+    def to_api(self) -> Dict[str, Any]:
+        return {
+            "playerId": self.player_id,
+            "gameId": self.game_id,
+            "slug": self.slug,
+            "attempts": self.attempts,
+            "solved": self.solved,
+            "score": self.score_obtenu,
+            "updatedAt": _iso(self.updated_at),
+        }
+
+
+@dataclass(slots=True)
 class Game:
     id: str
     code: str
     status: str                   # waiting | running | finished | abandoned
-    createdAt: datetime
-    startedAt: Optional[datetime]
-    endsAt: Optional[datetime]
-    currentRoomIndex: int
-    hintsLeft: int
+    created_at: datetime
+    started_at: Optional[datetime]
+    ends_at: Optional[datetime]
+    current_room_index: int
+    hints_left: int
     seed: int
     players: List[Player] = field(default_factory=list)
+    content: Optional[Dict[str, Any]] = None   # contenu des énigmes tiré au démarrage
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "Game":
+        """Construit une partie depuis une ligne `games`."""
+        return cls(
+            row["id"],
+            row["code"],
+            row["status"],
+            row["created_at"],
+            row.get("started_at"),
+            row.get("ends_at"),
+            int(row.get("current_room_index") or 0),
+            int(row.get("hints_left") or 0),
+            int(row.get("seed") or 0),
+            content=_json(row.get("content")),
+        )
+
+    def player(self, pid: str) -> Optional[Player]:
+        for p in self.players:
+            if p.id == pid:
+                return p
+        return None
+
+    def to_api(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "code": self.code,
+            "status": self.status,
+            "createdAt": _iso(self.created_at),
+            "startedAt": _iso(self.started_at),
+            "endsAt": _iso(self.ends_at),
+            "currentRoomIndex": self.current_room_index,
+            "hintsLeft": self.hints_left,
+            "seed": self.seed,
+        }
 
 def to_firestore_dict(obj):
     """Convertit dataclass -> dict compatible Firestore."""
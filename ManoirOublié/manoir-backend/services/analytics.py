@@ -0,0 +1,239 @@
+# services/analytics.py
+# Export des sessions terminées (tentatives, temps de résolution) en flux, mémoire bornée
+import csv, io
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from importlib.util import find_spec
+
+from models import ENIGME_IDS
+from services.db import stream_query, query_one, execute, bid
+
+# pyarrow est optionnel : sans lui, seul le CSV est disponible
+HAS_ARROW = find_spec("pyarrow") is not None
+
+COLUMNS = (
+    "game_id", "code", "started_at", "ends_at", "player_id", "nickname", "role",
+    "slug", "enigme_id", "attempts", "solved", "solved_by_player", "solve_seconds",
+)
+
+# Paliers des temps de résolution (secondes) ; le dernier palier est ouvert
+SOLVE_BUCKETS_S = (60, 120, 300, 600, 900, 1200, 1800, 2700)
+# Paliers du nombre de tentatives par joueur
+ATTEMPT_BUCKETS = (1, 2, 3, 5, 10, 20)
+
+# Une ligne par (partie, joueur, énigme tentée) ; la partie est close (ends_at passé).
+# Le temps de résolution est celui de la première résolution de l'énigme dans la partie.
+_CASE = " ".join("WHEN %s THEN %s" for _ in ENIGME_IDS)
+EXPORT_SQL = f"""
+    SELECT g.id AS game_id, g.code, g.started_at, g.ends_at,
+           p.id AS player_id, p.nickname, p.role,
+           pe.slug, pe.attempts, pe.solved,
+           gec.completed_by, gec.completed_at
+    FROM games g
+    JOIN players p ON p.game_id = g.id
+    JOIN player_enigme pe ON pe.player_id = p.id
+    LEFT JOIN game_enigmes_completed gec
+           ON gec.game_id = g.id AND gec.enigme_id = (CASE pe.slug {_CASE} ELSE 0 END)
+    WHERE g.ends_at IS NOT NULL AND g.ends_at >= %s AND g.ends_at < %s{{after}}
+    ORDER BY g.ends_at, g.id, p.id, pe.slug
+"""
+
+
+class Distribution:
+    """Histogramme à paliers fixes : taille constante quel que soit le volume exporté."""
+
+    __slots__ = ("bounds", "count", "total", "max", "buckets")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(bounds) + 1)
+
+    def add_many(self, values):
+        if not values:
+            return
+        bounds = self.bounds
+        buckets = self.buckets
+        for v in values:
+            buckets[bisect_left(bounds, v)] += 1
+        self.count += len(values)
+        self.total += sum(values)
+        self.max = max(self.max, max(values))
+
+    def percentile(self, q: float):
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_api(self) -> dict:
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 2) if self.count else None,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "histogram": dict(zip(labels, self.buckets)),
+        }
+
+
+class EnigmeAggregates:
+    """Agrégats par énigme mis à jour bloc par bloc pendant l'export."""
+
+    def __init__(self):
+        self.solve_seconds = defaultdict(lambda: Distribution(SOLVE_BUCKETS_S))
+        self.attempts = defaultdict(lambda: Distribution(ATTEMPT_BUCKETS))
+        self.players = defaultdict(int)
+        self.solved = defaultdict(int)
+        self.games = 0
+        self.rows = 0
+        self._last_game = None    # lignes triées par partie : comptage sans ensemble
+
+    def update(self, chunk):
+        """Regroupe le bloc par énigme puis alimente chaque histogramme en une passe."""
+        attempts = defaultdict(list)
+        solve = defaultdict(list)
+        for row in chunk:
+            slug = row["slug"]
+            attempts[slug].append(row["attempts"])
+            self.solved[slug] += row["solved"]
+            if row["game_id"] != self._last_game:
+                self._last_game = row["game_id"]
+                self.games += 1
+            if row["solved_by_player"] and row["solve_seconds"] is not None:
+                solve[slug].append(row["solve_seconds"])
+        for slug, values in attempts.items():
+            self.players[slug] += len(values)
+            self.attempts[slug].add_many(values)
+        for slug, values in solve.items():
+            self.solve_seconds[slug].add_many(values)
+        self.rows += len(chunk)
+
+    def to_api(self) -> dict:
+        return {
+            "rows": self.rows,
+            "games": self.games,
+            "enigmes": {
+                slug: {
+                    "enigmeId": ENIGME_IDS.get(slug),
+                    "players": self.players[slug],
+                    "playersSolved": self.solved[slug],
+                    "attempts": self.attempts[slug].to_api(),
+                    "solveSeconds": self.solve_seconds[slug].to_api(),
+                }
+                for slug in sorted(self.players, key=lambda s: ENIGME_IDS.get(s, 99))
+            },
+        }
+
+
+# ---------- Lecture en flux ----------
+def _shape(row):
+    started, completed = row["started_at"], row.pop("completed_at")
+    completed_by = row.pop("completed_by")
+    row["enigme_id"] = ENIGME_IDS.get(row["slug"])
+    row["solved"] = int(row["solved"] or 0)
+    row["attempts"] = int(row["attempts"] or 0)
+    row["solved_by_player"] = int(completed_by == row["player_id"])
+    row["solve_seconds"] = (
+        round((completed.replace(tzinfo=None) - started.replace(tzinfo=None)).total_seconds(), 1)
+        if completed is not None and started is not None else None
+    )
+    return row
+
+
+def iter_chunks(since: datetime, until: datetime, after=None, chunk_size: int = 2000):
+    """Blocs de lignes d'export des parties closes entre `since` et `until`.
+
+    `after` = (ends_at, game_id) du dernier export : seules les parties
+    suivantes sont relues (parcours de l'index (ends_at, id)).
+    """
+    params = tuple(v for item in ENIGME_IDS.items() for v in item) + (since, until)
+    if after:
+        sql = EXPORT_SQL.format(after=" AND (g.ends_at > %s OR (g.ends_at = %s AND g.id > %s))")
+        params += (after[0], after[0], bid(after[1]))
+    else:
+        sql = EXPORT_SQL.format(after="")
+    for rows in stream_query(sql, params, chunk_size):
+        yield [_shape(row) for row in rows]
+
+
+def aggregate(chunks, aggregates: EnigmeAggregates, watermark: dict):
+    """Étape de pipeline : met à jour les agrégats et le dernier (ends_at, game_id) vu."""
+    for chunk in chunks:
+        aggregates.update(chunk)
+        last = chunk[-1]
+        watermark["ends_at"], watermark["game_id"] = last["ends_at"], last["game_id"]
+        yield chunk
+
+
+# ---------- Formats de sortie ----------
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def csv_lines(chunks, header: bool = True):
+    """Texte CSV, un bloc de lignes à la fois (réponse HTTP en flux ou fichier)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(COLUMNS)
+    for chunk in chunks:
+        for row in chunk:
+            writer.writerow([_cell(row[c]) for c in COLUMNS])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def write_parquet(chunks, path: str) -> int:
+    """Fichier Parquet écrit par groupes de lignes (un par bloc)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("game_id", pa.string()), ("code", pa.string()),
+        ("started_at", pa.timestamp("us")), ("ends_at", pa.timestamp("us")),
+        ("player_id", pa.string()), ("nickname", pa.string()), ("role", pa.string()),
+        ("slug", pa.string()), ("enigme_id", pa.int32()),
+        ("attempts", pa.int32()), ("solved", pa.int8()), ("solved_by_player", pa.int8()),
+        ("solve_seconds", pa.float64()),
+    ])
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for chunk in chunks:
+            columns = {name: [row[name] for row in chunk] for name in COLUMNS}
+            writer.write_table(pa.table(columns, schema=schema))
+            rows += len(chunk)
+    return rows
+
+
+# ---------- Filigrane d'export incrémental ----------
+def load_watermark(name: str):
+    row = query_one("SELECT ends_at, game_id FROM export_watermarks WHERE name=%s", (name,), primary=True)
+    return (row["ends_at"], row["game_id"]) if row else None
+
+
+def save_watermark(name: str, watermark: dict):
+    if watermark.get("ends_at") is None:
+        return
+    execute(
+        "INSERT INTO export_watermarks (name, ends_at, game_id, updated_at) VALUES (%s,%s,%s,%s) "
+        "ON DUPLICATE KEY UPDATE ends_at=VALUES(ends_at), game_id=VALUES(game_id), updated_at=VALUES(updated_at)",
+        (name, watermark["ends_at"], bid(watermark["game_id"]), datetime.now(timezone.utc)),
+    )
+
+
+def closed_until(grace: timedelta = timedelta(minutes=5)) -> datetime:
+    """Borne haute par défaut : parties dont la fin prévue est passée (plus aucune écriture attendue)."""
+    return datetime.now(timezone.utc) - grace
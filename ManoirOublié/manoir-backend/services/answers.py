@@ -0,0 +1,167 @@
+# services/answers.py
+# Registre des réponses attendues, normalisées une fois pour des vérifications O(1)
+import re, threading, time, unicodedata
+
+from services.db import query_all
+
+_PUNCT = re.compile(r"[^\w\s]|_")
+_LIGATURES = str.maketrans({"œ": "oe", "æ": "ae", "Œ": "oe", "Æ": "ae"})
+
+# Réponses complémentaires lues en base : (slug, requête, colonne). Les requêtes
+# qui échouent (table ou colonne absente) sont ignorées. Seule la dernière solution
+# d'Enigme1 vaut pour toutes les parties ; le son et le poème tirés pour une partie
+# sont vérifiés avec `match(..., extra=...)` (réponse stockée dans son contenu).
+DB_SOURCES = [
+    ("puzzle-nantes-1", "SELECT solution FROM Enigme1_Puzzle ORDER BY id_puzzle DESC LIMIT 1", "solution"),
+]
+
+
+def normalize(text) -> str:
+    """Minuscules, sans accents, ponctuation et espaces repliés : « Machines de l’Île » -> "machines de l ile"."""
+    s = unicodedata.normalize("NFKD", str(text or "").translate(_LIGATURES))
+    s = "".join(c for c in s if not unicodedata.combining(c)).casefold()
+    return " ".join(_PUNCT.sub(" ", s).split())
+
+
+def within_edits(a: str, b: str, k: int) -> bool:
+    """Distance de Levenshtein <= k, avec arrêt dès que la bande dépasse k."""
+    if abs(len(a) - len(b)) > k:
+        return False
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        best = i
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if cur[j] < best:
+                best = cur[j]
+        if best > k:
+            return False
+        prev = cur
+    return prev[-1] <= k
+
+
+class AnswerRegistry:
+    """Réponses acceptées par slug : `EXPECTED` + solutions lues en base.
+
+    Les clés sont normalisées au chargement (forme avec espaces et forme
+    compacte). La validation ne touche jamais la base ; un rechargement
+    périodique remplace l'index d'un bloc si le contenu a changé. Avec un
+    instantané partagé (`shared`), un seul worker par période relit la base.
+    """
+
+    def __init__(self, expected: dict, max_edits: int = 1, fuzzy_min_len: int = 6, shared=None, ttl: float = 300):
+        self.expected = expected
+        self.shared = shared
+        self.ttl = ttl
+        self.max_edits = max_edits
+        self.fuzzy_min_len = fuzzy_min_len
+        self.version = 0
+        self.loaded_at = None
+        self._index = {}      # slug -> frozenset de clés
+        self._fuzzy = {}      # slug -> tuple de clés éligibles à la tolérance
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _keys(self, answers) -> set:
+        keys = set()
+        for answer in answers:
+            key = normalize(answer)
+            if key:
+                keys.add(key)
+                keys.add(key.replace(" ", ""))
+        return keys
+
+    def _fuzzy_keys(self, keys) -> tuple:
+        return tuple(k for k in keys if len(k) >= self.fuzzy_min_len and not k.replace(" ", "").isdigit())
+
+    def _build(self, extra: dict):
+        index, fuzzy = {}, {}
+        for slug in set(self.expected) | set(extra):
+            keys = self._keys(list(self.expected.get(slug, ())) + list(extra.get(slug, ())))
+            index[slug] = frozenset(keys)
+            fuzzy[slug] = self._fuzzy_keys(keys)
+        return index, fuzzy
+
+    def _load_db(self) -> dict:
+        extra = {}
+        for slug, sql, column in DB_SOURCES:
+            try:
+                rows = query_all(sql) or []
+            except Exception:
+                continue
+            for row in rows:
+                value = row.get(column) if isinstance(row, dict) else row[0]
+                if value:
+                    extra.setdefault(slug, []).append(str(value))
+        return extra
+
+    def _load_extra(self) -> dict:
+        if self.shared is not None:
+            view = self.shared.refresh(
+                lambda: {"answers": [[slug, v] for slug, values in self._load_db().items() for v in values]},
+                self.ttl,
+            )
+            if view is not None:
+                extra = {}
+                for slug, value in view.get("answers"):
+                    extra.setdefault(slug, []).append(value)
+                return extra
+        return self._load_db()
+
+    def refresh(self) -> bool:
+        """Recharge les solutions (base ou instantané partagé) ; retourne True si l'index a changé."""
+        extra = self._load_extra()
+        fingerprint = tuple(sorted((slug, tuple(sorted(v))) for slug, v in extra.items()))
+        if fingerprint == self._fingerprint and self._index:
+            return False
+        index, fuzzy = self._build(extra)
+        with self._lock:
+            self._index, self._fuzzy = index, fuzzy
+            self._fingerprint = fingerprint
+            self.version += 1
+            self.loaded_at = time.time()
+        return True
+
+    def ensure_loaded(self):
+        if not self._index:
+            self.refresh()
+
+    def match(self, slug: str, attempt, extra=()) -> bool:
+        """`extra` : réponses propres à la partie (contenu tiré pour elle), acceptées en plus de l'index."""
+        self.ensure_loaded()
+        key = normalize(attempt)
+        if not key:
+            return False
+        keys = self._index.get(slug, frozenset())
+        fuzzy = self._fuzzy.get(slug, ())
+        if extra:
+            own = self._keys(extra)
+            keys = keys | own
+            fuzzy = fuzzy + self._fuzzy_keys(own)
+        if not keys:
+            return False
+        if key in keys or key.replace(" ", "") in keys:
+            return True
+        if self.max_edits <= 0 or len(key) < self.fuzzy_min_len:
+            return False
+        return any(within_edits(key, k, self.max_edits) for k in fuzzy)
+
+    def start(self, socketio, interval: float = 300.0):
+        """Rechargement périodique en tâche de fond (une seule fois)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.ttl = interval
+
+        def loop():
+            while True:
+                socketio.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"❌ Error refreshing answers: {e}")
+
+        socketio.start_background_task(loop)
@@ -1,6 +1,6 @@
 # services/auth.py
 import os, jwt, datetime
-from flask import request
+from flask import g, request
 
 JWT_SECRET = os.getenv("JWT_SECRET", "dev")
 EXPIRES = int(os.getenv("JWT_EXPIRES_MIN", "120"))
@@ -14,12 +14,26 @@ def issue_token(game_id: str, player_id: str, role: str):
     }
     return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
 
+def decode_token(token: str):
+    """Claims d'un token joueur ; lève une exception jwt si le token est invalide ou expiré."""
+    return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+
 def read_token_from_header():
+    """Claims du header Authorization, décodés une fois par requête (mémorisés sur `g`)."""
     auth = request.headers.get("Authorization", "")
     if not auth.startswith("Bearer "):
         return None
     token = auth.split(" ", 1)[1]
+    cached = g.get("_claims")
+    if cached is not None and cached[0] == token:
+        return cached[1]
     try:
-        return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        claims = decode_token(token)
     except Exception:
-        return None
+        claims = None
+    g._claims = (token, claims)
+    return claims
+
+def remember_claims(token: str, claims):
+    """Pré-remplit le cache de read_token_from_header (sous-requêtes d'un lot déjà authentifié)."""
+    g._claims = (token, claims)
@@ -0,0 +1,155 @@
+# services/backpressure.py
+# Limitation de débit par connexion et file sortante regroupée par room
+import os, threading, time
+from collections import Counter, OrderedDict
+from functools import wraps
+
+from flask import request
+
+# (jetons par seconde, rafale max) par événement entrant
+EVENT_LIMITS = {
+    "puzzle:state": (20, 40),
+    "game:state:update": (10, 20),
+    "player:position:update": (20, 30),
+    "player:enigme:select": (5, 10),
+    "chat:msg": (2, 8),
+    "room:join": (1, 5),
+    "room:resume": (1, 5),
+    "game:state:request": (2, 5),
+    "spectate:join": (1, 5),
+    "spectate:ack": (2, 10),
+}
+DEFAULT_LIMIT = (10, 20)
+
+# Événements « état » : seule la dernière valeur par émetteur compte
+STATE_EVENTS = {"game:state:update", "player:position:update"}
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "last")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class RateLimiter:
+    """Seaux à jetons par sid puis par événement (une déconnexion libère tout d'un coup)."""
+
+    def __init__(self, limits=None, scale: float = 1.0):
+        self.limits = dict(limits or EVENT_LIMITS)
+        self.scale = scale
+        self.throttled = Counter()
+        self._buckets = {}                 # sid -> {événement: TokenBucket}
+        self._lock = threading.Lock()
+
+    def allow(self, sid: str, event: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            buckets = self._buckets.get(sid)
+            if buckets is None:
+                buckets = self._buckets[sid] = {}
+            bucket = buckets.get(event)
+            if bucket is None:
+                rate, burst = self.limits.get(event, DEFAULT_LIMIT)
+                bucket = buckets[event] = TokenBucket(rate * self.scale, burst * self.scale)
+            if bucket.take(now):
+                return True
+            self.throttled[event] += 1
+            return False
+
+    def forget(self, sid: str):
+        with self._lock:
+            self._buckets.pop(sid, None)
+
+
+class RoomOutbox:
+    """File sortante par room pour les événements d'état.
+
+    Les envois sont regroupés et vidés toutes les `interval` secondes par une
+    tâche de fond. Un nouvel état du même émetteur remplace l'ancien encore en
+    attente : une room garde au plus une entrée par (événement, émetteur),
+    la file est donc bornée par le nombre de membres sans autre plafond.
+    """
+
+    def __init__(self, send, interval: float = 0.05):
+        self._send = send                  # send(event, room, payload, skip_sid)
+        self.interval = interval
+        self.coalesced = Counter()
+        self._rooms = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def push(self, room: str, event: str, payload, sender: str = None):
+        key = (event, sender)
+        with self._lock:
+            queue = self._rooms.get(room)
+            if queue is None:
+                queue = self._rooms[room] = OrderedDict()
+            if key in queue:
+                self.coalesced[event] += 1
+                queue.move_to_end(key)
+            queue[key] = payload
+
+    def flush(self):
+        with self._lock:
+            rooms, self._rooms = self._rooms, {}
+        for room, queue in rooms.items():
+            for (event, sender), payload in queue.items():
+                try:
+                    self._send(event, room, payload, sender)
+                except Exception as e:
+                    print(f"❌ Error flushing {event} to {room}: {e}")
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(q) for q in self._rooms.values())
+
+    def start(self, socketio):
+        """Lance la tâche de vidage (une seule fois)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        def loop():
+            while True:
+                socketio.sleep(self.interval)
+                self.flush()
+
+        socketio.start_background_task(loop)
+
+
+limiter = RateLimiter(scale=float(os.getenv("SOCKET_RATE_SCALE", 1.0)))
+
+
+def throttle(event: str):
+    """Décorateur de handler Socket.IO : ignore l'événement si le seau du sid est vide."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not limiter.allow(request.sid, event):
+                return None
+            return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def stats(outbox: RoomOutbox = None) -> dict:
+    out = {"throttled": dict(limiter.throttled)}
+    if outbox is not None:
+        out.update({
+            "coalesced": dict(outbox.coalesced),
+            "pending": outbox.pending(),
+        })
+    return out
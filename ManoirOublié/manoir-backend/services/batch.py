@@ -0,0 +1,124 @@
+# services/batch.py
+# Requêtes groupées : plusieurs lectures / validations en un aller-retour, une auth, une connexion
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from services.auth import remember_claims
+from services.db import SharedConnection, using
+
+
+def batchable(kind: str = "read"):
+    """Autorise une route dans /api/batch (à placer sous @bp.get / @bp.post).
+
+    `read` : sans effet de bord, exécutable en parallèle des lectures voisines.
+    `write` : exécutée seule, dans l'ordre du lot (barrière pour les lectures suivantes).
+    """
+    def deco(fn):
+        fn.batch_kind = kind
+        return fn
+    return deco
+
+
+class BatchRunner:
+    """Exécute les sous-requêtes d'un lot à travers les vues existantes.
+
+    Chaque sous-requête `{id, method, path, body}` est résolue par la table
+    de routes de l'application ; seules les vues marquées `@batchable` sont
+    acceptées. Le jeton est décodé une fois pour tout le lot et toutes les
+    requêtes base passent par une seule connexion du pool (une instruction
+    à la fois). Les lectures consécutives tournent en parallèle (utile
+    pour celles servies depuis la mémoire), une écriture attend les
+    lectures qui la précèdent et bloque celles qui la suivent. Chaque
+    sous-requête a son propre statut : une erreur n'interrompt pas le lot.
+    """
+
+    def __init__(self, max_items: int = 20, workers: int = 4):
+        self.max_items = max_items
+        self.workers = workers
+        self.stats_counter = Counter()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        self._lock = threading.Lock()
+
+    def _count(self, **deltas):
+        with self._lock:
+            self.stats_counter.update(deltas)
+
+    def _resolve(self, app, item):
+        """(vue, arguments) d'une sous-requête, ou (None, (statut, erreur))."""
+        method = str(item.get("method") or "GET").upper()
+        path = item.get("path")
+        if not isinstance(path, str) or not path.startswith("/"):
+            return None, (400, "invalid_path")
+        adapter = app.url_map.bind("localhost")
+        try:
+            endpoint, args = adapter.match(path.split("?", 1)[0], method=method)
+        except Exception:
+            return None, (404, "not_found")
+        view = app.view_functions.get(endpoint)
+        if getattr(view, "batch_kind", None) is None:
+            return None, (400, "not_batchable")
+        return (view, args), None
+
+    def _call(self, app, item, target, headers, token, claims, shared):
+        view, args = target
+        method = str(item.get("method") or "GET").upper()
+        body = item.get("body") if method != "GET" else None
+        with app.test_request_context(item["path"], method=method, json=body, headers=headers):
+            remember_claims(token, claims)
+            with using(shared):
+                try:
+                    response = app.make_response(view(**args))
+                except Exception as e:
+                    print(f"❌ batch {method} {item['path']}: {e}")
+                    self._count(errors=1)
+                    return {"id": item.get("id"), "status": 500, "error": "internal_error"}
+        payload = response.get_json(silent=True)
+        if response.status_code >= 400:
+            self._count(errors=1)
+        return {"id": item.get("id"), "status": response.status_code, "body": payload}
+
+    def run(self, app, items, headers: dict, token: str, claims) -> list:
+        """Résultats dans l'ordre des sous-requêtes."""
+        results = [None] * len(items)
+        shared = SharedConnection()
+        pending = []    # lectures consécutives en attente : (index, item, cible)
+
+        def flush_reads():
+            if len(pending) == 1:
+                i, item, target = pending[0]
+                results[i] = self._call(app, item, target, headers, token, claims, shared)
+            elif pending:
+                futures = [
+                    (i, self._pool.submit(self._call, app, item, target, headers, token, claims, shared))
+                    for i, item, target in pending
+                ]
+                for i, future in futures:
+                    results[i] = future.result()
+            pending.clear()
+
+        try:
+            for i, item in enumerate(items):
+                if not isinstance(item, dict):
+                    results[i] = {"id": None, "status": 400, "error": "invalid_request"}
+                    continue
+                target, error = self._resolve(app, item)
+                if target is None:
+                    results[i] = {"id": item.get("id"), "status": error[0], "error": error[1]}
+                    self._count(rejected=1)
+                    continue
+                if target[0].batch_kind == "read":
+                    pending.append((i, item, target))
+                    continue
+                flush_reads()
+                results[i] = self._call(app, item, target, headers, token, claims, shared)
+                self._count(writes=1)
+            flush_reads()
+        finally:
+            shared.release()
+        self._count(batches=1, requests=len(items), db_queries=shared.queries)
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats_counter)
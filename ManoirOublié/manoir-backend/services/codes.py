@@ -0,0 +1,139 @@
+# services/codes.py
+# Codes de partie pré-générés : réserve de codes libres, remplie par lots en tâche de fond
+import random, string, threading, time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from services.db import query_all, execute, bid
+
+ALPHABET = string.ascii_uppercase + string.digits
+
+_rng = random.SystemRandom()
+
+
+def random_code(length: int = 6) -> str:
+    return "".join(_rng.choices(ALPHABET, k=length))
+
+
+class CodeAllocator:
+    """Distribue des codes de partie uniques en O(1), sans requête sur le chemin de création.
+
+    La réserve est remplie par lots : `batch` candidats tirés au hasard,
+    vérifiés en une seule requête `IN (...)`. Les codes des parties
+    expirées (terminées depuis `expire_after`, ou restées en attente plus
+    de `waiting_ttl`) sont libérés (`code = NULL`) et remis dans la réserve.
+    Si la réserve est vide (base injoignable), un code aléatoire non vérifié
+    est rendu ; l'INSERT reste protégé par la contrainte UNIQUE.
+    """
+
+    def __init__(self, length: int = 6, low_water: int = 200, batch: int = 500,
+                 expire_after: timedelta = timedelta(hours=6), waiting_ttl: timedelta = timedelta(hours=24)):
+        self.length = length
+        self.low_water = low_water
+        self.batch = batch
+        self.expire_after = expire_after
+        self.waiting_ttl = waiting_ttl
+        self.on_recycle = None          # callback(gid, code) pour purger les caches
+        self.recycled = 0
+        self.unchecked = 0
+        self._free = deque()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self._started = False
+
+    def __len__(self):
+        return len(self._free)
+
+    def _push(self, codes):
+        with self._lock:
+            for code in codes:
+                if code not in self._queued:
+                    self._queued.add(code)
+                    self._free.append(code)
+
+    def take(self) -> str:
+        with self._lock:
+            if self._free:
+                code = self._free.popleft()
+                self._queued.discard(code)
+                return code
+        # Réserve vide : remplissage synchrone (démarrage sans startup(), pic de créations)
+        try:
+            self.refill()
+        except Exception as e:
+            print(f"❌ Error refilling room codes: {e}")
+        with self._lock:
+            if self._free:
+                code = self._free.popleft()
+                self._queued.discard(code)
+                return code
+        self.unchecked += 1
+        return random_code(self.length)
+
+    def take_many(self, n: int) -> list:
+        return [self.take() for _ in range(n)]
+
+    def refill(self) -> int:
+        """Ajoute jusqu'à `batch` codes libres (une requête de vérification par lot)."""
+        with self._refill_lock:
+            with self._lock:
+                queued = set(self._queued)
+            candidates = set()
+            while len(candidates) < self.batch:
+                code = random_code(self.length)
+                if code not in queued:
+                    candidates.add(code)
+            candidates = list(candidates)
+            placeholders = ",".join(["%s"] * len(candidates))
+            rows = query_all(f"SELECT code FROM games WHERE code IN ({placeholders})", tuple(candidates), primary=True) or []
+            taken = {r["code"] for r in rows}
+            fresh = [c for c in candidates if c not in taken]
+            self._push(fresh)
+            return len(fresh)
+
+    def recycle(self, limit: int = 1000) -> int:
+        """Libère les codes des parties expirées et les remet dans la réserve."""
+        now = datetime.now(timezone.utc)
+        rows = query_all(
+            "SELECT id, code FROM games WHERE code IS NOT NULL AND "
+            "((ends_at IS NOT NULL AND ends_at < %s) OR (status IN ('finished','abandoned') AND created_at < %s) "
+            "OR (status = 'waiting' AND created_at < %s)) LIMIT %s",
+            (now - self.expire_after, now - self.expire_after, now - self.waiting_ttl, limit),
+            primary=True,
+        ) or []
+        if not rows:
+            return 0
+        placeholders = ",".join(["%s"] * len(rows))
+        execute(f"UPDATE games SET code = NULL WHERE id IN ({placeholders})", tuple(bid(r["id"]) for r in rows))
+        for r in rows:
+            if self.on_recycle is not None:
+                self.on_recycle(r["id"], r["code"])
+        self._push(r["code"] for r in rows)
+        self.recycled += len(rows)
+        return len(rows)
+
+    def start(self, socketio, tick: float = 1.0, recycle_interval: float = 300.0):
+        """Tâche de fond : recharge sous `low_water`, recyclage périodique (une seule fois)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        def loop():
+            last_recycle = 0.0
+            while True:
+                try:
+                    if time.monotonic() - last_recycle >= recycle_interval:
+                        last_recycle = time.monotonic()
+                        self.recycle()
+                    if len(self._free) < self.low_water:
+                        self.refill()
+                except Exception as e:
+                    print(f"❌ Error in room code allocator: {e}")
+                socketio.sleep(tick)
+
+        socketio.start_background_task(loop)
+
+    def stats(self) -> dict:
+        return {"free": len(self._free), "recycled": self.recycled, "unchecked": self.unchecked}
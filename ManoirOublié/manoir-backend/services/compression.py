@@ -0,0 +1,240 @@
+# services/compression.py
+# Compression gzip / brotli des réponses JSON et permessage-deflate pour le transport websocket
+import gzip, threading
+from collections import Counter, defaultdict
+from importlib.util import find_spec
+
+# Brotli est optionnel : sans lui, seul gzip est proposé
+HAS_BROTLI = find_spec("brotli") is not None
+
+# Types compressibles ; tout le reste (images, audio, vidéo, archives...) est déjà compressé
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/x-ndjson", "application/javascript",
+    "application/xml", "image/svg+xml", "text/plain", "text/html", "text/css", "text/csv",
+}
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """`gzip;q=0.8, br` -> {"gzip": 0.8, "br": 1.0}"""
+    out = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        out[name.strip().lower()] = q
+    return out
+
+
+def choose_encoding(header: str):
+    accepted = parse_accept_encoding(header)
+    for name in (("br", "gzip") if HAS_BROTLI else ("gzip",)):
+        if accepted.get(name, accepted.get("*", 0)) > 0:
+            return name
+    return None
+
+
+def policy(enabled: bool = True, min_size: int = None, level: int = None):
+    """Réglages de compression propres à une route (à placer sous @bp.get)."""
+    def deco(fn):
+        fn.compression_policy = {"enabled": enabled, "min_size": min_size, "level": level}
+        return fn
+    return deco
+
+
+class CompressionStats:
+    """Octets avant / après compression et réponses ignorées, par clé (route ou transport)."""
+
+    def __init__(self):
+        self._bytes_in = Counter()
+        self._bytes_out = Counter()
+        self._compressed = Counter()
+        self._skipped = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def compressed(self, key: str, size_in: int, size_out: int):
+        with self._lock:
+            self._compressed[key] += 1
+            self._bytes_in[key] += size_in
+            self._bytes_out[key] += size_out
+
+    def skipped(self, key: str, reason: str):
+        with self._lock:
+            self._skipped[key][reason] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            keys = set(self._compressed) | set(self._skipped)
+            out = {}
+            for key in sorted(keys):
+                size_in, size_out = self._bytes_in[key], self._bytes_out[key]
+                out[key] = {
+                    "compressed": self._compressed[key],
+                    "bytesIn": size_in,
+                    "bytesOut": size_out,
+                    "bytesSaved": size_in - size_out,
+                    "ratio": round(size_out / size_in, 3) if size_in else None,
+                    "skipped": dict(self._skipped[key]),
+                }
+            return out
+
+
+class ResponseCompressor:
+    """Compresse les réponses HTTP après coup (after_request), selon la taille et le type.
+
+    Ignorées : réponses en flux ou servies depuis un fichier (send_file,
+    proxys média), types déjà compressés, corps sous `min_size` octets,
+    clients sans Accept-Encoding. brotli est préféré à gzip s'il est
+    installé et accepté. Une route peut surcharger les réglages avec
+    `@policy(...)`.
+    """
+
+    def __init__(self, min_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5, enabled: bool = True):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.enabled = enabled
+        self.stats = CompressionStats()
+
+    def _compress(self, data: bytes, encoding: str, level) -> bytes:
+        if encoding == "br":
+            import brotli
+
+            return brotli.compress(data, quality=self.brotli_quality if level is None else level)
+        return gzip.compress(data, compresslevel=self.gzip_level if level is None else level, mtime=0)
+
+    def process(self, response, key: str, accept_encoding: str, route_policy=None):
+        route_policy = route_policy or {}
+        if not self.enabled or not route_policy.get("enabled", True):
+            return response
+        if response.direct_passthrough or response.is_streamed:
+            self.stats.skipped(key, "stream")
+            return response
+        if response.status_code < 200 or response.status_code in (204, 206, 304) or "Content-Encoding" in response.headers:
+            return response
+        if response.mimetype not in COMPRESSIBLE_TYPES:
+            self.stats.skipped(key, "type")
+            return response
+
+        min_size = route_policy.get("min_size")
+        data = response.get_data()
+        if len(data) < (self.min_size if min_size is None else min_size):
+            self.stats.skipped(key, "small")
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = choose_encoding(accept_encoding)
+        if encoding is None:
+            self.stats.skipped(key, "not_accepted")
+            return response
+
+        body = self._compress(data, encoding, route_policy.get("level"))
+        if len(body) >= len(data):
+            self.stats.skipped(key, "no_gain")
+            return response
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        if response.headers.get("ETag"):
+            # Représentation différente de l'original : validateur faible
+            tag, weak = response.get_etag()
+            response.set_etag(tag, weak=True)
+        self.stats.compressed(key, len(data), len(body))
+        return response
+
+    def install(self, app):
+        from flask import request
+
+        @app.after_request
+        def _compress_response(response):
+            view = app.view_functions.get(request.endpoint)
+            rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            return self.process(
+                response,
+                f"{request.method} {rule}",
+                request.headers.get("Accept-Encoding", ""),
+                getattr(view, "compression_policy", None),
+            )
+
+
+# ---------- Websocket (permessage-deflate) ----------
+def _deflate_extension(min_size: int, window_bits: int, no_context_takeover: bool, stats: CompressionStats):
+    from wsproto.extensions import PerMessageDeflate
+    from wsproto.frame_protocol import Opcode
+
+    class SizedPerMessageDeflate(PerMessageDeflate):
+        """permessage-deflate qui laisse passer en clair les messages sous `min_size` octets.
+
+        Le bit RSV1 est posé message par message : un message court non
+        compressé reste valide pour le client et ne coûte aucun CPU.
+        """
+
+        def frame_outbound(self, proto, opcode, rsv, data, fin):
+            if opcode in (Opcode.TEXT, Opcode.BINARY) and fin and len(data) < min_size:
+                stats.skipped("websocket", "small")
+                return rsv, data
+            rsv, out = super().frame_outbound(proto, opcode, rsv, data, fin)
+            if opcode in (Opcode.TEXT, Opcode.BINARY):
+                stats.compressed("websocket", len(data), len(out))
+            return rsv, out
+
+    return SizedPerMessageDeflate(
+        server_no_context_takeover=no_context_takeover,
+        client_no_context_takeover=no_context_takeover,
+        server_max_window_bits=window_bits,
+    )
+
+
+def install_websocket_deflate(socketio, stats: CompressionStats, min_size: int = 256,
+                              window_bits: int = 15, no_context_takeover: bool = False, enabled: bool = True):
+    """Négociation permessage-deflate réglable pour le transport websocket (mode threading).
+
+    simple-websocket accepte toujours l'extension avec ses réglages par
+    défaut (tout compresser, fenêtre de 32 Ko par connexion). On remplace
+    la classe websocket du serveur Engine.IO de cette instance pour fixer
+    le seuil, la fenêtre et la reprise de contexte, ou désactiver
+    l'extension. Les autres modes (eventlet, gevent) gardent leur
+    implémentation.
+    """
+    eio = socketio.server.eio
+    if eio.async_mode != "threading":
+        return False
+
+    import simple_websocket
+    from engineio.async_drivers._websocket_wsgi import SimpleWebSocketWSGI
+    from wsproto.events import AcceptConnection, Request
+
+    class DeflateServer(simple_websocket.Server):
+        def handshake(self):
+            in_data = b"GET / HTTP/1.1\r\n"
+            for key, value in self.environ.items():
+                if key.startswith("HTTP_"):
+                    header = "-".join([p.capitalize() for p in key[5:].split("_")])
+                    in_data += f"{header}: {value}\r\n".encode()
+            in_data += b"\r\n"
+            self.ws.receive_data(in_data)
+            for event in self.ws.events():
+                if isinstance(event, Request):
+                    self.subprotocol = self.choose_subprotocol(event)
+                    extensions = [_deflate_extension(min_size, window_bits, no_context_takeover, stats)] if enabled else []
+                    self.sock.send(self.ws.send(AcceptConnection(subprotocol=self.subprotocol, extensions=extensions)))
+                    self.connected = True
+                    return
+
+    class DeflateWebSocketWSGI(SimpleWebSocketWSGI):
+        def __call__(self, environ, start_response):
+            self.ws = DeflateServer(environ, **self.server_args)
+            ret = self.app(self)
+            if self.ws.mode == "gunicorn":
+                raise StopIteration()
+            elif self.ws.mode == "werkzeug":
+                raise ConnectionError()
+            return ret
+
+    # Copie : le dictionnaire du pilote est partagé entre serveurs
+    eio._async = dict(eio._async, websocket=DeflateWebSocketWSGI)
+    return True
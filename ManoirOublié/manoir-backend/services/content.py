@@ -0,0 +1,141 @@
+# services/content.py
+# Contenu d'une partie (image du puzzle, son, poème) tiré une seule fois au démarrage à partir de games.seed
+import json, random, threading, time
+from urllib.parse import quote
+
+from services.db import query_all
+
+SOUND_KEYS = ("url_audio", "sound_url", "url_son", "audio")
+CORRECT_KEYS = ("correct", "bonne_reponse", "answer")
+
+DEFAULT_IMAGE = "https://upload.wikimedia.org/wikipedia/commons/3/3b/Ch%C3%A2teau_des_ducs_de_Bretagne%2C_Nantes%2C_2012-08-19.jpg"
+DEFAULT_POEM = {
+    "text": "Dans les ombres du temps passé,\nUn musée se tient oublié.\nCherchez la clé de son mystère,\nDans les vers de cette prière.",
+    "answer": "musée oublié",
+}
+
+
+def sound_from_row(row: dict) -> dict:
+    """Normalise une ligne Enigme3_Son (plusieurs schémas coexistent) au format de /api/enigmes/3."""
+    sound = next((row[k] for k in SOUND_KEYS if row.get(k)), None)
+    options = []
+    raw = row.get("options_json") or row.get("options")
+    if raw:
+        try:
+            parsed = json.loads(raw) if isinstance(raw, str) else raw
+            if isinstance(parsed, list):
+                options = [str(x) for x in parsed if x]
+        except Exception:
+            options = []
+    if not options:
+        options = [str(row[k]) for k in ("option1", "option2", "option3", "option4") if row.get(k)]
+    correct = next((str(row[k]) for k in CORRECT_KEYS if row.get(k) is not None), None)
+    return {"sounds": [sound] if sound else [], "options": options, "correct": correct}
+
+
+class ContentCatalog:
+    """Catalogue des contenus d'énigmes, rechargé au plus toutes les `ttl` secondes.
+
+    `pick(seed)` est déterministe : deux appels avec la même graine donnent
+    le même contenu tant que le catalogue ne change pas. Avec un instantané
+    partagé (`shared`), un seul worker relit la base et tous lisent les
+    lignes depuis le même fichier mappé.
+    """
+
+    def __init__(self, ttl: float = 300, shared=None):
+        self.ttl = ttl
+        self.shared = shared
+        self._images = []
+        self._sounds = []
+        self._poems = []
+        self._version = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        images, sounds, poems = [], [], []
+        try:
+            for row in query_all("SELECT url_photo_1, url_photo_2, url_photo_3 FROM Enigme1_Puzzle") or []:
+                images.extend(str(u) for u in (row.get("url_photo_1"), row.get("url_photo_2"), row.get("url_photo_3")) if u)
+        except Exception as e:
+            print(f"❌ Error loading Enigme1_Puzzle: {e}")
+        try:
+            for row in query_all("SELECT * FROM Enigme3_Son") or []:
+                sound = sound_from_row(row)
+                if sound["sounds"] or sound["correct"]:
+                    sounds.append(sound)
+        except Exception as e:
+            print(f"❌ Error loading Enigme3_Son: {e}")
+        try:
+            rows = query_all(
+                "SELECT p.texte_poeme, p.solution FROM Enigme5_Poetique p "
+                "JOIN Enigme e ON p.id_poetique = e.id_enigme WHERE e.type_enigme = 'poetique'"
+            )
+            poems = [{"text": r["texte_poeme"], "answer": r["solution"]} for r in rows or [] if r.get("texte_poeme")]
+        except Exception as e:
+            print(f"❌ Error loading Enigme5_Poetique: {e}")
+        return {"images": images, "sounds": sounds, "poems": poems}
+
+    def _use(self, sections, version=None):
+        with self._lock:
+            self._images, self._sounds, self._poems = sections.get("images", ()), sections.get("sounds", ()), sections.get("poems", ())
+            self._version = version
+            self._loaded_at = time.monotonic()
+
+    def refresh(self):
+        if self.shared is not None:
+            view = self.shared.refresh(self._load, self.ttl)
+            if view is not None:
+                self._use(view, view.version)
+                return
+        self._use(self._load())
+
+    def pick(self, seed: int) -> dict:
+        if time.monotonic() - self._loaded_at > self.ttl:
+            self.refresh()
+        elif self.shared is not None:
+            # Version publiée entre-temps par un autre worker : simple lecture mémoire
+            try:
+                view = self.shared.current()
+            except OSError as e:
+                # Répertoire partagé inutilisable : ce worker charge localement désormais
+                print(f"❌ Shared snapshot {self.shared.name}: {e}")
+                self.shared = None
+                view = None
+            if view is not None and view.version != self._version:
+                self._use(view, view.version)
+        rng = random.Random(seed)
+        with self._lock:
+            images, sounds, poems = self._images, self._sounds, self._poems
+        sound = dict(rng.choice(sounds)) if sounds else {"sounds": [], "options": [], "correct": None}
+        if sound["correct"] and not sound["options"]:
+            # Même complément que /api/enigmes/3, mais mélangé avec la graine de la partie
+            sound["options"] = list(dict.fromkeys([sound["correct"], "éléphant", "machine"]))
+            rng.shuffle(sound["options"])
+        return {
+            "enigme1": {"images": [rng.choice(images) if images else DEFAULT_IMAGE]},
+            "enigme3": sound,
+            "enigme5": dict(rng.choice(poems)) if poems else dict(DEFAULT_POEM),
+        }
+
+
+# Champs réservés à la validation côté serveur : jamais dans le manifeste (route publique, spectateurs)
+ANSWER_FIELDS = {"enigme3": ("correct",), "enigme5": ("answer",)}
+
+
+def public_content(content: dict) -> dict:
+    """Contenu sans les réponses : médias et textes à afficher seulement."""
+    out = {}
+    for key, value in content.items():
+        hidden = ANSWER_FIELDS.get(key, ())
+        out[key] = {k: v for k, v in value.items() if k not in hidden} if isinstance(value, dict) else value
+    return out
+
+
+def manifest(content: dict) -> dict:
+    """Contenu public + liste des médias à précharger, avec leur URL de proxy."""
+    items = [{"kind": "image", "enigme": 1, "url": u, "proxy": f"/image-proxy?url={quote(u, safe='')}"}
+             for u in content["enigme1"]["images"]]
+    items += [{"kind": "audio", "enigme": 3, "url": u, "proxy": f"/audio-proxy?url={quote(u, safe='')}"}
+              for u in content["enigme3"]["sounds"]]
+    return {"content": public_content(content), "media": items}
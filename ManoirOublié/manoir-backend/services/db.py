@@ -1,24 +1,59 @@
-import os
-from mysql.connector import pooling
+import contextvars, itertools, os, threading, time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
 from urllib.parse import urlparse
-from dotenv import load_dotenv
 
-# Charge le ..env local (ou variables déjà dans l'environnement Clever Cloud)
-load_dotenv()
+from services.resilience import CircuitOpen, DeadlineExceeded, breakers, remaining
 
+# Le pool (et mysql.connector) n'est créé qu'au premier accès ou pendant startup() :
+# importer ce module n'ouvre aucune connexion. Le .env est chargé une seule fois par app.py.
 _pool = None
+_pool_lock = threading.Lock()
+
+# Délais : connexion, lecture socket (toute instruction) et durée max d'un SELECT côté serveur.
+# Le SELECT reçoit le plus petit de DB_QUERY_TIMEOUT et du budget restant de la requête HTTP.
+CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", 3))
+READ_TIMEOUT = int(os.getenv("DB_READ_TIMEOUT", 10))
+QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", 5))
+ER_QUERY_TIMEOUT = 3024
+
+# Identifiants de parties / joueurs : BINARY(16) en base, hex partout ailleurs (API, JWT, rooms).
+# Les paramètres sont convertis explicitement avec bid() ; les colonnes ci-dessous sont
+# reconverties en hex à la lecture.
+ID_COLUMNS = frozenset({"id", "game_id", "player_id", "completed_by"})
+
+def bid(hex_id):
+    """Identifiant hex -> 16 octets pour un paramètre SQL (None si absent ou invalide : ne correspond à rien)."""
+    if hex_id is None:
+        return None
+    try:
+        raw = bytes.fromhex(hex_id)
+    except (TypeError, ValueError):
+        return None
+    return raw if len(raw) == 16 else None
+
+def _hex_ids(row):
+    if row:
+        for key in ID_COLUMNS.intersection(row):
+            value = row[key]
+            if isinstance(value, (bytes, bytearray)):
+                row[key] = value.hex()
+    return row
+
+def _parse_url(url: str) -> dict:
+    parsed = urlparse(url)
+    return {
+        "host": parsed.hostname or "localhost",
+        "port": parsed.port or 3306,
+        "user": parsed.username or "root",
+        "password": parsed.password or "",
+        "database": (parsed.path or "/manoir").lstrip("/"),
+    }
 
 def _config_from_env():
     url = os.getenv("DATABASE_URL") or os.getenv("CC_MYSQL_ADDON_URI") or os.getenv("MYSQL_ADDON_URI")
     if url and url.startswith("mysql://"):
-        parsed = urlparse(url)
-        return {
-            "host": parsed.hostname or "localhost",
-            "port": parsed.port or 3306,
-            "user": parsed.username or "root",
-            "password": parsed.password or "",
-            "database": (parsed.path or "/manoir").lstrip("/"),
-        }
+        return _parse_url(url)
     return {
         "host": os.getenv("DB_HOST", "localhost"),
         "port": int(os.getenv("DB_PORT", 3306)),
@@ -27,40 +62,387 @@ def _config_from_env():
         "database": os.getenv("DB_NAME", "manoir"),
     }
 
+def _replicas_from_env():
+    """DB_REPLICAS : liste séparée par des virgules d'URL mysql:// ou de host[:port] (mêmes identifiants que le primaire)."""
+    out = []
+    for item in filter(None, (x.strip() for x in os.getenv("DB_REPLICAS", "").split(","))):
+        if item.startswith("mysql://"):
+            out.append(_parse_url(item))
+        else:
+            host, _, port = item.partition(":")
+            out.append(dict(_config_from_env(), host=host, port=int(port or 3306)))
+    return out
+
+def _make_pool(name: str, cfg: dict, size: int):
+    from mysql.connector import pooling
+    from mysql.connector.constants import DEFAULT_CONFIGURATION
+
+    timeouts = {"connection_timeout": CONNECT_TIMEOUT}
+    if "read_timeout" in DEFAULT_CONFIGURATION:
+        # Option des versions récentes du connecteur ; sinon seul le délai de connexion s'applique
+        timeouts["read_timeout"] = READ_TIMEOUT
+    return pooling.MySQLConnectionPool(pool_name=name, pool_size=size, autocommit=True, **timeouts, **cfg)
+
 def get_pool():
     global _pool
     if _pool:
         return _pool
-    cfg = _config_from_env()
-    _pool = pooling.MySQLConnectionPool(
-        pool_name=os.getenv("DB_POOL_NAME", "manoir_pool"),
-        pool_size=int(os.getenv("DB_POOL_SIZE", 4)),
-        host=cfg["host"],
-        port=cfg["port"],
-        user=cfg["user"],
-        password=cfg["password"],
-        database=cfg["database"],
-        autocommit=True,
-    )
-    return _pool
+    with _pool_lock:
+        if _pool:
+            return _pool
+        _pool = _make_pool(os.getenv("DB_POOL_NAME", "manoir_pool"), _config_from_env(), int(os.getenv("DB_POOL_SIZE", 4)))
+        return _pool
 
 def get_conn():
+    """Connexion au primaire (écritures, lectures transactionnelles, DDL)."""
     return get_pool().get_connection()
 
-def query_one(sql: str, params: tuple = ()):
-    with get_conn() as conn:
-        with conn.cursor(dictionary=True) as cur:
-            cur.execute(sql, params)
-            return cur.fetchone()
+def _is_connection_error(exc) -> bool:
+    from mysql.connector import errors
+
+    return isinstance(exc, (errors.InterfaceError, errors.OperationalError))
+
+def _is_dependency_error(exc) -> bool:
+    """Échec imputable au serveur (connexion, délai) et non à la requête : compte pour le disjoncteur."""
+    return getattr(exc, "errno", None) == ER_QUERY_TIMEOUT or _is_connection_error(exc)
+
+def _with_timeout(sql: str) -> str:
+    """Borne un SELECT côté serveur (MAX_EXECUTION_TIME) ; lève DeadlineExceeded si le budget est épuisé."""
+    ms = max(1, int(remaining(QUERY_TIMEOUT) * 1000))
+    head = sql.lstrip()
+    if head[:6].upper() != "SELECT" or head[6:].lstrip().startswith("/*+"):
+        return sql
+    return f"SELECT /*+ MAX_EXECUTION_TIME({ms}) */{head[6:]}"
+
+def primary_breaker():
+    return breakers.get("db:primary")
+
+
+# ---------- Réplicas en lecture ----------
+class Replica:
+    __slots__ = ("name", "cfg", "pool", "healthy", "lag", "error", "checked_at", "_lock")
+
+    def __init__(self, name: str, cfg: dict):
+        self.name = name
+        self.cfg = cfg
+        self.pool = None
+        self.healthy = True       # optimiste jusqu'au premier contrôle
+        self.lag = 0.0
+        self.error = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get_conn(self):
+        if self.pool is None:
+            with self._lock:
+                if self.pool is None:
+                    self.pool = _make_pool(self.name, self.cfg, int(os.getenv("DB_REPLICA_POOL_SIZE", 4)))
+        return self.pool.get_connection()
+
+
+class ReplicaRouter:
+    """Aiguillage des lectures vers les réplicas sains, écritures sur le primaire.
+
+    - Une lecture va au primaire si `primary=True` (lecture suivie d'une
+      écriture), si aucun réplica n'est sain, ou si la partie `game` a été
+      écrite il y a moins de `sticky_seconds` (lecture de ses propres écritures).
+    - Un réplica dont le retard dépasse `max_lag` secondes, ou dont la
+      réplication est arrêtée, est écarté jusqu'au contrôle suivant.
+    - Une erreur de connexion sur un réplica l'écarte immédiatement et la
+      lecture est rejouée sur le primaire.
+    """
+
+    def __init__(self, max_lag: float = 2.0, sticky_seconds: float = 5.0):
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self.replicas = None
+        self.reads = Counter()
+        self._sticky = {}         # gid -> échéance (monotonic)
+        self._rr = itertools.count()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _ensure_configured(self):
+        if self.replicas is None:
+            with self._lock:
+                if self.replicas is None:
+                    self.replicas = [Replica(f"manoir_replica_{i}", cfg) for i, cfg in enumerate(_replicas_from_env())]
+        return self.replicas
+
+    def touch(self, *games):
+        """Marque des parties comme écrites : leurs lectures restent sur le primaire un moment."""
+        deadline = time.monotonic() + self.sticky_seconds
+        with self._lock:
+            for gid in games:
+                if gid is not None:
+                    self._sticky[gid] = deadline
+            if len(self._sticky) > 10000:
+                now = time.monotonic()
+                self._sticky = {g: d for g, d in self._sticky.items() if d > now}
+
+    def is_sticky(self, gid) -> bool:
+        deadline = self._sticky.get(gid)
+        return deadline is not None and deadline > time.monotonic()
+
+    def pick(self, game=None):
+        if game is not None and self.is_sticky(game):
+            self.reads["sticky"] += 1
+            return None
+        healthy = [r for r in self._ensure_configured() if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._rr) % len(healthy)]
+
+    def mark_failed(self, replica: Replica, exc):
+        replica.healthy = False
+        replica.error = str(exc)
+        print(f"❌ Réplica {replica.cfg['host']}:{replica.cfg['port']} écarté: {exc}")
+
+    def _lag(self, replica: Replica):
+        """Retard en secondes ; 0 pour une instance autonome, None si la réplication est arrêtée."""
+        with replica.get_conn() as conn:
+            with conn.cursor(dictionary=True) as cur:
+                try:
+                    cur.execute("SHOW REPLICA STATUS")
+                except Exception:
+                    cur.execute("SHOW SLAVE STATUS")
+                row = cur.fetchone()
+        if not row:
+            return 0.0
+        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+        return float(lag) if lag is not None else None
 
-def query_all(sql: str, params: tuple = ()):
-    with get_conn() as conn:
+    def check(self):
+        for replica in self._ensure_configured():
+            try:
+                lag = self._lag(replica)
+                replica.lag = lag
+                replica.healthy = lag is not None and lag <= self.max_lag
+                replica.error = None if lag is not None else "replication stopped"
+            except Exception as e:
+                replica.healthy = False
+                replica.error = str(e)
+            replica.checked_at = time.time()
+
+    def start(self, socketio, interval: float = 2.0):
+        """Contrôle périodique de santé / retard des réplicas (une seule fois)."""
+        with self._lock:
+            if self._started or not self._ensure_configured():
+                return
+            self._started = True
+
+        def loop():
+            while True:
+                self.check()
+                socketio.sleep(interval)
+
+        socketio.start_background_task(loop)
+
+    def stats(self) -> dict:
+        return {
+            "reads": dict(self.reads),
+            "replicas": [
+                {"host": f"{r.cfg['host']}:{r.cfg['port']}", "healthy": r.healthy, "lag": r.lag, "error": r.error}
+                for r in self._ensure_configured()
+            ],
+        }
+
+
+router = ReplicaRouter(
+    max_lag=float(os.getenv("DB_REPLICA_MAX_LAG", 2)),
+    sticky_seconds=float(os.getenv("DB_STICKY_SECONDS", 5)),
+)
+
+def touch(*games):
+    router.touch(*games)
+
+def warm_up() -> int:
+    """Crée le pool primaire (toutes ses connexions sont ouvertes à la création), vérifie qu'il répond et contrôle les réplicas."""
+    pool = get_pool()
+    query_one("SELECT 1", primary=True)
+    router.check()
+    return pool.pool_size
+
+
+# ---------- Connexion partagée (requêtes groupées) ----------
+class SharedConnection:
+    """Une connexion du primaire partagée par plusieurs tâches d'une même requête.
+
+    Prise au pool au premier usage seulement, une instruction à la fois
+    (une connexion MySQL n'exécute pas deux requêtes en parallèle), rendue
+    au pool par `release()`.
+    """
+
+    def __init__(self):
+        self.conn = None
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self):
+        with self._lock:
+            if self.conn is None:
+                self.conn = get_conn()
+            self.queries += 1
+            yield self.conn
+
+    def release(self):
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+_shared = contextvars.ContextVar("db_shared_connection", default=None)
+
+@contextmanager
+def using(shared: SharedConnection):
+    """Dans ce bloc (et ce thread), toutes les requêtes passent par `shared`."""
+    token = _shared.set(shared)
+    try:
+        yield shared
+    finally:
+        _shared.reset(token)
+
+
+# ---------- Dernières valeurs connues (repli si la base est indisponible) ----------
+_stale = OrderedDict()
+_stale_lock = threading.Lock()
+STALE_MAX = int(os.getenv("DB_STALE_CACHE_SIZE", 5000))
+
+def _remember(key, value):
+    with _stale_lock:
+        _stale[key] = value
+        _stale.move_to_end(key)
+        while len(_stale) > STALE_MAX:
+            _stale.popitem(last=False)
+
+
+# ---------- Requêtes ----------
+def _run_read(get_connection, sql, params, one):
+    sql = _with_timeout(sql)
+    with get_connection() as conn:
         with conn.cursor(dictionary=True) as cur:
             cur.execute(sql, params)
-            return cur.fetchall()
+            if one:
+                return _hex_ids(cur.fetchone())
+            return [_hex_ids(row) for row in cur.fetchall()]
 
-def execute(sql: str, params: tuple = ()):
-    with get_conn() as conn:
-        with conn.cursor(dictionary=True) as cur:
+def _read(sql, params, one, game, primary):
+    shared = _shared.get()
+    if shared is not None:
+        with primary_breaker().guard(_is_dependency_error):
+            return _run_read(shared.checkout, sql, params, one)
+    replica = None if primary else router.pick(game)
+    if replica is not None:
+        try:
+            with breakers.get(f"db:{replica.name}").guard(_is_dependency_error):
+                result = _run_read(replica.get_conn, sql, params, one)
+            router.reads["replica"] += 1
+            return result
+        except DeadlineExceeded:
+            raise
+        except CircuitOpen:
+            router.reads["fallback"] += 1
+        except Exception as e:
+            if _is_connection_error(e):
+                router.mark_failed(replica, e)
+            elif not _is_dependency_error(e) and type(e).__name__ != "PoolError":
+                raise
+            router.reads["fallback"] += 1
+    else:
+        router.reads["primary"] += 1
+    with primary_breaker().guard(_is_dependency_error):
+        return _run_read(get_conn, sql, params, one)
+
+def _read_or_stale(sql, params, one, game, primary):
+    """Lecture mémorisée : si la base échoue (disjoncteur, délai, connexion), dernière valeur connue."""
+    key = (sql, params, one)
+    try:
+        result = _read(sql, params, one, game, primary)
+    except Exception as e:
+        if not isinstance(e, (CircuitOpen, DeadlineExceeded)) and not _is_dependency_error(e):
+            raise
+        with _stale_lock:
+            if key not in _stale:
+                raise
+            router.reads["stale"] += 1
+            return _stale[key]
+    _remember(key, result)
+    return result
+
+def stream_conn():
+    """Connexion dédiée hors pool pour les lectures longues (exports) : un réplica sain si possible."""
+    import mysql.connector
+
+    replica = router.pick()
+    if replica is not None:
+        try:
+            conn = mysql.connector.connect(autocommit=True, connection_timeout=CONNECT_TIMEOUT, **replica.cfg)
+            router.reads["replica"] += 1
+            return conn
+        except Exception as e:
+            if not _is_connection_error(e):
+                raise
+            router.mark_failed(replica, e)
+            router.reads["fallback"] += 1
+    else:
+        router.reads["primary"] += 1
+    return mysql.connector.connect(autocommit=True, connection_timeout=CONNECT_TIMEOUT, **_config_from_env())
+
+def stream_query(sql: str, params: tuple = (), chunk_size: int = 1000):
+    """Générateur de blocs de lignes lus avec un curseur non bufferisé (mémoire bornée à un bloc)."""
+    conn = stream_conn()
+    try:
+        cur = conn.cursor(dictionary=True, buffered=False)
+        try:
             cur.execute(sql, params)
-            return cur.lastrowid
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield [_hex_ids(row) for row in rows]
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                pass
+    finally:
+        # Fermer la connexion abandonne aussi un résultat non lu (client HTTP parti en cours d'export)
+        conn.close()
+
+def query_one(sql: str, params: tuple = (), game=None, primary: bool = False, stale_ok: bool = False):
+    """Lecture d'une ligne ; `game` active la lecture de ses propres écritures, `primary` force le primaire.
+
+    `stale_ok` : si la base est indisponible, retourne le dernier résultat connu de la même requête.
+    """
+    if stale_ok:
+        return _read_or_stale(sql, params, True, game, primary)
+    return _read(sql, params, True, game, primary)
+
+def query_all(sql: str, params: tuple = (), game=None, primary: bool = False, stale_ok: bool = False):
+    if stale_ok:
+        return _read_or_stale(sql, params, False, game, primary)
+    return _read(sql, params, False, game, primary)
+
+def execute(sql: str, params: tuple = (), game=None):
+    """Écriture sur le primaire ; `game` rend les lectures suivantes de cette partie collantes au primaire."""
+    remaining(QUERY_TIMEOUT)
+    if game is not None:
+        router.touch(game)
+    shared = _shared.get()
+    with primary_breaker().guard(_is_dependency_error):
+        with (shared.checkout() if shared is not None else get_conn()) as conn:
+            with conn.cursor(dictionary=True) as cur:
+                cur.execute(sql, params)
+                return cur.lastrowid
+
+def execute_many(sql: str, seq_params, game=None):
+    remaining(QUERY_TIMEOUT)
+    if game is not None:
+        router.touch(game)
+    shared = _shared.get()
+    with primary_breaker().guard(_is_dependency_error):
+        with (shared.checkout() if shared is not None else get_conn()) as conn:
+            with conn.cursor() as cur:
+                cur.executemany(sql, seq_params)
+                return cur.rowcount
@@ -0,0 +1,124 @@
+# services/journal.py
+# Journal d'événements append-only par partie, écrit en base par lots
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+from services.db import query_all, execute, execute_many, bid, touch
+from services.serialization import dumps, loads
+
+INSERT_SQL = "INSERT INTO game_events (game_id, seq, type, player_id, payload, created_at) VALUES (%s,%s,%s,%s,%s,%s)"
+# Réserve `n` numéros pour une partie, atomiquement, et retourne le dernier (LAST_INSERT_ID).
+# Compteur amorcé depuis MAX(seq) à la première réservation (événements écrits avant le compteur).
+RESERVE_SQL = (
+    "INSERT INTO game_event_seq (game_id, seq) "
+    "SELECT %s, LAST_INSERT_ID(COALESCE(MAX(seq), 0) + %s) FROM game_events WHERE game_id=%s "
+    "ON DUPLICATE KEY UPDATE seq = LAST_INSERT_ID(game_event_seq.seq + %s)"
+)
+
+
+class EventJournal:
+    """Ajoute des événements numérotés (seq croissant par partie).
+
+    Les événements sont d'abord mis en tampon puis insérés en un seul
+    `executemany` (INSERT multi-lignes) quand le tampon atteint
+    `batch_size` ou à chaque passage de la tâche de fond.
+
+    Les seq sont attribués au vidage, par un compteur en base
+    (`game_event_seq`) : une réservation par partie et par lot, atomique
+    entre workers, donc jamais de doublon. Un lot en échec est remis en
+    tête du tampon et renuméroté au vidage suivant (le journal peut avoir
+    des trous de numérotation, jamais d'événement perdu hors `max_pending`).
+    """
+
+    def __init__(self, batch_size: int = 200, max_pending: int = 20000):
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._buffer = deque()         # (gid, type, player_id, payload, created_at) sans seq
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._started = False
+
+    def append(self, gid: str, type: str, payload=None, pid: str = None):
+        with self._lock:
+            self._buffer.append((gid, type, bid(pid), dumps(payload or {}), datetime.now(timezone.utc)))
+            while len(self._buffer) > self.max_pending:
+                self._buffer.popleft()
+                self.dropped += 1
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def _requeue(self, rows):
+        with self._lock:
+            self._buffer.extendleft(reversed(rows))
+            while len(self._buffer) > self.max_pending:
+                self._buffer.pop()
+                self.dropped += 1
+
+    def _number(self, rows) -> list:
+        """Lignes prêtes à insérer, seq réservés par partie dans l'ordre d'arrivée."""
+        by_game = {}
+        for row in rows:
+            by_game.setdefault(row[0], []).append(row)
+        numbered = []
+        for gid, items in by_game.items():
+            n = len(items)
+            last = execute(RESERVE_SQL, (bid(gid), n, bid(gid), n))
+            for seq, (_, type, pid, payload, at) in enumerate(items, int(last) - n + 1):
+                numbered.append((bid(gid), seq, type, pid, payload, at))
+        return numbered
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._buffer)
+                self._buffer.clear()
+            if not rows:
+                return 0
+            try:
+                execute_many(INSERT_SQL, self._number(rows))
+            except Exception as e:
+                print(f"❌ Error flushing game events: {e}")
+                self._requeue(rows)
+                return 0
+            touch(*{row[0] for row in rows})
+            return len(rows)
+
+    def replay(self, gid: str, since: int = 0, page_size: int = 500):
+        """Générateur des événements d'une partie après `since`, lus par pages sur l'index (game_id, seq)."""
+        self.flush()
+        last = since
+        while True:
+            rows = query_all(
+                "SELECT seq, type, player_id, payload, created_at FROM game_events WHERE game_id=%s AND seq>%s ORDER BY seq LIMIT %s",
+                (bid(gid), last, page_size),
+                game=gid,
+            ) or []
+            for row in rows:
+                payload = row["payload"]
+                yield {
+                    "seq": row["seq"],
+                    "type": row["type"],
+                    "playerId": row["player_id"],
+                    "payload": loads(payload) if isinstance(payload, (str, bytes)) else payload,
+                    "at": row["created_at"],
+                }
+            if len(rows) < page_size:
+                return
+            last = rows[-1]["seq"]
+
+    def start(self, socketio, interval: float = 1.0):
+        """Vidage périodique du tampon en tâche de fond (une seule fois)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        def loop():
+            while True:
+                socketio.sleep(interval)
+                self.flush()
+
+        socketio.start_background_task(loop)
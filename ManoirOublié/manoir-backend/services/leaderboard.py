@@ -0,0 +1,256 @@
+# services/leaderboard.py
+# Classements en mémoire (par partie et global sur fenêtres glissantes)
+import threading, time
+from bisect import bisect_left, insort
+from collections import deque
+from datetime import datetime, timezone
+
+from services.db import query_one, query_all, execute
+from services.serialization import dumps
+
+WINDOWS = {"1h": 3600, "24h": 86400, "all": None}
+
+
+class RankedScores:
+    """Scores triés (score décroissant, premier arrivé devant).
+
+    `_order` reste trié : un rang se trouve par bisection (O(log n)), une
+    mise à jour décale la liste (O(n)) ; les tableaux restent donc bornés
+    (`max_ranked`).
+    """
+    __slots__ = ("_entries", "_order")
+
+    def __init__(self):
+        self._entries = {}   # clé -> (score, ts)
+        self._order = []     # (-score, ts, clé)
+
+    def __len__(self):
+        return len(self._order)
+
+    def add(self, key: str, points: int, ts: float):
+        old = self._entries.get(key)
+        if old is not None:
+            i = bisect_left(self._order, (-old[0], old[1], key))
+            del self._order[i]
+            score = old[0] + points
+        else:
+            score = points
+        if score <= 0:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (score, ts)
+        insort(self._order, (-score, ts, key))
+
+    def score(self, key: str) -> int:
+        entry = self._entries.get(key)
+        return entry[0] if entry else 0
+
+    def rank(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return bisect_left(self._order, (-entry[0], entry[1], key)) + 1
+
+    def top(self, n: int):
+        return [(key, -neg) for neg, _, key in self._order[:n]]
+
+
+class WindowedScores(RankedScores):
+    """Scores limités aux `window` dernières secondes (None = depuis toujours)."""
+    __slots__ = ("window", "_events")
+
+    def __init__(self, window):
+        super().__init__()
+        self.window = window
+        self._events = deque()
+
+    def record(self, key: str, points: int, ts: float):
+        self.add(key, points, ts)
+        if self.window is not None:
+            self._events.append((ts, key, points))
+
+    def expire(self, now: float):
+        if self.window is None:
+            return
+        limit = now - self.window
+        while self._events and self._events[0][0] < limit:
+            ts, key, points = self._events.popleft()
+            self.add(key, -points, ts)
+
+
+# Classement global recalculé depuis la base (vérité commune à tous les workers)
+ALL_SQL = "SELECT id, nickname, score_total FROM players WHERE score_total > 0 ORDER BY score_total DESC LIMIT %s"
+SOLVES_SQL = (
+    "SELECT c.completed_by, p.nickname, c.completed_at FROM game_enigmes_completed c "
+    "LEFT JOIN players p ON p.id = c.completed_by WHERE c.completed_at >= %s ORDER BY c.completed_at"
+)
+
+
+def _ts(value) -> float:
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+    return 0.0
+
+
+class Leaderboard:
+    """Classement par partie et classement global sur fenêtres glissantes.
+
+    Une résolution met à jour tout de suite les tableaux du worker qui la
+    traite ; le classement global est recalculé depuis la base toutes les
+    `refresh` secondes (`players.score_total` pour « all », résolutions de
+    la plus longue fenêtre pour les autres). Tous les workers convergent
+    donc vers le même classement, « all » garde au plus `max_ranked`
+    joueurs et les noms ne sont gardés que pour les joueurs classés.
+    """
+
+    def __init__(self, top_n: int = 100, max_ranked: int = 10000, solve_points: int = 400):
+        self.top_n = top_n
+        self.max_ranked = max_ranked
+        self.solve_points = solve_points
+        self._games = {}                                   # gid -> RankedScores
+        self._global = {name: WindowedScores(w) for name, w in WINDOWS.items()}
+        self._names = {}                                   # pid -> pseudo
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._started = False
+
+    # ---------- Mises à jour ----------
+    def record(self, gid: str, pid: str, name: str, points: int, ts: float = None):
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            self._names[pid] = name
+            self._games.setdefault(gid, RankedScores()).add(pid, points, ts)
+            for board in self._global.values():
+                board.expire(ts)
+                board.record(pid, points, ts)
+            self._dirty = True
+
+    def seed_game(self, gid: str, players):
+        """Initialise le classement d'une partie depuis ses modèles `Player` (une seule fois)."""
+        with self._lock:
+            if gid in self._games:
+                return
+            board = self._games[gid] = RankedScores()
+            for p in players:
+                if p.score_total > 0:
+                    self._names.setdefault(p.id, p.nickname)
+                    board.add(p.id, p.score_total, 0.0)
+
+    def forget_game(self, gid: str):
+        """Libère le classement d'une partie terminée ou sortie du registre (le classement global reste)."""
+        with self._lock:
+            board = self._games.pop(gid, None)
+            if board is None:
+                return
+            for pid, _ in board.top(len(board)):
+                if not any(g.score(pid) for g in self._global.values()):
+                    self._names.pop(pid, None)
+
+    def refresh(self) -> bool:
+        """Recalcule le classement global depuis la base ; garde l'actuel si elle ne répond pas."""
+        now = time.time()
+        longest = max(w for w in WINDOWS.values() if w is not None)
+        try:
+            ranked = query_all(ALL_SQL, (self.max_ranked,)) or []
+            solves = query_all(SOLVES_SQL, (datetime.fromtimestamp(now - longest, timezone.utc),)) or []
+        except Exception as e:
+            print(f"❌ Error refreshing leaderboard: {e}")
+            return False
+        boards = {name: WindowedScores(w) for name, w in WINDOWS.items()}
+        names = {}
+        for row in ranked:
+            boards["all"].add(row["id"], int(row["score_total"]), 0.0)
+            names[row["id"]] = row["nickname"]
+        for row in solves:
+            pid, ts = row["completed_by"], _ts(row["completed_at"])
+            for name, w in WINDOWS.items():
+                if w is not None and ts >= now - w:
+                    boards[name].record(pid, self.solve_points, ts)
+            names.setdefault(pid, row.get("nickname") or "Un joueur")
+        with self._lock:
+            for board in self._games.values():
+                for pid, _ in board.top(len(board)):
+                    if pid in self._names:
+                        names.setdefault(pid, self._names[pid])
+            self._global, self._names = boards, names
+            self._dirty = True
+        return True
+
+    # ---------- Lectures ----------
+    def _entry(self, pid: str, score: int, rank: int, ids: bool):
+        entry = {"rank": rank, "name": self._names.get(pid, "Un joueur"), "score": score}
+        if ids:
+            entry["playerId"] = pid
+        return entry
+
+    def has_game(self, gid: str) -> bool:
+        return gid in self._games
+
+    def game_board(self, gid: str, ids: bool = True):
+        """Classement d'une partie ; `ids` : identifiants des joueurs (membres de la partie seulement)."""
+        with self._lock:
+            board = self._games.get(gid)
+            if board is None:
+                return []
+            return [self._entry(pid, score, i, ids) for i, (pid, score) in enumerate(board.top(len(board)), 1)]
+
+    def global_top(self, window: str = "all", limit: int = 10, ids: bool = False):
+        """Top global public : rang, pseudo et score (ni joueur ni partie identifiables)."""
+        with self._lock:
+            board = self._global[window]
+            board.expire(time.time())
+            return [self._entry(pid, score, i, ids) for i, (pid, score) in enumerate(board.top(limit), 1)]
+
+    def player_rank(self, pid: str, window: str = "all"):
+        with self._lock:
+            return self._global[window].rank(pid)
+
+    # ---------- Instantanés ----------
+    def snapshot(self, min_age: float = 0.0) -> int:
+        """Écrit le top N de chaque fenêtre dans `leaderboard_snapshots` si quelque chose a changé.
+
+        Tous les workers ont le même classement : une fenêtre déjà
+        enregistrée depuis moins de `min_age` secondes (par un autre worker)
+        n'est pas réécrite.
+        """
+        if not self._dirty:
+            return 0
+        self._dirty = False
+        taken = datetime.now(timezone.utc)
+        written = 0
+        for window in WINDOWS:
+            try:
+                last = query_one(
+                    "SELECT MAX(taken_at) AS taken_at FROM leaderboard_snapshots WHERE window_name=%s",
+                    (window,),
+                    primary=True,
+                )
+                if last and last["taken_at"] and taken.timestamp() - _ts(last["taken_at"]) < min_age:
+                    continue
+                execute(
+                    "INSERT INTO leaderboard_snapshots (window_name, taken_at, entries) VALUES (%s,%s,%s)",
+                    (window, taken, dumps(self.global_top(window, self.top_n, ids=True))),
+                )
+                written += 1
+            except Exception as e:
+                print(f"❌ Error writing leaderboard snapshot: {e}")
+                self._dirty = True
+        return written
+
+    def start(self, socketio, interval: float = 60.0, refresh: float = 30.0):
+        """Recalcul depuis la base et instantanés périodiques en tâche de fond (une seule fois)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        def loop():
+            last_snapshot = time.monotonic()
+            while True:
+                self.refresh()
+                if time.monotonic() - last_snapshot >= interval:
+                    self.snapshot(min_age=interval / 2)
+                    last_snapshot = time.monotonic()
+                socketio.sleep(refresh)
+
+        socketio.start_background_task(loop)
@@ -0,0 +1,375 @@
+# services/media.py
+# Dérivés d'images (redimensionnement, WebP, tuiles de puzzle) calculés hors processus et mis en cache disque
+import hashlib, os, tempfile, threading, time, warnings
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
+from io import BytesIO
+
+from services.resilience import remaining
+
+# Pillow n'est importé que dans les processus de rendu (import coûteux au démarrage)
+HAS_PIL = find_spec("PIL") is not None
+
+# Largeurs servies : la largeur demandée est arrondie au palier supérieur
+# (nombre de variantes en cache borné)
+WIDTHS = (80, 120, 160, 240, 320, 480, 640, 960, 1280, 1920)
+# Tuiles : la grille entière est rendue d'un coup (côté w * grid <= 1920 px)
+TILE_WIDTHS = (80, 120, 160, 240, 320)
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+MAX_GRID = 6
+MAX_SOURCE_BYTES = int(os.getenv("MEDIA_MAX_SOURCE_BYTES", 20 * 1024 * 1024))
+# Pixels décodés au plus (en-tête lu avant le décodage : bombes de décompression refusées)
+MAX_SOURCE_PIXELS = int(os.getenv("MEDIA_MAX_SOURCE_PIXELS", 25_000_000))
+
+CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "manoir-media"))
+
+
+class MediaError(Exception):
+    pass
+
+
+def snap_width(w: int, steps=WIDTHS) -> int:
+    for step in steps:
+        if w <= step:
+            return step
+    return steps[-1]
+
+
+def parse_params(args, accept: str = ""):
+    """Paramètres de dérivé depuis la query string ; None si l'original est demandé tel quel."""
+    w = args.get("w", type=int)
+    grid = args.get("grid", type=int)
+    tile = args.get("tile", type=int)
+    fmt = (args.get("fmt") or "").lower()
+    if not (w or grid or fmt):
+        return None
+    if fmt in ("", "auto"):
+        fmt = "webp" if "image/webp" in (accept or "") else "jpeg"
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in FORMATS:
+        raise MediaError(f"format inconnu: {fmt}")
+    if grid:
+        if not 2 <= grid <= MAX_GRID or tile is None or not 0 <= tile < grid * grid:
+            raise MediaError("tuile invalide")
+        w = snap_width(w or 160, TILE_WIDTHS)
+    else:
+        grid, tile = 0, 0
+        w = snap_width(w) if w else 0
+    quality = max(30, min(args.get("q", 80, type=int), 95))
+    return {"w": w, "fmt": fmt, "grid": grid, "tile": tile, "q": quality}
+
+
+def cache_key(url: str, params: dict) -> str:
+    raw = f"{url}|{params['w']}|{params['fmt']}|{params['grid']}|{params['tile']}|{params['q']}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def cache_path(key: str, fmt: str) -> str:
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.{fmt}")
+
+
+def _encode(im, fmt: str, q: int) -> bytes:
+    out = BytesIO()
+    if fmt == "webp":
+        im.save(out, "WEBP", quality=q, method=4)
+    elif fmt == "jpeg":
+        im.convert("RGB").save(out, "JPEG", quality=q, optimize=True, progressive=True)
+    else:
+        im.save(out, "PNG", optimize=True)
+    return out.getvalue()
+
+
+def _open(data: bytes, target: int):
+    """Ouvre l'image source après contrôle de sa taille annoncée ; JPEG décodé directement réduit."""
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_SOURCE_PIXELS
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            im = Image.open(BytesIO(data))
+    except Image.DecompressionBombError as e:
+        raise MediaError(str(e))
+    if im.width * im.height > MAX_SOURCE_PIXELS:
+        raise MediaError(f"image source trop grande ({im.width}x{im.height})")
+    if target:
+        im.draft("RGB", (target, target))
+    return ImageOps.exif_transpose(im)
+
+
+def render(data: bytes, w: int, fmt: str, q: int) -> bytes:
+    """Exécuté dans un processus du pool : décode, redimensionne, réencode."""
+    from PIL import Image
+
+    im = _open(data, w)
+    if w and im.width > w:
+        im = im.resize((w, max(1, round(im.height * w / im.width))), Image.LANCZOS)
+    return _encode(im, fmt, q)
+
+
+def render_tiles(data: bytes, w: int, fmt: str, grid: int, q: int) -> list:
+    """Toutes les tuiles d'une grille en un seul décodage.
+
+    Même rendu que le puzzle côté client : image étirée en carré puis découpée.
+    """
+    from PIL import Image
+
+    im = _open(data, w * grid).convert("RGB")
+    im = im.resize((w * grid, w * grid), Image.LANCZOS)
+    tiles = []
+    for index in range(grid * grid):
+        row, col = divmod(index, grid)
+        tiles.append(_encode(im.crop((col * w, row * w, (col + 1) * w, (row + 1) * w)), fmt, q))
+    return tiles
+
+
+def read_capped(chunks, limit: int = MAX_SOURCE_BYTES) -> bytes:
+    """Assemble un corps reçu par morceaux ; s'arrête dès que `limit` est dépassé."""
+    parts, size = [], 0
+    for chunk in chunks:
+        size += len(chunk)
+        if size > limit:
+            raise MediaError("média source trop volumineux")
+        parts.append(chunk)
+    return b"".join(parts)
+
+
+def _touch(path: str):
+    """Date d'usage = date de modification (l'élagage retire les moins récemment servis)."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune_cache(max_bytes: int, max_age: float, directory: str = None) -> int:
+    """Supprime les fichiers non servis depuis `max_age` s puis les plus anciens au-delà de `max_bytes`.
+
+    Le type MIME d'un original (`.type`) part avec lui. Retourne le nombre
+    de fichiers supprimés.
+    """
+    directory = directory or CACHE_DIR
+    now = time.time()
+    entries = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith((".type", ".tmp")):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        if now - mtime < max_age and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            if path.endswith(".src"):
+                os.remove(path[:-4] + ".type")
+        except OSError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class SourceCache:
+    """Originaux amont (images, sons) en cache disque avec leur type MIME.
+
+    `fetch(url)` retourne `(octets, content_type)`. Sert les proxys sans
+    aller-retour amont une fois le média préchargé.
+    """
+
+    def __init__(self, fetch):
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(f"src|{url}".encode()).hexdigest()
+        return cache_path(key, "src"), cache_path(key, "type")
+
+    def lookup(self, url: str):
+        """(chemin, content_type) si l'original est déjà sur disque, sinon None."""
+        path, type_path = self._paths(url)
+        if not os.path.exists(path):
+            return None
+        _touch(path)
+        try:
+            with open(type_path) as f:
+                content_type = f.read().strip()
+        except OSError:
+            content_type = "application/octet-stream"
+        self.hits += 1
+        return path, content_type
+
+    def load(self, url: str):
+        """Comme `lookup`, en téléchargeant l'original s'il est absent (une seule fois par URL)."""
+        hit = self.lookup(url)
+        if hit:
+            return hit
+        with self._lock:
+            waiter = self._inflight.get(url)
+            owner = waiter is None
+            if owner:
+                waiter = self._inflight[url] = threading.Event()
+        if not owner:
+            waiter.wait(timeout=remaining(30))
+            return self.lookup(url)
+        try:
+            self.misses += 1
+            data, content_type = self._fetch(url)    # corps déjà borné à MAX_SOURCE_BYTES
+            path, type_path = self._paths(url)
+            _write(type_path, (content_type or "application/octet-stream").encode())
+            _write(path, data)
+            return path, content_type
+        finally:
+            with self._lock:
+                self._inflight.pop(url, None)
+            waiter.set()
+
+    def read(self, url: str) -> bytes:
+        path, _ = self.load(url)
+        with open(path, "rb") as f:
+            return f.read()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class DerivativePipeline:
+    """Pool de processus borné + cache disque indexé par (url, paramètres).
+
+    Au plus `max_pending` rendus en vol ; au-delà, `derivative()` retourne
+    None et l'appelant sert l'original. Les demandes identiques simultanées
+    partagent le même rendu. Le répertoire de cache est élagué en tâche de
+    fond (âge d'inutilisation et taille totale bornés).
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 16, max_cache_bytes: int = 1024 ** 3, max_cache_age: float = 7 * 86400):
+        self.workers = workers
+        self.max_cache_bytes = max_cache_bytes
+        self.max_cache_age = max_cache_age
+        self.pruned = 0
+        self._started = False
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.abandoned = 0
+
+    @property
+    def available(self) -> bool:
+        return HAS_PIL
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def cached(self, url: str, params: dict):
+        path = cache_path(cache_key(url, params), params["fmt"])
+        return path if os.path.exists(path) else None
+
+    def derivative(self, url: str, params: dict, fetch):
+        """Chemin du fichier dérivé (calculé si besoin) ; `fetch(url)` retourne les octets source.
+
+        Pour une tuile, toute la grille est rendue et mise en cache d'un coup.
+        """
+        path = cache_path(cache_key(url, params), params["fmt"])
+        if os.path.exists(path):
+            self.hits += 1
+            _touch(path)
+            return path
+
+        job = cache_key(url, dict(params, tile=-1)) if params["grid"] else cache_key(url, params)
+        with self._lock:
+            waiter = self._inflight.get(job)
+            owner = waiter is None
+            if owner:
+                waiter = self._inflight[job] = threading.Event()
+        if not owner:
+            waiter.wait(timeout=remaining(30))
+            return path if os.path.exists(path) else None
+
+        try:
+            if not self._slots.acquire(blocking=False):
+                self.rejected += 1
+                return None
+            release = True
+            try:
+                self.misses += 1
+                data = fetch(url)
+                if len(data) > MAX_SOURCE_BYTES:
+                    raise MediaError("image source trop volumineuse")
+                if params["grid"]:
+                    future = self._executor().submit(render_tiles, data, params["w"], params["fmt"], params["grid"], params["q"])
+                else:
+                    future = self._executor().submit(render, data, params["w"], params["fmt"], params["q"])
+                try:
+                    result = future.result(timeout=remaining(30))
+                except Exception:
+                    if not future.cancel() and not future.done():
+                        # Le rendu continue dans son processus : le créneau reste pris jusqu'à la fin
+                        release = False
+                        self.abandoned += 1
+                        future.add_done_callback(lambda _: self._slots.release())
+                    raise
+            finally:
+                if release:
+                    self._slots.release()
+            if params["grid"]:
+                for index, encoded_tile in enumerate(result):
+                    _write(cache_path(cache_key(url, dict(params, tile=index)), params["fmt"]), encoded_tile)
+            else:
+                _write(path, result)
+            return path
+        finally:
+            with self._lock:
+                self._inflight.pop(job, None)
+            waiter.set()
+
+    def prune(self) -> int:
+        removed = prune_cache(self.max_cache_bytes, self.max_cache_age)
+        self.pruned += removed
+        return removed
+
+    def start(self, socketio, interval: float = 600.0):
+        """Élagage périodique du cache disque en tâche de fond (une seule fois)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        def loop():
+            while True:
+                socketio.sleep(interval)
+                try:
+                    self.prune()
+                except Exception as e:
+                    print(f"❌ Error pruning media cache: {e}")
+
+        socketio.start_background_task(loop)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "rejected": self.rejected, "abandoned": self.abandoned, "pruned": self.pruned, "available": self.available}
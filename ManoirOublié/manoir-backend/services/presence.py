@@ -0,0 +1,172 @@
+# services/presence.py
+# Index de présence en mémoire : sid <-> joueur <-> partie
+import threading, time
+from datetime import datetime, timezone
+
+from services.db import execute, bid
+
+
+class SocketSession:
+    __slots__ = ("sid", "gid", "pid", "name", "fmt")
+
+    def __init__(self, sid: str, gid: str, pid: str, name: str, fmt: str):
+        self.sid = sid
+        self.gid = gid
+        self.pid = pid
+        self.name = name
+        self.fmt = fmt
+
+
+class PresenceIndex:
+    """Qui est connecté, sans requête base.
+
+    Une déconnexion n'est prise en compte qu'après `grace` secondes sans
+    nouvelle connexion du même joueur (reconnexions mobiles). Les changements
+    d'état en ligne sont écrits en base par lots toutes les `flush_interval`
+    secondes.
+    """
+
+    def __init__(self, grace: float = 5.0, flush_interval: float = 5.0):
+        self.grace = grace
+        self.flush_interval = flush_interval
+        self._sessions = {}          # sid -> SocketSession
+        self._player_sids = {}       # pid -> set(sid)
+        self._online = {}            # gid -> set(pid)
+        self._pending_offline = {}   # pid -> (échéance, SocketSession)
+        self._dirty = {}             # pid -> (en ligne ?, horodatage)
+        self._lock = threading.Lock()
+        self._started = False
+
+    # ---------- Mises à jour ----------
+    def join(self, sid: str, gid: str, pid: str, name: str, fmt: str) -> bool:
+        """Enregistre un sid ; retourne True si le joueur vient de passer en ligne."""
+        sess = SocketSession(sid, gid, pid, name, fmt)
+        with self._lock:
+            old = self._sessions.get(sid)
+            if old is not None and old.pid != pid:
+                self._detach(old)
+            self._sessions[sid] = sess
+            self._player_sids.setdefault(pid, set()).add(sid)
+            pending = self._pending_offline.pop(pid, None)
+            if pending is not None:
+                if pending[1].gid == gid:
+                    return False
+                self._discard_online(pending[1].gid, pid)    # revenu dans une autre partie
+            online = self._online.setdefault(gid, set())
+            if pid in online:
+                return False
+            online.add(pid)
+            self._dirty[pid] = (True, _now())
+            return True
+
+    def leave(self, sid: str):
+        """Retire un sid ; le passage hors ligne est différé de `grace` secondes."""
+        with self._lock:
+            sess = self._sessions.get(sid)
+            if sess is None:
+                return None
+            self._detach(sess)
+            return sess
+
+    def _detach(self, sess: SocketSession):
+        self._sessions.pop(sess.sid, None)
+        sids = self._player_sids.get(sess.pid)
+        if sids is not None:
+            sids.discard(sess.sid)
+            if not sids:
+                del self._player_sids[sess.pid]
+                self._pending_offline[sess.pid] = (time.monotonic() + self.grace, sess)
+
+    def expire(self, now: float = None):
+        """Passe hors ligne les joueurs dont le délai de grâce est écoulé."""
+        now = time.monotonic() if now is None else now
+        gone = []
+        with self._lock:
+            for pid, (deadline, sess) in list(self._pending_offline.items()):
+                if deadline > now:
+                    continue
+                del self._pending_offline[pid]
+                self._discard_online(sess.gid, pid)
+                self._dirty[pid] = (False, _now())
+                gone.append(sess)
+        return gone
+
+    def _discard_online(self, gid: str, pid: str):
+        online = self._online.get(gid)
+        if online is not None:
+            online.discard(pid)
+            if not online:
+                del self._online[gid]
+
+    # ---------- Lectures O(1) ----------
+    def session(self, sid: str):
+        return self._sessions.get(sid)
+
+    def online_count(self, gid: str) -> int:
+        return len(self._online.get(gid, ()))
+
+    def is_online(self, gid: str, pid: str) -> bool:
+        return pid in self._online.get(gid, ())
+
+    def online_players(self, gid: str):
+        return list(self._online.get(gid, ()))
+
+    def sids(self, pid: str):
+        return list(self._player_sids.get(pid, ()))
+
+    # ---------- Persistance par lots ----------
+    def flush(self, chunk: int = 500) -> int:
+        """Un UPDATE ... WHERE id IN (...) par état (en ligne / hors ligne) et par tranche de `chunk` joueurs.
+
+        `last_seen` prend le dernier horodatage de la tranche (précision : `flush_interval`).
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+        written = 0
+        for state in (True, False):
+            pids = [pid for pid, (online, _) in dirty.items() if online is state]
+            for i in range(0, len(pids), chunk):
+                part = pids[i:i + chunk]
+                seen = max(dirty[pid][1] for pid in part)
+                placeholders = ",".join(["%s"] * len(part))
+                try:
+                    execute(
+                        f"UPDATE players SET is_online=%s, last_seen=%s WHERE id IN ({placeholders})",
+                        (1 if state else 0, seen, *(bid(pid) for pid in part)),
+                    )
+                except Exception as e:
+                    print(f"❌ Error flushing presence: {e}")
+                    with self._lock:
+                        for pid in part:
+                            self._dirty.setdefault(pid, dirty[pid])
+                    continue
+                written += len(part)
+        return written
+
+    def start(self, socketio, on_offline, tick: float = 1.0):
+        """Lance la tâche de fond (expiration + écriture par lots)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        def loop():
+            last_flush = time.monotonic()
+            while True:
+                socketio.sleep(tick)
+                for sess in self.expire():
+                    try:
+                        on_offline(sess)
+                    except Exception as e:
+                        print(f"❌ Error in presence callback: {e}")
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    self.flush()
+                    last_flush = time.monotonic()
+
+        socketio.start_background_task(loop)
+
+
+def _now():
+    return datetime.now(timezone.utc)
@@ -0,0 +1,171 @@
+# services/profiling.py
+# Temps par route / événement socket et profileur par échantillonnage activable à la demande
+import os, sys, threading, time
+from bisect import bisect_left
+from collections import Counter
+from functools import wraps
+
+# Bornes des paliers d'histogramme (ms) ; le dernier palier est ouvert
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Feuilles de pile considérées comme « thread en attente » (exclues par défaut des profils)
+IDLE_LEAVES = {"wait", "sleep", "select", "poll", "epoll", "accept", "recv", "recv_into", "readinto", "_wait_for_tstate_lock", "get"}
+
+
+class RouteStats:
+    __slots__ = ("count", "errors", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, ms: float, error: bool):
+        self.count += 1
+        self.errors += error
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+        self.buckets[bisect_left(BUCKETS_MS, ms)] += 1
+
+    def percentile(self, q: float) -> float:
+        """Borne haute du palier contenant le quantile q (approximation par histogramme)."""
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def to_api(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avgMs": round(self.total / self.count, 3) if self.count else 0,
+            "maxMs": round(self.max, 3),
+            "p50Ms": self.percentile(0.5),
+            "p95Ms": self.percentile(0.95),
+            "p99Ms": self.percentile(0.99),
+        }
+
+
+class Timings:
+    """Compteurs de durée par clé (`GET /api/games/<gid>`, `socket:room:join`...)."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float, error: bool = False):
+        ms = seconds * 1000
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = RouteStats()
+            stats.add(ms, error)
+
+    def snapshot(self, reset: bool = False) -> dict:
+        with self._lock:
+            out = {key: s.to_api() for key, s in sorted(self._stats.items(), key=lambda kv: -kv[1].total)}
+            if reset:
+                self._stats = {}
+        return out
+
+    def install(self, app):
+        """Middleware Flask : une mesure par requête, indexée par la règle de route."""
+        from flask import g, request
+
+        @app.before_request
+        def _timing_start():
+            if self.enabled:
+                g._timing_t0 = time.perf_counter()
+
+        @app.teardown_request
+        def _timing_stop(exc):
+            t0 = g.pop("_timing_t0", None)
+            if t0 is None:
+                return
+            rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            self.record(f"{request.method} {rule}", time.perf_counter() - t0, exc is not None)
+
+    def timed(self, event: str):
+        """Décorateur de handler Socket.IO (clé `socket:<event>`)."""
+        key = f"socket:{event}"
+
+        def deco(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                t0 = time.perf_counter()
+                error = True
+                try:
+                    result = fn(*args, **kwargs)
+                    error = False
+                    return result
+                finally:
+                    self.record(key, time.perf_counter() - t0, error)
+            return wrapper
+        return deco
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Échantillonne les piles de tous les threads à `hz` pendant `seconds`.
+
+    Aucun thread ni hook quand il ne tourne pas : le coût hors profil est nul.
+    Un seul profil à la fois ; le résultat est au format « collapsed stacks »
+    (une ligne `frame;frame;frame N` par pile, entrée de flamegraph.pl /
+    speedscope).
+    """
+
+    def __init__(self, max_seconds: float = 60, max_hz: int = 1000):
+        self.max_seconds = max_seconds
+        self.max_hz = max_hz
+        self._lock = threading.Lock()
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def profile(self, seconds: float, hz: int = 100, include_idle: bool = False):
+        """Bloque pendant la capture ; retourne (Counter de piles, nombre d'échantillons) ou None si occupé."""
+        seconds = max(0.1, min(float(seconds), self.max_seconds))
+        interval = 1.0 / max(1, min(int(hz), self.max_hz))
+        with self._lock:
+            if self._running:
+                return None
+            self._running = True
+        stacks = Counter()
+        samples = 0
+        me = threading.get_ident()
+        try:
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    if not include_idle and frame.f_code.co_name in IDLE_LEAVES:
+                        continue
+                    names = []
+                    while frame is not None:
+                        names.append(_frame_name(frame.f_code))
+                        frame = frame.f_back
+                    stacks[";".join(reversed(names))] += 1
+                samples += 1
+                time.sleep(interval)
+        finally:
+            self._running = False
+        return stacks, samples
+
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
@@ -0,0 +1,165 @@
+# services/repository.py
+import os, threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from models import Game, Player, RuntimeState, EnigmeProgress
+from services.db import query_one, query_all, bid
+
+GAME_COLUMNS = "id, code, status, created_at, started_at, ends_at, current_room_index, hints_left, seed, content"
+PLAYER_COLUMNS = "id, game_id, nickname, role, joined_at, is_connected, score_total"
+
+
+# ---------- Accès base -> modèles ----------
+def load_game(gid: str) -> Optional[Game]:
+    row = query_one(f"SELECT {GAME_COLUMNS} FROM games WHERE id=%s", (bid(gid),), game=gid)
+    if not row:
+        return None
+    game = Game.from_row(row)
+    game.players = load_players(gid)
+    return game
+
+def load_players(gid: str) -> List[Player]:
+    rows = query_all(f"SELECT {PLAYER_COLUMNS} FROM players WHERE game_id=%s", (bid(gid),), game=gid)
+    return [Player.from_row(r) for r in (rows or [])]
+
+def load_runtime_state(gid: str) -> Optional[RuntimeState]:
+    row = query_one("SELECT game_id, room_slug, attempts, solved, puzzle_state FROM runtime_state WHERE game_id=%s", (bid(gid),), game=gid)
+    return RuntimeState.from_row(row) if row else None
+
+def load_progress(pid: str, slug: str) -> Optional[EnigmeProgress]:
+    row = query_one(
+        "SELECT player_id, game_id, slug, attempts, solved, score_obtenu, updated_at FROM player_enigme WHERE player_id=%s AND slug=%s",
+        (bid(pid), slug),
+    )
+    return EnigmeProgress.from_row(row) if row else None
+
+
+# ---------- Registre des parties en mémoire ----------
+class GameRegistry:
+    """Cache LRU borné des parties actives (modèles `Game` avec leurs joueurs).
+
+    Les lignes ne sont converties qu'une fois ; les écritures connues
+    (nouveau joueur, ready, score, statut) sont appliquées directement au
+    modèle en mémoire au lieu de relire la base. `on_change(gid)` est
+    appelé après chacune (invalidation chez les autres workers) ;
+    `on_evict(gid)` quand une partie sort du cache pour faire de la place.
+    """
+
+    def __init__(self, max_games: int = 50000):
+        self.max_games = max_games
+        self.on_change = None
+        self.on_evict = None
+        self._games: "OrderedDict[str, Game]" = OrderedDict()
+        self._codes = {}      # code -> gid des parties en mémoire
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._games)
+
+    def get(self, gid: str) -> Optional[Game]:
+        with self._lock:
+            game = self._games.get(gid)
+            if game is not None:
+                self._games.move_to_end(gid)
+                return game
+        game = load_game(gid)
+        if game is not None:
+            self.put(game)
+        return game
+
+    def put(self, game: Game):
+        evicted = []
+        with self._lock:
+            self._games[game.id] = game
+            self._games.move_to_end(game.id)
+            self._codes[game.code] = game.id
+            while len(self._games) > self.max_games:
+                _, old = self._games.popitem(last=False)
+                self._codes.pop(old.code, None)
+                evicted.append(old.id)
+        if self.on_evict is not None:
+            for gid in evicted:
+                self.on_evict(gid)
+
+    def cached(self, gid: str) -> Optional[Game]:
+        """Retourne la partie seulement si elle est déjà en mémoire (pas d'accès base)."""
+        with self._lock:
+            return self._games.get(gid)
+
+    def invalidate(self, gid: str):
+        with self._lock:
+            game = self._games.pop(gid, None)
+            if game is not None:
+                self._codes.pop(game.code, None)
+
+    def clear(self) -> List[str]:
+        """Oublie toutes les parties ; retourne leurs identifiants."""
+        with self._lock:
+            gids = list(self._games)
+            self._games.clear()
+            self._codes.clear()
+        return gids
+
+    def _changed(self, gid: str):
+        if self.on_change is not None:
+            self.on_change(gid)
+
+    def by_code(self, code: str) -> Optional[Game]:
+        gid = self._codes.get(code)
+        if gid is None:
+            row = query_one("SELECT id FROM games WHERE code=%s LIMIT 1", (code,))
+            if not row:
+                # Repli sur le primaire : partie créée à l'instant, pas encore répliquée
+                row = query_one("SELECT id FROM games WHERE code=%s LIMIT 1", (code,), primary=True)
+            if not row:
+                return None
+            gid = row["id"]
+        return self.get(gid)
+
+    def players(self, gid: str) -> List[Player]:
+        game = self.get(gid)
+        if game is None:
+            return load_players(gid)
+        return game.players
+
+    def find_player(self, gid: str, pid: str) -> Optional[Player]:
+        game = self.get(gid)
+        return game.player(pid) if game is not None else None
+
+    def add_player(self, gid: str, player: Player):
+        game = self.cached(gid)
+        if game is not None and game.player(player.id) is None:
+            game.players.append(player)
+        self._changed(gid)
+
+    def set_ready(self, gid: str, pid: str, ready: bool):
+        game = self.cached(gid)
+        p = game.player(pid) if game is not None else None
+        if p is not None:
+            p.is_connected = bool(ready)
+        self._changed(gid)
+
+    def add_score(self, gid: str, pid: str, points: int):
+        game = self.cached(gid)
+        p = game.player(pid) if game is not None else None
+        if p is not None:
+            p.score_total += points
+        self._changed(gid)
+
+    def set_status(self, gid: str, status: str, started_at=None, ends_at=None):
+        game = self.cached(gid)
+        if game is not None:
+            game.status = status
+            game.started_at = started_at
+            game.ends_at = ends_at
+        self._changed(gid)
+
+    def set_content(self, gid: str, content: dict):
+        game = self.cached(gid)
+        if game is not None:
+            game.content = content
+        self._changed(gid)
+
+
+games = GameRegistry(max_games=int(os.getenv("GAME_REGISTRY_MAX", 50000)))
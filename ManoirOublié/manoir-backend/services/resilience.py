@@ -0,0 +1,198 @@
+# services/resilience.py
+# Budget de temps par requête et disjoncteurs par dépendance (base, hôtes médias amont)
+import contextvars, os, threading, time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+
+class DeadlineExceeded(Exception):
+    """Le budget de la requête est épuisé : inutile de lancer l'appel suivant."""
+
+
+class CircuitOpen(Exception):
+    """La dépendance est en échec récent : appel refusé sans attendre."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} indisponible")
+        self.name = name
+        self.retry_after = retry_after
+
+
+# ---------- Échéance ----------
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+stats = Counter()
+
+@contextmanager
+def deadline(seconds: float):
+    """Dans ce bloc, `remaining()` décompte `seconds` (un budget plus court déjà posé est gardé)."""
+    end = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(end if current is None else min(current, end))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining(cap: float) -> float:
+    """Temps restant, plafonné à `cap` (le plafond seul hors requête) ; lève DeadlineExceeded à zéro."""
+    end = _deadline.get()
+    if end is None:
+        return cap
+    left = end - time.monotonic()
+    if left <= 0:
+        stats["exceeded"] += 1
+        raise DeadlineExceeded("request deadline exceeded")
+    return min(cap, left)
+
+def http_timeout(connect: float, read: float):
+    """(connexion, lecture) pour requests, bornés par le budget restant."""
+    return (remaining(connect), remaining(read))
+
+def install(app, default_seconds: float, max_seconds: float):
+    """Budget par requête HTTP : `default_seconds`, ou `X-Request-Timeout-Ms` du client (plafonné)."""
+    from flask import g, request
+
+    @app.before_request
+    def _deadline_start():
+        seconds = default_seconds
+        header = request.headers.get("X-Request-Timeout-Ms")
+        if header:
+            try:
+                seconds = min(max(int(header) / 1000, 0.05), max_seconds)
+            except ValueError:
+                pass
+        g._deadline_token = _deadline.set(time.monotonic() + seconds)
+
+    @app.teardown_request
+    def _deadline_stop(exc):
+        token = g.pop("_deadline_token", None)
+        if token is not None:
+            try:
+                _deadline.reset(token)
+            except ValueError:
+                _deadline.set(None)    # contexte différent (réponse en flux terminée ailleurs)
+
+
+# ---------- Disjoncteurs ----------
+class CircuitBreaker:
+    """Fermé -> ouvert après `threshold` échecs consécutifs -> semi-ouvert après `reset_after` s.
+
+    Ouvert, `allow()` refuse tout de suite. Semi-ouvert, un seul appel
+    d'essai passe : un succès referme, un échec rouvre pour une nouvelle
+    période.
+    """
+
+    def __init__(self, name: str, threshold: int = 5, reset_after: float = 10.0):
+        self.name = name
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = None
+        self.counts = Counter()
+        self._probe = False
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_after - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_after:
+                self.state = "half_open"
+                self._probe = False
+            if self.state == "half_open" and not self._probe:
+                self._probe = True
+                return True
+            self.counts["rejected"] += 1
+            return False
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpen(self.name, self.retry_after())
+
+    def success(self):
+        with self._lock:
+            self.counts["success"] += 1
+            self.failures = 0
+            if self.state != "closed":
+                print(f"✅ {self.name} rétabli")
+                self.state = "closed"
+
+    def failure(self, exc):
+        with self._lock:
+            self.counts["failure"] += 1
+            self.failures += 1
+            self.last_error = str(exc)
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+                if self.state == "closed":
+                    print(f"❌ {self.name} ouvert après {self.failures} échecs: {exc}")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.counts["opened"] += 1
+
+    @contextmanager
+    def guard(self, is_failure=lambda e: True):
+        """Compte l'appel du bloc ; seules les exceptions retenues par `is_failure` comptent comme échec."""
+        self.check()
+        try:
+            yield
+        except Exception as e:
+            if isinstance(e, (CircuitOpen, DeadlineExceeded)) or not is_failure(e):
+                # Appel non tenté ou erreur propre à la requête : l'état ne change pas,
+                # l'essai en semi-ouvert est rendu au suivant
+                with self._lock:
+                    self._probe = False
+            else:
+                self.failure(e)
+            raise
+        self.success()
+
+    def to_api(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retryAfter": round(self.retry_after(), 1) if self.state != "closed" else None,
+            "lastError": self.last_error,
+            **dict(self.counts),
+        }
+
+
+class BreakerRegistry:
+    """Un disjoncteur par dépendance (`db:primary`, `media:<hôte>`...), créé au premier usage.
+
+    Au-delà de `max_breakers` (hôtes amont arbitraires), les moins
+    récemment utilisés sont oubliés, quel que soit leur état.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 10.0, max_breakers: int = 256):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.max_breakers = max_breakers
+        self._breakers: "OrderedDict[str, CircuitBreaker]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is not None:
+                self._breakers.move_to_end(name)
+                return breaker
+            breaker = self._breakers[name] = CircuitBreaker(name, self.threshold, self.reset_after)
+            while len(self._breakers) > self.max_breakers:
+                self._breakers.popitem(last=False)
+            return breaker
+
+    def stats(self) -> dict:
+        with self._lock:
+            items = sorted(self._breakers.items())
+        return {name: b.to_api() for name, b in items}
+
+
+breakers = BreakerRegistry(
+    threshold=int(os.getenv("BREAKER_THRESHOLD", 5)),
+    reset_after=float(os.getenv("BREAKER_RESET_SECONDS", 10)),
+)
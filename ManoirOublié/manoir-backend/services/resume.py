@@ -0,0 +1,146 @@
+# services/resume.py
+# Reprise de session socket : tampon d'événements numérotés par room, rejoué à la reconnexion
+import os, threading
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+
+from services.serialization import encode_once
+
+# Diffusés mais pas rejoués : seule la dernière valeur par joueur sert (instantané)
+TRANSIENT_EVENTS = {"player:position:update"}
+# Dernière valeur par joueur gardée pour l'instantané d'un client trop en retard
+LATEST_EVENTS = {"player:position:update", "game:state:update", "puzzle:state"}
+# Champ d'enveloppe ajouté aux payloads numérotés : {"epoch", "seq"} (le payload métier reste intact)
+RESUME_FIELD = "_resume"
+
+
+class RoomLog:
+    __slots__ = ("epoch", "seq", "frames", "latest", "completed", "emit_lock")
+
+    def __init__(self, size: int):
+        self.epoch = os.urandom(4).hex()   # change si le tampon est recréé (redémarrage, éviction)
+        self.seq = 0
+        self.frames = deque(maxlen=size)   # (seq, event, PreEncoded, pid exclu)
+        self.latest = {}                   # (event, pid) -> PreEncoded
+        self.completed = None              # énigmes résolues (None : inconnu, requête au prochain join)
+        self.emit_lock = threading.RLock()  # numérotation + envoi dans le même ordre
+
+
+class ResumeBuffer:
+    """Événements sortants numérotés par room, pour reprendre une session sans requête base.
+
+    Chaque diffusion reçoit un `seq` croissant (dans le champ d'enveloppe
+    `RESUME_FIELD`, avec l'epoch du tampon) et est
+    gardée dans un tampon borné de `size` trames. Un client qui se
+    reconnecte présente (epoch, dernier seq) : il reçoit les trames
+    manquées, ou un instantané compact (énigmes résolues, dernier état de
+    chaque joueur) s'il est trop en retard. Si la room n'est plus en
+    mémoire (redémarrage, éviction LRU au-delà de `max_rooms`), l'appelant
+    repasse par un `room:join` complet.
+
+    Le client garde le plus grand seq reçu : l'appelant numérote et émet
+    dans `emitting(gid)`, qui fixe le journal de la room pour toute
+    l'émission, pour que les trames partent dans l'ordre de leur seq et
+    que deux émissions ne mélangent pas deux epochs.
+    """
+
+    def __init__(self, size: int = 200, max_rooms: int = 10000):
+        self.size = size
+        self.max_rooms = max_rooms
+        self.stats_counter = Counter()
+        self._rooms: "OrderedDict[str, RoomLog]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _room(self, gid: str) -> RoomLog:
+        log = self._rooms.get(gid)
+        if log is None:
+            log = self._rooms[gid] = RoomLog(self.size)
+            while len(self._rooms) > self.max_rooms:
+                self._rooms.popitem(last=False)
+        else:
+            self._rooms.move_to_end(gid)
+        return log
+
+    @contextmanager
+    def emitting(self, gid: str):
+        """Journal de la room, verrouillé de `record` jusqu'à l'envoi.
+
+        Le même `RoomLog` sert à toute l'émission : s'il est évincé ou
+        recréé entre-temps, la trame reste numérotée dans son epoch.
+        """
+        with self._lock:
+            log = self._room(gid)
+        with log.emit_lock:
+            yield log
+
+    def record(self, log: RoomLog, event: str, payload, exclude: str = None):
+        """Numérote et garde une diffusion dans `log` (obtenu par `emitting`).
+
+        Retourne (enveloppe `{epoch, seq}` ou None, payload encodé avec l'enveloppe).
+        """
+        obj = payload.obj if hasattr(payload, "obj") else payload
+        with self._lock:
+            if event in TRANSIENT_EVENTS:
+                pre = encode_once(payload)
+                log.latest[(event, exclude)] = pre
+                return None, pre
+            log.seq += 1
+            stamp = {"epoch": log.epoch, "seq": log.seq}
+            pre = encode_once({**obj, RESUME_FIELD: stamp}) if isinstance(obj, dict) else encode_once(payload)
+            log.frames.append((log.seq, event, pre, exclude))
+            if event in LATEST_EVENTS:
+                log.latest[(event, exclude)] = pre
+            if isinstance(obj, dict):
+                completed = obj.get("globalCompletedEnigmes") or (obj.get("completedEnigmes") if event == "game:completed" else None)
+                if completed is not None:
+                    log.completed = list(completed)
+            return stamp, pre
+
+    def prime(self, gid: str, completed):
+        """Renseigne l'état connu après un `room:join` (qui a déjà interrogé la base)."""
+        with self._lock:
+            log = self._room(gid)
+            log.completed = list(completed)
+            return log.epoch, log.seq
+
+    def position(self, gid: str):
+        """(epoch, seq) courant de la room, ou (None, 0) si elle n'est pas en mémoire."""
+        with self._lock:
+            log = self._rooms.get(gid)
+            return (log.epoch, log.seq) if log is not None else (None, 0)
+
+    def resume(self, gid: str, epoch: str, last_seq: int, pid: str = None):
+        """Ce qu'il faut envoyer à un client qui revient.
+
+        Retourne None si la room est inconnue ou sans état (join complet
+        nécessaire), sinon un dict `{epoch, seq, frames, snapshot}` où
+        `snapshot` est None quand les trames manquées suffisent.
+        """
+        with self._lock:
+            log = self._rooms.get(gid)
+            if log is None or log.completed is None:
+                self.stats_counter["full"] += 1
+                return None
+            oldest = log.frames[0][0] if log.frames else log.seq + 1
+            if epoch == log.epoch and 0 <= last_seq <= log.seq and last_seq + 1 >= oldest:
+                frames = [(event, pre) for seq, event, pre, exclude in log.frames if seq > last_seq and exclude != pid]
+                self.stats_counter["replay"] += 1
+                self.stats_counter["replayed_frames"] += len(frames)
+                return {"epoch": log.epoch, "seq": log.seq, "frames": frames, "snapshot": None}
+            self.stats_counter["snapshot"] += 1
+            return {
+                "epoch": log.epoch,
+                "seq": log.seq,
+                "frames": [(event, pre) for (event, sender), pre in log.latest.items() if sender != pid],
+                "snapshot": {
+                    "completedEnigmes": list(log.completed),
+                    "gamePhase": "completed" if len(log.completed) >= 5 else "playing",
+                },
+            }
+
+    def forget(self, gid: str):
+        with self._lock:
+            self._rooms.pop(gid, None)
+
+    def stats(self) -> dict:
+        return {"rooms": len(self._rooms), **dict(self.stats_counter)}
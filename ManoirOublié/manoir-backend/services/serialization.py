@@ -0,0 +1,113 @@
+# services/serialization.py
+import json, os, types
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # repli sur la bibliothèque standard
+    orjson = None
+
+if os.getenv("JSON_BACKEND", "auto") == "stdlib":
+    orjson = None
+
+BACKEND = "orjson" if orjson else "stdlib"
+
+
+class PreEncoded:
+    """Payload déjà sérialisé en JSON, réutilisé tel quel à chaque envoi.
+
+    Utile quand le même objet est diffusé à toute une room (ou à plusieurs
+    rooms) : l'encodage n'est fait qu'une fois, l'envoi se contente de
+    recopier la chaîne.
+    """
+    __slots__ = ("json", "obj")
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.json = dumps(obj)
+
+    def __repr__(self):
+        return f"PreEncoded({self.json[:60]!r})"
+
+
+def encode_once(obj) -> PreEncoded:
+    return obj if isinstance(obj, PreEncoded) else PreEncoded(obj)
+
+
+def _default(o):
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, Decimal):
+        return int(o) if o == o.to_integral_value() else float(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if isinstance(o, PreEncoded):
+        return o.obj
+    if isinstance(o, (bytes, bytearray)):
+        return o.hex()
+    to_api = getattr(o, "to_api", None)
+    if to_api is not None:
+        return to_api()
+    raise TypeError(f"Type {type(o).__name__} non sérialisable en JSON")
+
+
+if orjson:
+    _OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS
+    _Fragment = getattr(orjson, "Fragment", None)
+
+    def _orjson_default(o):
+        if _Fragment is not None and isinstance(o, PreEncoded):
+            return _Fragment(o.json)
+        return _default(o)
+
+    def _encode(obj) -> str:
+        return orjson.dumps(obj, default=_orjson_default, option=_OPTS).decode()
+
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+else:
+    _encoder = json.JSONEncoder(default=_default, separators=(",", ":"), ensure_ascii=False)
+
+    def _encode(obj) -> str:
+        return _encoder.encode(obj)
+
+    def loads(s, **kwargs):
+        return json.loads(s)
+
+
+def dumps(obj, **kwargs) -> str:
+    """Sérialise en JSON compact. Les `PreEncoded` sont recopiés sans réencodage."""
+    if isinstance(obj, PreEncoded):
+        return obj.json
+    if isinstance(obj, (list, tuple)) and any(isinstance(x, PreEncoded) for x in obj):
+        # Paquet Socket.IO : [event, payload, ...]
+        return "[" + ",".join(dumps(x) for x in obj) + "]"
+    return _encode(obj)
+
+
+def dumps_bytes(obj) -> bytes:
+    if orjson and not isinstance(obj, PreEncoded):
+        return orjson.dumps(obj, default=_orjson_default, option=_OPTS)
+    return dumps(obj).encode()
+
+
+# Module compatible `json` pour SocketIO(json=...)
+socketio_json = types.SimpleNamespace(dumps=dumps, loads=loads)
+
+
+class FastJSONProvider(JSONProvider):
+    """Fournisseur JSON Flask branché sur `dumps`/`loads` ci-dessus."""
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
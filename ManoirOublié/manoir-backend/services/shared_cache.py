@@ -0,0 +1,359 @@
+# services/shared_cache.py
+# Cache partagé entre processus : instantanés immuables mappés en mémoire et canal d'invalidation
+import fcntl, mmap, os, struct, tempfile, threading, time
+from collections import Counter
+from collections.abc import Sequence
+
+from services.serialization import dumps_bytes, loads
+
+MAGIC = b"MNOSNAP1"
+HEADER = struct.Struct("<8sQdI4x")     # magic, version, créé à (epoch), nb de sections
+SECTION = struct.Struct("<24sIQ")      # nom, nb d'éléments, position
+OFFSET = struct.Struct("<I")
+
+CONTROL = struct.Struct("<Q")          # version publiée (fichier .ctl)
+RING_HEADER = struct.Struct("<Q")      # dernier numéro d'invalidation (fichier .inv)
+SLOT = struct.Struct("<QI52s")         # numéro, pid émetteur, clé
+
+
+def default_directory() -> str:
+    """/dev/shm (mémoire, partagé entre conteneurs du même pod) sinon le répertoire temporaire."""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "manoir-cache")
+
+
+class _LockedFile:
+    """Petit fichier de contrôle mappé, verrouillé par flock entre processus."""
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        except Exception:
+            os.close(fd)
+            raise
+        self.fd = fd
+
+    def lock(self, blocking: bool = True) -> bool:
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+
+    def unlock(self):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+# ---------- Instantanés ----------
+class Section(Sequence):
+    """Liste en lecture seule adossée au fichier mappé : un élément n'est décodé qu'à l'accès."""
+
+    __slots__ = ("_map", "_count", "_index", "_data")
+
+    def __init__(self, mapped, count: int, offset: int):
+        self._map = mapped
+        self._count = count
+        self._index = offset
+        self._data = offset + OFFSET.size * (count + 1)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        start = OFFSET.unpack_from(self._map, self._index + OFFSET.size * i)[0]
+        end = OFFSET.unpack_from(self._map, self._index + OFFSET.size * (i + 1))[0]
+        return loads(self._map[self._data + start:self._data + end])
+
+
+class SnapshotView:
+    """Une version d'un instantané ; reste valide tant qu'on la référence, même après un remplacement."""
+
+    def __init__(self, mapped):
+        magic, self.version, self.created_at, count = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC:
+            raise ValueError("not a snapshot file")
+        self.size = len(mapped)
+        self.sections = {}
+        for i in range(count):
+            name, n, offset = SECTION.unpack_from(mapped, HEADER.size + SECTION.size * i)
+            self.sections[name.rstrip(b"\0").decode()] = Section(mapped, n, offset)
+
+    def get(self, name: str, default=()):
+        return self.sections.get(name, default)
+
+    def __getitem__(self, name: str) -> Section:
+        return self.sections[name]
+
+
+def encode_snapshot(version: int, sections: dict) -> bytes:
+    """Format : en-tête, répertoire des sections, puis par section table de positions + éléments JSON."""
+    directory, bodies = [], []
+    position = HEADER.size + SECTION.size * len(sections)
+    for name, items in sections.items():
+        blobs = [dumps_bytes(item) for item in items]
+        offsets, total = [0], 0
+        for blob in blobs:
+            total += len(blob)
+            offsets.append(total)
+        body = struct.pack(f"<{len(offsets)}I", *offsets) + b"".join(blobs)
+        directory.append(SECTION.pack(name.encode()[:24], len(blobs), position))
+        bodies.append(body)
+        position += len(body)
+    return HEADER.pack(MAGIC, version, time.time(), len(sections)) + b"".join(directory) + b"".join(bodies)
+
+
+class SharedSnapshot:
+    """Données de référence publiées une fois, mappées sans copie par chaque worker.
+
+    Le fichier `<nom>.snap` est immuable : une mise à jour écrit une
+    nouvelle version à côté puis la substitue par `os.replace` (atomique).
+    Les workers comparent leur version à celle du fichier `<nom>.ctl`
+    (simple lecture mémoire) et remappent au besoin ; une ancienne version
+    reste lisible tant qu'une vue la référence. Les pages sont celles du
+    cache du noyau, communes à tous les processus : la mémoire par worker
+    ne grandit pas avec leur nombre.
+    """
+
+    def __init__(self, name: str, directory: str):
+        self.name = name
+        self.directory = directory
+        self.path = os.path.join(directory, f"{name}.snap")
+        self.stats_counter = Counter()
+        self._control = None
+        self._view = None
+        self._lock = threading.Lock()
+
+    def _ctl(self) -> _LockedFile:
+        if self._control is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._control = _LockedFile(os.path.join(self.directory, f"{self.name}.ctl"), CONTROL.size)
+        return self._control
+
+    def _map(self):
+        with open(self.path, "rb") as f:
+            view = SnapshotView(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        self.stats_counter["maps"] += 1
+        return view
+
+    def current(self):
+        """Vue de la dernière version publiée (None si rien n'a encore été publié)."""
+        published = CONTROL.unpack_from(self._ctl().map, 0)[0]
+        view = self._view
+        if published == 0 or (view is not None and view.version == published):
+            return view
+        with self._lock:
+            if self._view is None or self._view.version != published:
+                try:
+                    self._view = self._map()
+                except FileNotFoundError:
+                    return self._view
+            return self._view
+
+    def publish(self, sections: dict) -> SnapshotView:
+        """Écrit une nouvelle version (à appeler sous le verrou du fichier de contrôle)."""
+        ctl = self._ctl()
+        version = CONTROL.unpack_from(ctl.map, 0)[0] + 1
+        data = encode_snapshot(version, sections)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+        CONTROL.pack_into(ctl.map, 0, version)
+        self.stats_counter["published"] += 1
+        return self.current()
+
+    def refresh(self, loader, ttl: float):
+        """Vue à jour d'au plus `ttl` secondes ; un seul worker à la fois appelle `loader()`.
+
+        Si un autre worker recharge déjà, on garde la version courante
+        (ou on l'attend s'il n'y en a aucune). Retourne None si le
+        répertoire partagé est inutilisable : l'appelant charge alors
+        localement.
+        """
+        try:
+            view = self.current()
+            if view is not None and time.time() - view.created_at < ttl:
+                return view
+            ctl = self._ctl()
+            if not ctl.lock(blocking=view is None):
+                self.stats_counter["stale_served"] += 1
+                return view
+            try:
+                view = self.current()
+                if view is not None and time.time() - view.created_at < ttl:
+                    return view    # publié par un autre worker pendant l'attente
+                return self.publish(loader())
+            finally:
+                ctl.unlock()
+        except OSError as e:
+            print(f"❌ Shared snapshot {self.name}: {e}")
+            self.stats_counter["errors"] += 1
+            return None
+
+    def stats(self) -> dict:
+        view = self._view
+        return {
+            "version": view.version if view else None,
+            "ageSeconds": round(time.time() - view.created_at, 1) if view else None,
+            "bytes": view.size if view else 0,
+            **dict(self.stats_counter),
+        }
+
+
+# ---------- Invalidation ----------
+class InvalidationChannel:
+    """Anneau de clés invalidées dans un fichier mappé, lu périodiquement par chaque worker.
+
+    `publish(key)` met la clé en attente ; la tâche de fond écrit les clés
+    distinctes en attente sous un seul verrou à chaque passage (une partie
+    modifiée dix fois entre deux passages n'occupe qu'une entrée), puis
+    relit les entrées plus récentes que sa dernière lecture en ignorant
+    les siennes. Si l'anneau a fait le tour entre deux lectures, le
+    gestionnaire reçoit None (tout invalider, compté dans `full`) :
+    `size` doit couvrir les parties modifiées par tous les workers
+    pendant un intervalle de lecture.
+    """
+
+    def __init__(self, name: str, directory: str, size: int = 4096):
+        self.name = name
+        self.directory = directory
+        self.size = size
+        self.stats_counter = Counter()
+        self._file = None
+        self._seen = None
+        self._pending = {}             # clés en attente d'écriture (ordre conservé)
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _ring(self) -> _LockedFile:
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = _LockedFile(os.path.join(self.directory, f"{self.name}.inv"), RING_HEADER.size + SLOT.size * self.size)
+            if self._seen is None:
+                self._seen = RING_HEADER.unpack_from(self._file.map, 0)[0]
+        return self._file
+
+    def publish(self, key: str):
+        """Signale une clé modifiée (écrite au prochain passage, tout de suite sans tâche de fond)."""
+        with self._lock:
+            self._pending[key] = None
+            self.stats_counter["requested"] += 1
+            deferred = self._started
+        if not deferred:
+            self.flush()
+
+    def flush(self) -> int:
+        """Écrit les clés en attente dans l'anneau, sous un seul verrou de fichier."""
+        with self._lock:
+            keys, self._pending = list(self._pending), {}
+        if not keys:
+            return 0
+        try:
+            ring = self._ring()
+            ring.lock()
+            try:
+                seq = RING_HEADER.unpack_from(ring.map, 0)[0]
+                for key in keys:
+                    seq += 1
+                    SLOT.pack_into(ring.map, RING_HEADER.size + SLOT.size * (seq % self.size), seq, os.getpid(), key.encode()[:52])
+                RING_HEADER.pack_into(ring.map, 0, seq)
+            finally:
+                ring.unlock()
+            self.stats_counter["published"] += len(keys)
+        except OSError as e:
+            print(f"❌ Invalidation {self.name}: {e}")
+            return 0
+        return len(keys)
+
+    def poll(self):
+        """Clés invalidées par les autres workers depuis le dernier appel, ou None si l'anneau a débordé."""
+        ring = self._ring()
+        with self._lock:
+            last = RING_HEADER.unpack_from(ring.map, 0)[0]
+            seen, self._seen = self._seen, last
+        if last == seen:
+            return []
+        if last - seen > self.size:
+            self.stats_counter["overflows"] += 1
+            return None
+        pid, keys = os.getpid(), []
+        for seq in range(seen + 1, last + 1):
+            slot_seq, origin, key = SLOT.unpack_from(ring.map, RING_HEADER.size + SLOT.size * (seq % self.size))
+            if slot_seq != seq:
+                self.stats_counter["overflows"] += 1
+                return None    # réécrite entre-temps
+            if origin != pid:
+                keys.append(key.rstrip(b"\0").decode())
+        self.stats_counter["received"] += len(keys)
+        return keys
+
+    def start(self, socketio, handler, interval: float = 0.5):
+        """Lecture périodique en tâche de fond ; `handler(key)` par clé, `handler(None)` pour tout."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        try:
+            self._ring()
+        except OSError as e:
+            print(f"❌ Invalidation {self.name}: {e}")
+            with self._lock:
+                self._started = False    # publications de nouveau immédiates (et en échec journalisé)
+            return
+
+        def loop():
+            while True:
+                socketio.sleep(interval)
+                try:
+                    self.flush()
+                    keys = self.poll()
+                    if keys is None:
+                        self.stats_counter["full"] += 1
+                        handler(None)
+                        continue
+                    for key in keys:
+                        handler(key)
+                except Exception as e:
+                    print(f"❌ Error polling invalidations: {e}")
+
+        socketio.start_background_task(loop)
+
+    def stats(self) -> dict:
+        return {"seen": self._seen, **dict(self.stats_counter)}
+
+
+class SharedCache:
+    """Point d'entrée : instantanés et canaux nommés dans un même répertoire (None si désactivé)."""
+
+    def __init__(self, directory: str = None, enabled: bool = True):
+        self.directory = directory or default_directory()
+        self.enabled = enabled
+        self._snapshots = {}
+        self._channels = {}
+
+    def snapshot(self, name: str):
+        if not self.enabled:
+            return None
+        return self._snapshots.setdefault(name, SharedSnapshot(name, self.directory))
+
+    def channel(self, name: str, size: int = 4096):
+        if not self.enabled:
+            return None
+        return self._channels.setdefault(name, InvalidationChannel(name, self.directory, size))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "snapshots": {name: s.stats() for name, s in self._snapshots.items()},
+            "channels": {name: c.stats() for name, c in self._channels.items()},
+        }
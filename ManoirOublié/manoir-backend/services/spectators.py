@@ -0,0 +1,122 @@
+# services/spectators.py
+# Canal spectateur en lecture seule (grand écran) : aucune place joueur, aucune requête par spectateur
+import threading
+from collections import Counter, deque
+
+from services.serialization import encode_once
+
+# Seuls les événements publics sont relayés au grand écran (pas de chat, pas de position, pas d'identifiants)
+PUBLIC_EVENTS = frozenset({
+    "game:started",
+    "game:state:update",
+    "puzzle:state",
+    "puzzle:solved",
+    "game:completed",
+    "leaderboard:update",
+})
+
+
+def room_for(gid: str) -> str:
+    return f"{gid}#spectators"
+
+
+class SpectatorHub:
+    """Diffusion partagée vers les spectateurs d'une partie.
+
+    Chaque événement est encodé une seule fois (`PreEncoded`) puis envoyé à
+    la room spectateurs en un seul emit. Seuls les `PUBLIC_EVENTS` passent :
+    le canal n'est pas authentifié. Les dernières trames sont gardées dans
+    un tampon partagé pour mettre à niveau un nouvel arrivant.
+
+    Le retard est compté ici : trames envoyées à chaque spectateur moins
+    trames accusées par `spectate:ack` (cumul reçu depuis `spectate:join`).
+    Au-delà de `max_backlog` trames non accusées, le spectateur est sauté
+    (trame perdue pour lui seul) jusqu'à ce qu'il rattrape son retard.
+    """
+
+    def __init__(self, socketio, buffer_size: int = 50, max_backlog: int = 100):
+        self.socketio = socketio
+        self.buffer_size = buffer_size
+        self.max_backlog = max_backlog
+        self.dropped = Counter()
+        self._viewers = {}      # gid -> set(sid)
+        self._sid_game = {}     # sid -> gid
+        self._frames = {}       # gid -> deque[(event, PreEncoded)]
+        self._sent = {}         # sid -> trames envoyées depuis join
+        self._acked = {}        # sid -> trames accusées par le client
+        self._lock = threading.Lock()
+
+    def join(self, sid: str, gid: str):
+        with self._lock:
+            old = self._sid_game.get(sid)
+            if old is not None and old != gid:
+                self._viewers.get(old, set()).discard(sid)
+            self._sid_game[sid] = gid
+            self._viewers.setdefault(gid, set()).add(sid)
+            frames = list(self._frames.get(gid, ()))
+            self._sent[sid] = len(frames)
+            self._acked[sid] = 0
+            return frames
+
+    def ack(self, sid: str, received) -> None:
+        """Accusé du client : nombre total de trames reçues depuis `spectate:join`."""
+        with self._lock:
+            sent = self._sent.get(sid)
+            if sent is None or not isinstance(received, int):
+                return
+            self._acked[sid] = max(self._acked[sid], min(received, sent))
+
+    def leave(self, sid: str):
+        with self._lock:
+            gid = self._sid_game.pop(sid, None)
+            self._sent.pop(sid, None)
+            self._acked.pop(sid, None)
+            if gid is None:
+                return None
+            viewers = self._viewers.get(gid)
+            if viewers is not None:
+                viewers.discard(sid)
+                if not viewers:
+                    del self._viewers[gid]
+            return gid
+
+    def count(self, gid: str) -> int:
+        return len(self._viewers.get(gid, ()))
+
+    def backlog(self, sid: str) -> int:
+        """Trames envoyées à ce spectateur et pas encore accusées."""
+        return self._sent.get(sid, 0) - self._acked.get(sid, 0)
+
+    def publish(self, gid: str, event: str, payload):
+        if event not in PUBLIC_EVENTS:
+            return
+        with self._lock:
+            viewers = self._viewers.get(gid)
+            if not viewers:
+                self._frames.pop(gid, None)
+                return
+            frame = (event, encode_once(payload))
+            frames = self._frames.get(gid)
+            if frames is None:
+                frames = self._frames[gid] = deque(maxlen=self.buffer_size)
+            frames.append(frame)
+
+            slow = []
+            for sid in viewers:
+                if self.backlog(sid) >= self.max_backlog:
+                    slow.append(sid)
+                else:
+                    self._sent[sid] += 1
+            reached = len(viewers) - len(slow)
+
+        if slow:
+            self.dropped[event] += len(slow)
+        if reached:
+            self.socketio.emit(event, frame[1], room=room_for(gid), skip_sid=slow or None)
+
+    def stats(self) -> dict:
+        return {
+            "games": len(self._viewers),
+            "viewers": len(self._sid_game),
+            "dropped": dict(self.dropped),
+        }
@@ -0,0 +1,54 @@
+# services/wire.py
+# Format compact (MessagePack) optionnel pour les événements Socket.IO fréquents
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+# Événements à haute fréquence pouvant circuler en binaire
+COMPACT_EVENTS = {"puzzle:state", "game:state:update", "player:position:update"}
+
+# Codes numériques des champs de position (clé courte dans la map MessagePack)
+POSITION_FIELDS = ("x", "y", "playerName")
+POSITION_CODES = {name: i for i, name in enumerate(POSITION_FIELDS)}
+
+# Champs jamais renvoyés aux autres membres de la room (jeton ; enveloppe de reprise, posée par le serveur seul)
+PRIVATE_FIELDS = ("token", "_resume")
+
+
+def available_formats():
+    return (JSON, MSGPACK) if msgpack else (JSON,)
+
+def negotiate(requested) -> str:
+    """Format retenu pour un client : msgpack seulement s'il le demande et si la lib est installée."""
+    return MSGPACK if requested == MSGPACK and msgpack else JSON
+
+def room_for(gid: str, fmt: str) -> str:
+    """Sous-room par format de transport (les événements fréquents y sont diffusés)."""
+    return f"{gid}#{fmt}"
+
+def strip_private(data):
+    if not isinstance(data, dict):
+        return {}
+    if not any(k in data for k in PRIVATE_FIELDS):
+        return data
+    return {k: v for k, v in data.items() if k not in PRIVATE_FIELDS}
+
+
+def encode(event: str, payload: dict) -> bytes:
+    if event == "player:position:update":
+        payload = {POSITION_CODES.get(k, k): v for k, v in payload.items()}
+    return msgpack.packb(payload, use_bin_type=True)
+
+def decode(event: str, raw) -> dict:
+    data = msgpack.unpackb(bytes(raw), raw=False, strict_map_key=False)
+    if not isinstance(data, dict):
+        return {}
+    if event == "player:position:update":
+        data = {POSITION_FIELDS[k] if isinstance(k, int) and k < len(POSITION_FIELDS) else k: v
+                for k, v in data.items()}
+    return data
+
@@ -0,0 +1,6 @@
+# wsgi.py
+# Point d'entrée pour un serveur WSGI externe : construit l'application puis lance la phase de démarrage
+from app import create_app, startup
+
+app = create_app()
+startup(app)